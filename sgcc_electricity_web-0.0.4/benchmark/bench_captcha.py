@@ -0,0 +1,215 @@
+'''验证码识别的基准和精度回归测试: 在标注语料上运行 ONNX.get_distance 和登录时使用的 ONNX.detect，
+分别统计吞吐、延迟分位数、内存和缺口位置误差
+
+    python benchmark/bench_captcha.py /data/captcha_corpus --output baseline.json
+    # 修改预处理、get_boxes、nms 或模型之后，与之前的结果对比，速度或精度退化时返回非零退出码
+    python benchmark/bench_captcha.py /data/captcha_corpus --baseline baseline.json --output current.json
+
+语料格式见 captcha_corpus.py。/data 是数据目录(add-on 中为 /config)，开启配置 captcha_collect_corpus 后，
+其中的 captcha_corpus 会积累验证通过的背景图片，这些图片没有标注，用 label_captcha_corpus.py 人工标注后才能统计误差。
+
+detect 模式与 _login 的参数相同: 置信度阈值 0.3，--scales 对应配置 captcha_scales，标注了 block 的图片按拼图块的高度限制 y_range。
+'''
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import onnxruntime
+
+from harness import SRC_DIR
+from captcha_corpus import load_blocks, load_corpus, load_labels, percentile, to_image_x, to_model_y
+
+sys.path.insert(0, SRC_DIR)
+from electricity.onnx import MODEL_VARIANTS, ONNX, model_path  # noqa: E402
+
+
+def _distance(onnx, image):
+    # get_distance 没有检测到缺口时会打印提示并返回 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        return onnx.get_distance(image)
+
+
+def solvers(onnx, scales, blocks):
+    '''{模式: solve(文件名, 图片)}，返回 416x416 下缺口的 x1，没有检出时为 0'''
+    def detect(name, image):
+        block = blocks.get(name)
+        y_range = (to_model_y(block[0], image), to_model_y(block[1], image)) if block else None
+        return onnx.detect(image, scales=scales, y_range=y_range)[0]
+    return {
+        'get_distance': lambda name, image: _distance(onnx, image),
+        'detect': detect,
+    }
+
+
+def measure_latency(solve, corpus, runs):
+    '''逐张串行调用 runs 次，返回每张图片的结果和全部延迟样本(毫秒)'''
+    distances, latencies = {}, []
+    for name, image, _ in corpus:
+        for _ in range(runs):
+            start = time.perf_counter()
+            distance = solve(name, image)
+            latencies.append((time.perf_counter() - start) * 1000)
+        distances[name] = distance
+    return distances, latencies
+
+
+def measure_throughput(solve, corpus, threads, rounds):
+    '''threads 个线程共享同一个会话处理 rounds 遍语料，返回每秒处理的图片数'''
+    items = [(name, image) for name, image, _ in corpus] * rounds
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda item: solve(*item), items))
+    return len(items) / (time.perf_counter() - start)
+
+
+def measure_memory(solve, corpus):
+    '''单次调用中 tracemalloc 统计到的最大内存峰值(KB)，只包含 Python 和 numpy 的分配'''
+    peaks = []
+    tracemalloc.start()
+    try:
+        for name, image, _ in corpus:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            solve(name, image)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return max(peaks) / 1024
+
+
+def run_mode(solve, corpus, args):
+    distances, latencies = measure_latency(solve, corpus, args.runs)
+    summary, per_image = accuracy(corpus, distances, args.tolerance)
+    return {
+        'latency_ms': {
+            'mean': round(statistics.fmean(latencies), 3),
+            'p50': round(percentile(latencies, 50), 3),
+            'p90': round(percentile(latencies, 90), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'max': round(max(latencies), 3),
+        },
+        'throughput_ips': round(measure_throughput(solve, corpus, args.threads, args.rounds), 2),
+        'peak_call_kb': round(measure_memory(solve, corpus), 1),
+        'accuracy': summary,
+        'per_image': per_image,
+    }
+
+
+def accuracy(corpus, distances, tolerance):
+    per_image, errors = [], []
+    for name, image, label in corpus:
+        # 两种模式的结果都是 416x416 下的坐标，换算为原图坐标后与标注比较
+        x = to_image_x(distances[name], image) if distances[name] else None
+        error = abs(x - label) if x is not None and label is not None else None
+        if error is not None:
+            errors.append(error)
+        per_image.append({'image': name, 'label': label, 'x': round(x, 1) if x is not None else None, 'error': round(error, 1) if error is not None else None})
+    labelled = sum(label is not None for _, _, label in corpus)
+    summary = {
+        'detection_rate': round(sum(item['x'] is not None for item in per_image) / len(per_image), 4),
+        'mae_px': round(statistics.fmean(errors), 2) if errors else None,
+        'p95_error_px': round(percentile(errors, 95), 2) if errors else None,
+        'max_error_px': round(max(errors), 2) if errors else None,
+        # 没有检出的标注图片记为超出容差
+        'within_tolerance': round(sum(e <= tolerance for e in errors) / labelled, 4) if labelled else None,
+    }
+    return summary, per_image
+
+
+def regressions(result, baseline, max_latency_increase, max_error_increase, max_tolerance_drop):
+    '''逐个模式与 baseline 比较，返回退化项的说明'''
+    found = []
+    for mode, current in result['modes'].items():
+        base = baseline['modes'].get(mode)
+        if base is None:
+            continue
+        p50, base_p50 = current['latency_ms']['p50'], base['latency_ms']['p50']
+        if base_p50 and p50 > base_p50 * (1 + max_latency_increase):
+            found.append(f"{mode} latency p50 {base_p50}ms -> {p50}ms")
+        mae, base_mae = current['accuracy']['mae_px'], base['accuracy']['mae_px']
+        if mae is not None and base_mae is not None and mae > base_mae + max_error_increase:
+            found.append(f"{mode} mean error {base_mae}px -> {mae}px")
+        hit, base_hit = current['accuracy']['within_tolerance'], base['accuracy']['within_tolerance']
+        if hit is not None and base_hit is not None and hit < base_hit - max_tolerance_drop:
+            found.append(f"{mode} within tolerance {base_hit} -> {hit}")
+        if current['accuracy']['detection_rate'] < base['accuracy']['detection_rate'] - max_tolerance_drop:
+            found.append(f"{mode} detection rate {base['accuracy']['detection_rate']} -> {current['accuracy']['detection_rate']}")
+    return found
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Captcha solver benchmark and accuracy regression suite.')
+    parser.add_argument('corpus', help='folder of slider backgrounds with labels.json')
+    parser.add_argument('--model', help='model file, defaults to the --variant model shipped in src/electricity')
+    parser.add_argument('--variant', default='float', choices=sorted(MODEL_VARIANTS))
+    parser.add_argument('--mode', action='append', choices=['get_distance', 'detect'], help='solver to measure, repeatable, defaults to both')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1.0], help='detect scales, same as the captcha_scales setting')
+    parser.add_argument('--runs', type=int, default=5, help='latency samples per image')
+    parser.add_argument('--threads', type=int, default=1, help='threads sharing one session in the throughput pass')
+    parser.add_argument('--rounds', type=int, default=3, help='passes over the corpus in the throughput pass')
+    parser.add_argument('--tolerance', type=float, default=4, help='pixels, a detection within this error counts as correct')
+    parser.add_argument('--baseline', help='previous --output of this script to compare against')
+    parser.add_argument('--max-latency-increase', type=float, default=0.2, help='allowed relative p50 increase')
+    parser.add_argument('--max-error-increase', type=float, default=1.0, help='allowed mean error increase in pixels')
+    parser.add_argument('--max-tolerance-drop', type=float, default=0.02, help='allowed drop of within-tolerance and detection rate')
+    parser.add_argument('--output', help='write the result as JSON to this file')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        sys.exit(f"No images in {args.corpus}")
+    model = args.model or model_path(args.variant)
+    start = time.perf_counter()
+    onnx = ONNX(model)
+    load_ms = (time.perf_counter() - start) * 1000
+    modes = solvers(onnx, args.scales, load_blocks(args.corpus))
+    modes = {mode: modes[mode] for mode in (args.mode or modes)}
+    for solve in modes.values():
+        solve(*corpus[0][0:2])  # 预热
+
+    result = {
+        'model': os.path.abspath(model),
+        'onnxruntime': onnxruntime.__version__,
+        'machine': platform.machine(),
+        'images': len(corpus),
+        'labelled': sum(label is not None for _, _, label in corpus),
+        'label_sources': dict(Counter(source for _, source in load_labels(args.corpus).values())),
+        'model_load_ms': round(load_ms, 1),
+        'scales': args.scales,
+        'threads': args.threads,
+        'modes': {mode: run_mode(solve, corpus, args) for mode, solve in modes.items()},
+        # Linux 上 ru_maxrss 的单位是 KB
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+    print(f"{result['images']} images ({result['labelled']} labelled, label sources {result['label_sources']}), model {os.path.basename(model)}, load {result['model_load_ms']}ms, max rss {result['max_rss_mb']}MB")
+    for mode, current in result['modes'].items():
+        latency, acc = current['latency_ms'], current['accuracy']
+        print(f"[{mode}] latency ms: p50 {latency['p50']}  p90 {latency['p90']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}")
+        print(f"[{mode}] throughput: {current['throughput_ips']} images/s with {args.threads} threads, peak per call {current['peak_call_kb']}KB")
+        print(f"[{mode}] accuracy: detected {acc['detection_rate']:.2%}, mae {acc['mae_px']}px, p95 {acc['p95_error_px']}px, "
+              f"max {acc['max_error_px']}px, within {args.tolerance}px {acc['within_tolerance']}")
+
+    failed = []
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+        failed = regressions(result, baseline, args.max_latency_increase, args.max_error_increase, args.max_tolerance_drop)
+        result['baseline'] = os.path.abspath(args.baseline)
+        result['regressions'] = failed
+        print('regressions: ' + ('; '.join(failed) if failed else 'none'))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,122 @@
+'''验证码识别后处理(get_boxes + nms)的微基准: 对比逐行循环的旧实现和向量化实现，以及只取最优框的 top1 路径
+
+    python benchmark/bench_captcha_postprocess.py --image assets/background.png --runs 200
+    python benchmark/bench_captcha_postprocess.py --image assets/background.png --confidence 0.3 --output result.json
+
+仓库中没有附带 assets/background.png(onnx.py 的 __main__ 也读取这张图片)，需要先保存一张: 在登录页弹出滑块验证码后，
+在浏览器控制台执行 document.getElementById("slideVerify").childNodes[0].toDataURL("image/png")，
+把返回的 data URL 中逗号之后的 base64 解码保存为 png。
+
+模型只推理一次，之后对同一个 prediction 反复计时，结果不包含推理本身的耗时。
+'''
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from harness import SRC_DIR
+
+sys.path.insert(0, SRC_DIR)
+from electricity.onnx import ONNX  # noqa: E402
+
+
+def legacy_nms(dets, thresh):
+    '''改造前的 ONNX.nms'''
+    x1, y1, x2, y2 = dets[:, 0], dets[:, 1], dets[:, 2], dets[:, 3]
+    areas = (y2 - y1 + 1) * (x2 - x1 + 1)
+    keep = []
+    index = dets[:, 4].argsort()[::-1]
+    while index.size > 0:
+        i = index[0]
+        keep.append(i)
+        x11 = np.maximum(x1[i], x1[index[1:]])
+        y11 = np.maximum(y1[i], y1[index[1:]])
+        x22 = np.minimum(x2[i], x2[index[1:]])
+        y22 = np.minimum(y2[i], y2[index[1:]])
+        w = np.maximum(0, x22 - x11 + 1)
+        h = np.maximum(0, y22 - y11 + 1)
+        overlaps = w * h
+        ious = overlaps / (areas[i] + areas[index[1:]] - overlaps)
+        index = index[np.where(ious <= thresh)[0] + 1]
+    return keep
+
+
+def legacy_get_boxes(onnx, prediction, confidence_threshold=0.7, nms_threshold=0.6):
+    '''改造前的 ONNX.get_boxes: 逐行 argmax、逐个类别 append 后再 NMS'''
+    feature_map = np.squeeze(prediction)
+    box = feature_map[feature_map[..., 4] > confidence_threshold]
+    cls = [int(np.argmax(row)) for row in box[..., 5:]]
+    output = []
+    for curr_cls in set(cls):
+        curr_cls_box = []
+        for j in range(len(cls)):
+            if cls[j] == curr_cls:
+                box[j][5] = curr_cls
+                curr_cls_box.append(box[j][:6])
+        curr_cls_box = onnx.xywh2xyxy(np.array(curr_cls_box))
+        for k in legacy_nms(curr_cls_box, nms_threshold):
+            output.append(curr_cls_box[k])
+    return np.array(output)
+
+
+def _time(func, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'p50_ms': round(statistics.median(samples), 4),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        'mean_ms': round(statistics.fmean(samples), 4),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Micro-benchmark of captcha box decoding and NMS.')
+    parser.add_argument('--image', required=True, help='a slider background png, e.g. assets/background.png')
+    parser.add_argument('--model', default=os.path.join(SRC_DIR, 'electricity', 'captcha.onnx'))
+    parser.add_argument('--confidence', type=float, default=0.7)
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--output', help='write the result as JSON to this file')
+    args = parser.parse_args()
+
+    onnx = ONNX(args.model)
+    prediction, _ = onnx._inference(Image.open(args.image))
+    candidates = int((prediction.reshape(-1, prediction.shape[-1])[:, 4] > args.confidence).sum())
+
+    legacy = legacy_get_boxes(onnx, prediction.copy(), args.confidence)
+    vectorized = onnx.get_boxes(prediction, args.confidence)
+    top1 = onnx.get_boxes(prediction, args.confidence, top1=True)
+    # 三种实现保留的框数和最优框的置信度必须一致(置信度相同的框先后顺序可能不同)
+    if len(legacy) == 0:
+        same = len(vectorized) == 0 and len(top1) == 0
+    else:
+        same = len(legacy) == len(vectorized) and legacy[:, 4].max() == vectorized[0][4] and np.allclose(vectorized[0], top1[0])
+
+    result = {
+        'image': args.image,
+        'candidates': candidates,
+        'boxes': {'legacy': len(legacy), 'vectorized': len(vectorized)},
+        'same_best_box': bool(same),
+        'timings': {
+            # 旧实现会原地修改 box，每次传入副本，副本的开销同样计入另外两项
+            'legacy': _time(lambda: legacy_get_boxes(onnx, prediction.copy(), args.confidence), args.runs),
+            'vectorized': _time(lambda: onnx.get_boxes(prediction.copy(), args.confidence), args.runs),
+            'top1': _time(lambda: onnx.get_boxes(prediction.copy(), args.confidence, top1=True), args.runs),
+        },
+    }
+    print(f"{result['candidates']} candidates above {args.confidence}, boxes after NMS: {result['boxes']}, same best box: {same}")
+    print(f"{'path':<12} {'p50(ms)':>9} {'p95(ms)':>9} {'mean(ms)':>9}")
+    for name, timing in result['timings'].items():
+        print(f"{name:<12} {timing['p50_ms']:>9.4f} {timing['p95_ms']:>9.4f} {timing['mean_ms']:>9.4f}")
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(result, file, indent=2)
+    sys.exit(0 if same else 1)
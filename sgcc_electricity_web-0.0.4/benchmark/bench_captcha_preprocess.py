@@ -0,0 +1,86 @@
+'''验证码预处理的基准: 对比改造前逐步生成中间数组的实现和写入复用缓冲区的 ONNX.preprocess
+
+    python benchmark/bench_captcha_preprocess.py --image assets/background.png --runs 200
+
+assets/background.png 的获取方法见 bench_captcha_postprocess.py。
+
+每次调用都从 PNG 字节重新解码，两种实现的解码开销相同。内存是 tracemalloc 统计到的单次调用峰值，
+numpy 数组会被统计，PIL 内部的图像缓冲区不会被统计。
+'''
+import argparse
+import json
+import os
+import sys
+import threading
+import tracemalloc
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from harness import SRC_DIR
+from bench_captcha_postprocess import _time
+
+sys.path.insert(0, SRC_DIR)
+from electricity.onnx import ONNX, INPUT_SIZE  # noqa: E402
+
+
+def legacy_preprocess(image):
+    '''改造前 ONNX._inference 中的预处理'''
+    org_img = image.resize((INPUT_SIZE, INPUT_SIZE))
+    img = org_img.convert("RGB")
+    img = np.array(img).transpose(2, 0, 1)
+    img = img.astype(dtype=np.float32)
+    img /= 255.0
+    img = np.expand_dims(img, axis=0)
+    return img
+
+
+def _peak_kb(func, runs=20):
+    '''多次调用中单次调用的最大内存峰值(KB)，不含调用前已经存在的内存'''
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(runs):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            func()
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return round(max(peaks) / 1024, 1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark captcha preprocessing: legacy intermediates vs the reused input buffer.')
+    parser.add_argument('--image', required=True, help='a slider background png, e.g. assets/background.png')
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--output', help='write the result as JSON to this file')
+    args = parser.parse_args()
+
+    with open(args.image, 'rb') as file:
+        png = file.read()
+    # 只用到预处理，不需要加载模型
+    onnx = ONNX.__new__(ONNX)
+    onnx._local = threading.local()
+
+    legacy = lambda: legacy_preprocess(Image.open(BytesIO(png)))
+    fused = lambda: onnx.preprocess(Image.open(BytesIO(png)))
+    fused()
+    same = bool(np.array_equal(legacy(), onnx._input_buffer()))
+
+    result = {
+        'image': args.image,
+        'same_tensor': same,
+        'legacy': {'peak_kb': _peak_kb(legacy), **_time(legacy, args.runs)},
+        'fused': {'peak_kb': _peak_kb(fused), **_time(fused, args.runs)},
+    }
+    print(f"same tensor: {same}")
+    print(f"{'path':<8} {'peak(KB)':>9} {'p50(ms)':>9} {'p95(ms)':>9}")
+    for name in ('legacy', 'fused'):
+        item = result[name]
+        print(f"{name:<8} {item['peak_kb']:>9.1f} {item['p50_ms']:>9.3f} {item['p95_ms']:>9.3f}")
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(result, file, indent=2)
+    sys.exit(0 if same else 1)
@@ -0,0 +1,69 @@
+'''验证码模型会话的基准: 对比默认 SessionOptions、调优后的选项以及从缓存加载优化后模型的创建耗时和推理延迟
+
+    python benchmark/bench_captcha_session.py --image assets/background.png --threads 4 --runs 50
+    python benchmark/bench_captcha_session.py --image assets/background.png --optimization extended --execution-mode parallel --output result.json
+
+assets/background.png 的获取方法见 bench_captcha_postprocess.py。
+'''
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import onnxruntime
+from PIL import Image
+
+from harness import SRC_DIR
+from bench_captcha_postprocess import _time
+
+sys.path.insert(0, SRC_DIR)
+from electricity.onnx import ONNX  # noqa: E402
+
+
+def _create(factory):
+    start = time.perf_counter()
+    onnx = factory()
+    return onnx, round((time.perf_counter() - start) * 1000, 2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark captcha model session options and the optimized model cache.')
+    parser.add_argument('--image', required=True, help='a slider background png, e.g. assets/background.png')
+    parser.add_argument('--model', default=os.path.join(SRC_DIR, 'electricity', 'captcha.onnx'))
+    parser.add_argument('--optimization', default='all')
+    parser.add_argument('--threads', type=int, default=0, help='intra-op threads, 0 lets onnxruntime decide')
+    parser.add_argument('--inter-threads', type=int, default=0)
+    parser.add_argument('--execution-mode', default='sequential')
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--output', help='write the result as JSON to this file')
+    args = parser.parse_args()
+
+    image = Image.open(args.image)
+    cache_dir = tempfile.mkdtemp(prefix='sgcc-onnx-')
+    tuned = dict(optimization=args.optimization, intra_op_threads=args.threads, inter_op_threads=args.inter_threads, execution_mode=args.execution_mode)
+    try:
+        # 与改造前相同: 默认选项，每次启动都重新优化
+        variants = [
+            ('default', lambda: ONNX(args.model)),
+            ('tuned', lambda: ONNX(args.model, **tuned)),
+            ('cache_miss', lambda: ONNX(args.model, cache_dir=cache_dir, **tuned)),
+            ('cache_hit', lambda: ONNX(args.model, cache_dir=cache_dir, **tuned)),
+        ]
+        result = {'onnxruntime': onnxruntime.__version__, 'options': tuned, 'variants': {}}
+        for name, factory in variants:
+            onnx, create_ms = _create(factory)
+            onnx._inference(image)  # 预热
+            result['variants'][name] = {'create_ms': create_ms, 'inference': _time(lambda: onnx._inference(image), args.runs)}
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print(f"onnxruntime {result['onnxruntime']}, options {tuned}")
+    print(f"{'variant':<12} {'create(ms)':>11} {'p50(ms)':>9} {'p95(ms)':>9}")
+    for name, item in result['variants'].items():
+        print(f"{name:<12} {item['create_ms']:>11.2f} {item['inference']['p50_ms']:>9.3f} {item['inference']['p95_ms']:>9.3f}")
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(result, file, indent=2)
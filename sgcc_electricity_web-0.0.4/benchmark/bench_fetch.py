@@ -0,0 +1,86 @@
+'''离线端到端基准测试: 启动回放服务，headless 跑完整的 DataFetcher.fetch()，输出各阶段耗时
+
+    python benchmark/bench_fetch.py benchmark/recordings/default --runs 5 --output result.json
+    python benchmark/bench_fetch.py benchmark/recordings/default --set fetch_mode=capture --set lean_profile=true
+
+录制目录中有 expected.json 时会同时校验抓取结果，任意一次抓取失败或结果不一致时返回非零退出码，可以直接用于 CI。
+'''
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+from harness import parse_overrides, prepare
+from replay_server import ReplayServer
+
+
+def _normalize(data):
+    return json.loads(json.dumps(data, default=str))
+
+
+def _print_summary(runs, spans):
+    print(f"{'run':>4} {'seconds':>9} {'ok':>4}")
+    for index, run in enumerate(runs, 1):
+        print(f"{index:>4} {run['seconds']:>9.3f} {str(run['ok']):>4}")
+    print()
+    print(f"{'span':<18} {'labels':<24} {'outcome':<8} {'count':>6} {'avg(s)':>9} {'sum(s)':>9}")
+    for span in spans:
+        labels = ','.join(f"{k}={v}" for k, v in span.items() if k not in ('span', 'outcome', 'count', 'sum', 'avg'))
+        print(f"{span['span']:<18} {labels:<24} {span['outcome']:<8} {span['count']:>6} {span['avg']:>9.3f} {span['sum']:>9.3f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='End-to-end fetch benchmark against a replayed 95598 site.')
+    parser.add_argument('recording', help='directory written by record_site.py')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--set', action='append', metavar='KEY=VALUE', help='override electricity config')
+    parser.add_argument('--output', help='write the result as JSON to this file')
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s [%(levelname)-8s] ---- %(message)s')
+
+    recording = os.path.abspath(args.recording)
+    output = os.path.abspath(args.output) if args.output else None
+    expected = None
+    if os.path.exists(os.path.join(recording, 'expected.json')):
+        with open(os.path.join(recording, 'expected.json'), 'r') as file:
+            expected = json.load(file)
+
+    server = ReplayServer(recording).start()
+    # 默认每次都走完整的登录和全量抓取，可以用 --set 打开会话复用、增量抓取等选项做对比
+    electricity = dict(persist_session=False, incremental_fetch=False, resume_max_attempts=0)
+    electricity.update(parse_overrides(args.set))
+    prepare(server.base_url, electricity)
+
+    from electricity.data_fetcher import DataFetcher
+    from electricity.metrics import metrics
+
+    fetcher = DataFetcher('13800000000', 'replay')
+    runs = []
+    try:
+        for _ in range(args.runs):
+            start = time.monotonic()
+            data = fetcher.fetch()
+            seconds = time.monotonic() - start
+            ok = data is not None and (expected is None or _normalize(data) == expected)
+            runs.append({'seconds': round(seconds, 6), 'ok': ok, 'peak_rss_mb': round(fetcher.peak_rss_mb, 1)})
+    finally:
+        fetcher.close()
+        server.stop()
+
+    result = {
+        'recording': recording,
+        'config': electricity,
+        'runs': runs,
+        'spans': metrics.summary(),
+        'misses': sorted(set(server.misses)),
+    }
+    _print_summary(runs, result['spans'])
+    if result['misses']:
+        print(f"\n{len(result['misses'])} requests had no recorded response, see --output for the list")
+    if output:
+        with open(output, 'w') as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+    sys.exit(0 if runs and all(run['ok'] for run in runs) else 1)
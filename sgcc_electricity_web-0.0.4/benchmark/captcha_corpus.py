@@ -0,0 +1,90 @@
+'''验证码基准共用的标注语料
+
+语料目录中放滑块验证码的背景图片(png/jpg)，以及可选的 labels.json:
+
+    {"0001.png": 182, "0002.png": {"x": 97, "source": "manual"}}
+
+值是缺口左边缘在原图中的 x 坐标(像素)，source 记录标注的来源，只写数字时视为人工标注。
+可选的 block 为拼图块在原图中的 [上边缘, 下边缘]，基准测试的 detect 模式用它限制缺口的高度范围。
+来源为 model(模型自己的识别结果)的标注不参与误差统计。没有标注的图片只统计检出率和耗时，不统计误差。
+'''
+import json
+import os
+import sys
+
+from PIL import Image
+
+from harness import SRC_DIR
+
+sys.path.insert(0, SRC_DIR)
+from electricity.onnx import INPUT_SIZE  # noqa: E402
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+# 这些来源的标注不是独立于模型的真值，用来统计误差只会衡量模型与自己的差距
+UNTRUSTED_SOURCES = ('model',)
+
+
+def _read_labels(folder):
+    labels_path = os.path.join(folder, 'labels.json')
+    if not os.path.exists(labels_path):
+        return {}
+    with open(labels_path, 'r') as file:
+        return json.load(file)
+
+
+def load_labels(folder):
+    '''返回 {文件名: (x, 来源)}'''
+    labels = {}
+    for name, value in _read_labels(folder).items():
+        if isinstance(value, dict):
+            labels[name] = (value.get('x'), value.get('source', 'manual'))
+        else:
+            labels[name] = (value, 'manual')
+    return labels
+
+
+def load_blocks(folder):
+    '''返回 {文件名: (上边缘, 下边缘)}，只包含标注了 block 的图片'''
+    return {name: tuple(value['block']) for name, value in _read_labels(folder).items() if isinstance(value, dict) and value.get('block')}
+
+
+def save_label(folder, name, x, source='manual'):
+    labels = _read_labels(folder)
+    # 保留已标注的 block
+    value = labels.get(name) if isinstance(labels.get(name), dict) else {}
+    labels[name] = dict(value, x=round(float(x), 1), source=source)
+    labels_path = os.path.join(folder, 'labels.json')
+    with open(labels_path + '.tmp', 'w') as file:
+        json.dump(labels, file, indent=0)
+    os.replace(labels_path + '.tmp', labels_path)
+
+
+def load_corpus(folder):
+    '''返回 [(文件名, 已解码的图片, 标注的 x 或 None)]，按文件名排序；不可信来源的标注视为没有标注'''
+    labels = load_labels(folder)
+    corpus = []
+    for name in sorted(os.listdir(folder)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        image = Image.open(os.path.join(folder, name))
+        image.load()
+        x, source = labels.get(name, (None, None))
+        corpus.append((name, image, float(x) if x is not None and source not in UNTRUSTED_SOURCES else None))
+    return corpus
+
+
+def to_image_x(x, image):
+    '''模型输出的 416x416 坐标换算为原图坐标'''
+    return x * image.width / INPUT_SIZE
+
+
+def to_model_y(y, image):
+    '''原图的 y 坐标换算为 416x416 下的坐标'''
+    return y * INPUT_SIZE / image.height
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))]
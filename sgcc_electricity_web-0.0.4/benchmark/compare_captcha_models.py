@@ -0,0 +1,91 @@
+'''对比 float 和 INT8 验证码模型的缺口位置误差、检出率和推理延迟，决定是否切换到量化模型
+
+    python benchmark/compare_captcha_models.py benchmark/captcha_corpus --runs 3 --output compare.json
+
+误差按 labels.json 中的标注计算；没有标注的图片用 float 模型的检测结果作为参照。
+量化模型的平均误差增加超过 --max-error-increase 像素，或检出率下降超过 --max-detection-drop 时返回非零退出码。
+'''
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+from harness import SRC_DIR
+from captcha_corpus import load_corpus, percentile, to_image_x
+
+sys.path.insert(0, SRC_DIR)
+from electricity.onnx import MODEL_VARIANTS, ONNX  # noqa: E402
+
+
+def evaluate(onnx, corpus, confidence, runs):
+    '''每张图片推理 runs 次，返回每张图片的检测结果和全部延迟样本(毫秒)'''
+    onnx.detect(corpus[0][1], confidence)  # 预热
+    detections, latencies = {}, []
+    for name, image, _ in corpus:
+        for _ in range(runs):
+            start = time.perf_counter()
+            x1, box, score = onnx.detect(image, confidence)
+            latencies.append((time.perf_counter() - start) * 1000)
+        detections[name] = to_image_x(x1, image) if box is not None else None
+    return detections, latencies
+
+
+def summarize(detections, latencies, references, tolerance):
+    errors = [abs(detections[name] - reference) for name, reference in references.items() if reference is not None and detections[name] is not None]
+    detected = sum(x is not None for x in detections.values())
+    return {
+        'detection_rate': round(detected / len(detections), 4),
+        'mean_abs_error_px': round(statistics.fmean(errors), 2) if errors else None,
+        'p95_abs_error_px': round(percentile(errors, 95), 2) if errors else None,
+        'within_tolerance': round(sum(e <= tolerance for e in errors) / len(errors), 4) if errors else None,
+        'latency_p50_ms': round(percentile(latencies, 50), 3),
+        'latency_p95_ms': round(percentile(latencies, 95), 3),
+    }
+
+
+if __name__ == '__main__':
+    model_dir = os.path.join(SRC_DIR, 'electricity')
+    parser = argparse.ArgumentParser(description='Compare the float and INT8 captcha models.')
+    parser.add_argument('corpus', help='folder of slider backgrounds with an optional labels.json')
+    parser.add_argument('--float-model', default=os.path.join(model_dir, MODEL_VARIANTS['float']))
+    parser.add_argument('--int8-model', default=os.path.join(model_dir, MODEL_VARIANTS['int8']))
+    parser.add_argument('--confidence', type=float, default=0.3)
+    parser.add_argument('--tolerance', type=float, default=4, help='pixels, a detection within this error counts as correct')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--max-error-increase', type=float, default=1.0)
+    parser.add_argument('--max-detection-drop', type=float, default=0.02)
+    parser.add_argument('--output', help='write the result as JSON to this file')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        sys.exit(f"No images in {args.corpus}")
+    float_detections, float_latencies = evaluate(ONNX(args.float_model), corpus, args.confidence, args.runs)
+    int8_detections, int8_latencies = evaluate(ONNX(args.int8_model), corpus, args.confidence, args.runs)
+    # 有标注时与标注比较，否则与 float 模型的结果比较
+    references = {name: label if label is not None else float_detections[name] for name, _, label in corpus}
+
+    result = {
+        'corpus': os.path.abspath(args.corpus),
+        'images': len(corpus),
+        'labelled': sum(label is not None for _, _, label in corpus),
+        'float': summarize(float_detections, float_latencies, references, args.tolerance),
+        'int8': summarize(int8_detections, int8_latencies, references, args.tolerance),
+    }
+    float_error, int8_error = result['float']['mean_abs_error_px'] or 0, result['int8']['mean_abs_error_px'] or 0
+    result['accuracy_holds'] = int8_error - float_error <= args.max_error_increase and \
+        result['float']['detection_rate'] - result['int8']['detection_rate'] <= args.max_detection_drop
+
+    print(f"{result['images']} images, {result['labelled']} labelled")
+    print(f"{'model':<6} {'detected':>9} {'mae(px)':>8} {'p95(px)':>8} {'<=tol':>7} {'p50(ms)':>9} {'p95(ms)':>9}")
+    for name in ('float', 'int8'):
+        item = result[name]
+        print(f"{name:<6} {item['detection_rate']:>9.2%} {str(item['mean_abs_error_px']):>8} {str(item['p95_abs_error_px']):>8} "
+              f"{str(item['within_tolerance']):>7} {item['latency_p50_ms']:>9.3f} {item['latency_p95_ms']:>9.3f}")
+    print(f"accuracy holds: {result['accuracy_holds']}")
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(result, file, indent=2)
+    sys.exit(0 if result['accuracy_holds'] else 1)
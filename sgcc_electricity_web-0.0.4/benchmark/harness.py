@@ -0,0 +1,34 @@
+'''录制和基准测试共用的准备工作: 生成临时 config.yaml，设置 SGCC_BASE_URL，并把 src 加入 sys.path'''
+import os
+import sys
+import tempfile
+
+import yaml
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+
+def parse_overrides(items):
+    '''把 --set key=value 解析为 electricity 配置，value 按 YAML 解析，例如 --set fetch_mode=capture'''
+    overrides = {}
+    for item in items or []:
+        key, _, value = item.partition('=')
+        overrides[key.strip()] = yaml.safe_load(value)
+    return overrides
+
+
+def prepare(base_url, electricity, workdir=None):
+    '''必须在 import electricity / config 之前调用，返回临时工作目录'''
+    os.environ['SGCC_BASE_URL'] = base_url
+    workdir = workdir or tempfile.mkdtemp(prefix='sgcc-bench-')
+    with open(os.path.join(SRC_DIR, 'config.yaml'), 'r') as file:
+        data = yaml.safe_load(file)
+    data['electricity'].update(electricity)
+    data['data']['path'] = os.path.join(workdir, 'data')
+    with open(os.path.join(workdir, 'config.yaml'), 'w') as file:
+        yaml.safe_dump(data, file, allow_unicode=True)
+    # config.py 从当前目录读取 config.yaml
+    os.chdir(workdir)
+    if SRC_DIR not in sys.path:
+        sys.path.insert(0, SRC_DIR)
+    return workdir
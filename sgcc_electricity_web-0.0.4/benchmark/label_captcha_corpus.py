@@ -0,0 +1,65 @@
+'''人工标注验证码语料: 为没有标注的背景图片逐张输入缺口左边缘的 x 坐标，写入 labels.json(source 为 manual)
+
+    python benchmark/label_captcha_corpus.py /data/captcha_corpus
+
+每张图片会另存为带 x 坐标刻度的预览图(--preview)，用看图工具打开后读出缺口左边缘的 x 坐标并输入；
+直接回车跳过该图片，输入 q 退出。预览图上不画模型的识别结果，避免标注受模型影响。
+'''
+import argparse
+import os
+import sys
+
+from PIL import Image, ImageDraw
+
+from captcha_corpus import IMAGE_EXTENSIONS, load_labels, save_label
+
+
+def preview(image, path, zoom):
+    '''放大 zoom 倍并在顶部画出每 10 像素一个的刻度，每 50 像素标出原图坐标'''
+    image = image.convert('RGB')
+    ruler = 20
+    canvas = Image.new('RGB', (image.width * zoom, image.height * zoom + ruler), 'white')
+    canvas.paste(image.resize((image.width * zoom, image.height * zoom)), (0, ruler))
+    draw = ImageDraw.Draw(canvas)
+    for x in range(0, image.width, 10):
+        long = x % 50 == 0
+        draw.line([(x * zoom, ruler - (10 if long else 4)), (x * zoom, canvas.height if long else ruler)], fill='red' if long else 'black')
+        if long:
+            draw.text((x * zoom + 2, 0), str(x), fill='black')
+    canvas.save(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Label the gap x-offset of captcha backgrounds by hand.')
+    parser.add_argument('corpus', help='folder of slider backgrounds')
+    parser.add_argument('--preview', default='label_preview.png', help='where to write the ruler preview of the current image')
+    parser.add_argument('--zoom', type=int, default=2)
+    parser.add_argument('--relabel', action='store_true', help='also label images that already have a label')
+    args = parser.parse_args()
+
+    labels = load_labels(args.corpus)
+    names = [name for name in sorted(os.listdir(args.corpus)) if name.lower().endswith(IMAGE_EXTENSIONS)]
+    todo = [name for name in names if args.relabel or name not in labels or labels[name][1] != 'manual']
+    print(f"{len(todo)} of {len(names)} images to label, preview in {os.path.abspath(args.preview)}")
+    labelled = 0
+    for i, name in enumerate(todo):
+        with Image.open(os.path.join(args.corpus, name)) as image:
+            preview(image, args.preview, args.zoom)
+            width = image.width
+        answer = input(f"[{i + 1}/{len(todo)}] {name} gap left x (0-{width - 1}, enter to skip, q to quit): ").strip()
+        if answer.lower() == 'q':
+            break
+        if not answer:
+            continue
+        try:
+            x = float(answer)
+        except ValueError:
+            print(f"Not a number: {answer}, skipped.")
+            continue
+        if not 0 <= x < width:
+            print(f"Out of the image width {width}, skipped.")
+            continue
+        save_label(args.corpus, name, x)
+        labelled += 1
+    print(f"Labelled {labelled} images.")
+    sys.exit(0)
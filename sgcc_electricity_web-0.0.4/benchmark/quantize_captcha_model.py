@@ -0,0 +1,58 @@
+'''把验证码模型量化为 INT8，生成 src/electricity/captcha.int8.onnx，配置 captcha_model: 'int8' 后使用
+
+    # 动态量化: 只量化权重，不需要样本
+    python benchmark/quantize_captcha_model.py
+    # 静态量化: 用语料目录中的验证码背景校准激活值的范围，卷积网络上通常更快也更准
+    python benchmark/quantize_captcha_model.py --calibration benchmark/captcha_corpus
+
+量化后用 compare_captcha_models.py 对比精度和延迟，精度不下降时再切换。需要额外安装 onnx 包。
+'''
+import argparse
+import os
+import sys
+
+from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+from harness import SRC_DIR
+from captcha_corpus import load_corpus
+
+sys.path.insert(0, SRC_DIR)
+from electricity.onnx import MODEL_VARIANTS, ONNX  # noqa: E402
+
+
+class CorpusReader(CalibrationDataReader):
+    '''按与推理时相同的预处理把语料逐张交给静态量化校准'''
+
+    def __init__(self, onnx, corpus):
+        self.onnx = onnx
+        self.images = iter(image for _, image, _ in corpus)
+
+    def get_next(self):
+        image = next(self.images, None)
+        if image is None:
+            return None
+        self.onnx.preprocess(image)
+        # 预处理写入的是复用的缓冲区，校准会保留输入，需要复制
+        return {self.onnx.input_name: self.onnx._input_buffer().copy()}
+
+
+if __name__ == '__main__':
+    model_dir = os.path.join(SRC_DIR, 'electricity')
+    parser = argparse.ArgumentParser(description='Quantize the captcha model to INT8.')
+    parser.add_argument('--model', default=os.path.join(model_dir, MODEL_VARIANTS['float']))
+    parser.add_argument('--output', default=os.path.join(model_dir, MODEL_VARIANTS['int8']))
+    parser.add_argument('--calibration', help='corpus folder for static quantization, dynamic quantization when omitted')
+    args = parser.parse_args()
+
+    if args.calibration:
+        corpus = load_corpus(args.calibration)
+        if not corpus:
+            sys.exit(f"No images in {args.calibration}")
+        reader = CorpusReader(ONNX(args.model, optimization='disable'), corpus)
+        quantize_static(args.model, args.output, reader, quant_format=QuantFormat.QDQ,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True)
+        print(f"Static INT8 model calibrated with {len(corpus)} images saved to {args.output}")
+    else:
+        quantize_dynamic(args.model, args.output, weight_type=QuantType.QUInt8)
+        print(f"Dynamic INT8 model saved to {args.output}")
+    print(f"Size: {os.path.getsize(args.model) / 1024:.0f}KB -> {os.path.getsize(args.output) / 1024:.0f}KB")
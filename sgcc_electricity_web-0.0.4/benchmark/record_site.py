@@ -0,0 +1,136 @@
+'''用真实账号登录一次 95598，把抓取过程中的页面、脚本、验证码图片和接口响应录制到目录中，供 replay_server.py 回放
+
+    python benchmark/record_site.py benchmark/recordings/default --phone 138xxxxxxxx --password xxxx
+
+录制结果包含户号、地址、用电数据和登录态，只用于本地和内网 CI，不要提交到公开仓库。
+'''
+import argparse
+import base64
+import json
+import logging
+import os
+from urllib.parse import urlsplit
+
+from harness import parse_overrides, prepare
+from replay_server import INDEX_FILE, body_hash
+
+
+class Recorder:
+    '''从 performance 日志中取出本站的所有响应，连同响应体一起写入录制目录'''
+
+    def __init__(self, folder, origin):
+        self.folder = folder
+        self.origin = origin
+        self.entries = []
+        self._seen = set()
+        os.makedirs(os.path.join(folder, 'bodies'), exist_ok=True)
+
+    def dump(self, driver):
+        requests = {}
+        responses = []
+        for entry in driver.get_log('performance'):
+            message = json.loads(entry['message'])['message']
+            params = message.get('params', {})
+            if message.get('method') == 'Network.requestWillBeSent':
+                requests[params['requestId']] = params['request']
+            elif message.get('method') == 'Network.responseReceived':
+                responses.append(params)
+        for params in responses:
+            request_id = params['requestId']
+            response = params['response']
+            url = urlsplit(response['url'])
+            if f"{url.scheme}://{url.netloc}" != self.origin or request_id in self._seen:
+                continue
+            request = requests.get(request_id, {})
+            try:
+                body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            except Exception as e:
+                logging.warning(f"Skip {response['url']}, read body failed: {e}")
+                continue
+            self._seen.add(request_id)
+            content = base64.b64decode(body['body']) if body.get('base64Encoded') else body['body'].encode('utf-8')
+            name = f"bodies/{len(self.entries):05d}"
+            with open(os.path.join(self.folder, name), 'wb') as file:
+                file.write(content)
+            self.entries.append({
+                'method': request.get('method', 'GET'),
+                'path': url.path,
+                'body_hash': body_hash(request.get('postData')),
+                'status': response.get('status', 200),
+                'mime': response.get('mimeType'),
+                'file': name,
+            })
+
+    def save(self):
+        with open(os.path.join(self.folder, INDEX_FILE), 'w') as file:
+            json.dump(self.entries, file, ensure_ascii=False, indent=2)
+        logging.info(f"Recorded {len(self.entries)} responses to {self.folder}")
+
+
+def recording_fetcher(fetcher_class, recorder):
+    '''在每次跳转页面之前和各个步骤结束后录制响应，页面跳转后之前的响应体会被回收'''
+
+    class RecordingFetcher(fetcher_class):
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            # 抓包模式会开启 performance 日志，这里由 Recorder 接管日志的读取
+            self.FETCH_MODE = 'capture'
+            self.capture = self
+
+        def drain(self, driver):
+            recorder.dump(driver)
+
+        def collect(self, driver):
+            recorder.dump(driver)
+            return {}
+
+        def _open(self, driver, url):
+            recorder.dump(driver)
+            super()._open(driver, url)
+            recorder.dump(driver)
+
+        def _wait_slide_verify(self, driver):
+            super()._wait_slide_verify(driver)
+            recorder.dump(driver)
+
+        def _sliding_track(self, driver, distance):
+            super()._sliding_track(driver, distance)
+            recorder.dump(driver)
+
+        def _fetch_users(self, driver, *args, **kwargs):
+            try:
+                return super()._fetch_users(driver, *args, **kwargs)
+            finally:
+                recorder.dump(driver)
+
+    return RecordingFetcher
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record the 95598 site for offline replay.')
+    parser.add_argument('output', help='directory to write the recording to')
+    parser.add_argument('--phone', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--base-url', default='https://www.95598.cn')
+    parser.add_argument('--set', action='append', metavar='KEY=VALUE', help='override electricity config')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)-8s] ---- %(message)s')
+
+    output = os.path.abspath(args.output)
+    # 录制时每次都完整登录并抓取全部数据，回放时才能覆盖所有页面
+    electricity = dict(persist_session=False, incremental_fetch=False, user_concurrency=1, resident_browser=False, resume_max_attempts=0)
+    electricity.update(parse_overrides(args.set))
+    prepare(args.base_url, electricity)
+
+    from electricity.data_fetcher import DataFetcher
+
+    recorder = Recorder(output, args.base_url.rstrip('/'))
+    fetcher = recording_fetcher(DataFetcher, recorder)(args.phone, args.password)
+    try:
+        data = fetcher.fetch()
+    finally:
+        recorder.save()
+        fetcher.close()
+    with open(os.path.join(output, 'expected.json'), 'w') as file:
+        json.dump(data, file, ensure_ascii=False, indent=2, default=str)
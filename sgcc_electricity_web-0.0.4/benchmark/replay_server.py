@@ -0,0 +1,151 @@
+'''国网 95598 网站的离线回放服务
+
+按 record_site.py 录制的目录回放登录页、滑块验证码、账户余额页、用电量页及其接口响应，
+配合环境变量 SGCC_BASE_URL 让 DataFetcher 在没有网络、没有真实账号的环境下完整跑一遍抓取流程。
+
+    python benchmark/replay_server.py benchmark/recordings/default --port 8765
+'''
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+INDEX_FILE = 'index.json'
+
+
+def body_hash(body):
+    '''请求体的摘要，用于区分同一接口的不同请求(例如切换户号)'''
+    if not body:
+        return ''
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return hashlib.sha1(body).hexdigest()[:12]
+
+
+class Recording:
+    '''录制目录: index.json 记录每个响应的请求方法、路径、请求体摘要、状态码和类型，响应体保存在单独的文件中'''
+
+    def __init__(self, folder):
+        self.folder = folder
+        with open(os.path.join(folder, INDEX_FILE), 'r') as file:
+            self.entries = json.load(file)
+        self._exact = {}
+        self._by_path = {}
+        for entry in self.entries:
+            self._exact.setdefault((entry['method'], entry['path'], entry.get('body_hash', '')), []).append(entry)
+            self._by_path.setdefault((entry['method'], entry['path']), []).append(entry)
+        self._served = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, method, path, body):
+        '''优先按请求体精确匹配，其次按路径匹配；同一请求录到多个响应时按顺序轮流返回'''
+        key = (method, path, body_hash(body))
+        candidates = self._exact.get(key) or self._by_path.get((method, path))
+        if not candidates:
+            return None
+        with self._lock:
+            count = self._served.get(key, 0)
+            self._served[key] = count + 1
+        return candidates[count % len(candidates)]
+
+    def read_body(self, entry):
+        with open(os.path.join(self.folder, entry['file']), 'rb') as file:
+            return file.read()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _replay(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        path = urlsplit(self.path).path
+        entry = self.server.recording.lookup(self.command, path, body)
+        if entry is None:
+            self.server.misses.append(f"{self.command} {path}")
+            logging.warning(f"No recorded response for {self.command} {path}")
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        content = self.server.recording.read_body(entry) if self.command != 'HEAD' else b''
+        self.send_response(entry.get('status', 200))
+        self.send_header('Content-Type', entry.get('mime') or 'application/octet-stream')
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_HEAD = _replay
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header('Access-Control-Allow-Origin', self.headers.get('Origin') or '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', self.headers.get('Access-Control-Request-Headers') or '*')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logging.debug(f"Replay {self.address_string()} {format % args}")
+
+
+class ReplayServer:
+    '''在后台线程中运行的回放服务，port 为 0 时自动选择空闲端口'''
+
+    def __init__(self, folder, host='127.0.0.1', port=0):
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.recording = Recording(folder)
+        self._httpd.misses = []
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def misses(self):
+        '''回放过程中没有找到录制响应的请求'''
+        return list(self._httpd.misses)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='replay-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay a recorded 95598 site.')
+    parser.add_argument('recording', help='directory written by record_site.py')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)-8s] ---- %(message)s')
+
+    server = ReplayServer(args.recording, args.host, args.port)
+    logging.info(f"Replaying {args.recording} at {server.base_url}, export SGCC_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -27,9 +27,21 @@ if platform.system() == 'Windows':
     run_type = 'windows'
     DEBUG = True
 
+# 兼容只填写了单个 phone_number/password 的旧配置
+accounts = list(data['electricity'].get('accounts') or [])
+if data['electricity'].get('phone_number'):
+    accounts.insert(0, {
+        'phone_number': data['electricity']['phone_number']
+        ,'password': data['electricity'].get('password', '')
+    })
+# phone_number/password 和 accounts 在 add-on 中都是可选项，至少要填写其中一种
+if not accounts:
+    raise ValueError("No account is configured, set electricity.phone_number/password or electricity.accounts.")
+
 electricity = {
-    'phone_number': data['electricity']['phone_number']
-    ,'password': data['electricity']['password']
+    'phone_number': data['electricity'].get('phone_number', '')
+    ,'password': data['electricity'].get('password', '')
+    ,'accounts': accounts
     ,'deiver_impltcity_wait_time': int(data['electricity'].get('deiver_impltcity_wait_time', '60'))
     ,'retry_times_limit': int(data['electricity'].get('retry_times_limit', '5'))
     ,'login_expected_time': int(data['electricity'].get('login_expected_time', '60'))
@@ -37,6 +49,49 @@ electricity = {
     ,'data_retention_days': int(data['electricity'].get('data_retention_days', '7'))
     ,'ignore_user_id': data['electricity'].get('ignore_user_id', [])
     ,'cron_hour': data['electricity'].get('cron_hour', '7,19')
+    ,'wait_poll_interval': float(data['electricity'].get('wait_poll_interval', '0.2'))
+    ,'wait_quiet_time': float(data['electricity'].get('wait_quiet_time', '0.5'))
+    ,'persist_session': bool(data['electricity'].get('persist_session', True))
+    ,'fetch_mode': data['electricity'].get('fetch_mode', 'dom')
+    ,'max_browsers': int(data['electricity'].get('max_browsers', '0'))
+    ,'browser_memory_mb': int(data['electricity'].get('browser_memory_mb', '400'))
+    ,'user_concurrency': int(data['electricity'].get('user_concurrency', '1'))
+    ,'resident_browser': bool(data['electricity'].get('resident_browser', False))
+    ,'browser_max_runs': int(data['electricity'].get('browser_max_runs', '20'))
+    ,'browser_max_rss_mb': int(data['electricity'].get('browser_max_rss_mb', '800'))
+    ,'incremental_fetch': bool(data['electricity'].get('incremental_fetch', True))
+    ,'daily_mutable_days': int(data['electricity'].get('daily_mutable_days', '2'))
+    ,'lean_profile': bool(data['electricity'].get('lean_profile', False))
+    ,'resume_delay_minutes': int(data['electricity'].get('resume_delay_minutes', '5'))
+    ,'resume_max_attempts': int(data['electricity'].get('resume_max_attempts', '3'))
+    ,'step_retry_attempts': int(data['electricity'].get('step_retry_attempts', '3'))
+    ,'step_retry_base_delay': float(data['electricity'].get('step_retry_base_delay', '1'))
+    ,'step_retry_max_delay': float(data['electricity'].get('step_retry_max_delay', '30'))
+    ,'login_failure_threshold': int(data['electricity'].get('login_failure_threshold', '3'))
+    ,'login_cooldown_minutes': int(data['electricity'].get('login_cooldown_minutes', '360'))
+    ,'backfill_years': int(data['electricity'].get('backfill_years', '0'))
+    ,'backfill_days': int(data['electricity'].get('backfill_days', '0'))
+    ,'backfill_window_days': int(data['electricity'].get('backfill_window_days', '30'))
+    ,'backfill_request_interval': float(data['electricity'].get('backfill_request_interval', '5'))
+    ,'backfill_interval_minutes': int(data['electricity'].get('backfill_interval_minutes', '30'))
+    ,'backfill_max_minutes': int(data['electricity'].get('backfill_max_minutes', '20'))
+    ,'captcha_factor': float(data['electricity'].get('captcha_factor', '1.06'))
+    ,'captcha_confidence': float(data['electricity'].get('captcha_confidence', '0.7'))
+    ,'captcha_calibrate': bool(data['electricity'].get('captcha_calibrate', True))
+    ,'run_timeout_minutes': int(data['electricity'].get('run_timeout_minutes', '30'))
+    ,'run_max_rss_mb': int(data['electricity'].get('run_max_rss_mb', '1500'))
+    ,'fetch_backend': data['electricity'].get('fetch_backend', 'browser')
+    ,'http_concurrency': int(data['electricity'].get('http_concurrency', '4'))
+    ,'http_timeout': int(data['electricity'].get('http_timeout', '15'))
+    ,'onnx_optimization': data['electricity'].get('onnx_optimization', 'all')
+    ,'onnx_intra_op_threads': int(data['electricity'].get('onnx_intra_op_threads', '0'))
+    ,'onnx_inter_op_threads': int(data['electricity'].get('onnx_inter_op_threads', '0'))
+    ,'onnx_execution_mode': data['electricity'].get('onnx_execution_mode', 'sequential')
+    ,'onnx_cache_model': bool(data['electricity'].get('onnx_cache_model', True))
+    ,'captcha_scales': [float(scale) for scale in data['electricity'].get('captcha_scales', [1.0])]
+    ,'captcha_model': data['electricity'].get('captcha_model', 'float')
+    ,'captcha_collect_corpus': bool(data['electricity'].get('captcha_collect_corpus', False))
+    ,'captcha_slider_block': bool(data['electricity'].get('captcha_slider_block', False))
 }
 
 db = data['db']
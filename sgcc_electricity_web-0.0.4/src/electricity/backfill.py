@@ -0,0 +1,253 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+
+import config
+from .const import ELECTRIC_USAGE_URL
+from .metrics import metrics
+from .page_extract import extract_page
+from .page_selectors import SELECTORS, ACTIONS
+from .watchdog import watchdog
+
+# 连续几个日期窗口都没有数据时认为已经到了最早的记录
+EMPTY_WINDOWS_LIMIT = 2
+# 选择年份或日期范围后，表格在这段时间内既没有行也没有空数据占位时视为超时，下次回填重试
+EMPTY_TABLE_TIMEOUT = 15
+
+
+class BackfillYield(Exception):
+    '''回填让出浏览器(有定时抓取在等待或本次时间预算用完)，进度已保存，下次从断点继续'''
+
+
+class BackfillState:
+    '''每个户号的回填进度: 已完成的年份、日用电量已回填到的最早日期'''
+
+    def __init__(self, data_path, username):
+        user_hash = hashlib.sha1(username.encode('utf-8')).hexdigest()[0:12]
+        self.path = os.path.join(data_path, f"backfill_{user_hash}.json")
+        self.users = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as file:
+                    self.users = json.load(file).get('users', {})
+            except (OSError, ValueError) as e:
+                logging.warning(f"Load backfill progress from {self.path} failed, start over: {e}")
+
+    def user(self, user_id):
+        return self.users.setdefault(user_id, {'years': [], 'daily_before': None, 'empty_windows': 0, 'daily_done': False})
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump({'users': self.users}, file)
+        os.replace(tmp_path, self.path)
+
+
+class RateLimiter:
+    '''两次查询之间至少间隔 min_interval 秒，避免回填给国网带来明显的压力'''
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._last = None
+
+    def wait(self):
+        if self._last is not None:
+            remaining = self.min_interval - (time.monotonic() - self._last)
+            if remaining > 0:
+                time.sleep(remaining)
+        self._last = time.monotonic()
+
+
+class Backfill:
+    '''逐年切换年份下拉框回填月用电量和年度合计，按日期范围向前回填日用电量；每一批在一个事务中写入并保存进度'''
+
+    def __init__(self, fetcher, store, should_yield=None):
+        self.fetcher = fetcher
+        self.store = store
+        self.years = config.electricity['backfill_years']
+        self.days = config.electricity['backfill_days']
+        self.window_days = max(1, config.electricity['backfill_window_days'])
+        self.time_budget = config.electricity['backfill_max_minutes'] * 60
+        self.limiter = RateLimiter(config.electricity['backfill_request_interval'])
+        self.should_yield = should_yield or (lambda: False)
+        self.state = BackfillState(config.data_path, fetcher._username)
+        self._started = time.monotonic()
+
+    @property
+    def enabled(self):
+        return self.years > 0 or self.days > 0
+
+    def _pending_years(self, user_id):
+        done = set(self.state.user(user_id)['years'])
+        current = datetime.now().year
+        return [year for year in range(current, current - self.years, -1) if year not in done]
+
+    def _user_done(self, user_id):
+        return not self._pending_years(user_id) and (self.days <= 0 or self.state.user(user_id)['daily_done'])
+
+    def done(self):
+        '''已知的户号都回填完成；还没有运行过时返回 False'''
+        return bool(self.state.users) and all(self._user_done(user_id) for user_id in self.state.users)
+
+    def _checkpoint(self):
+        if self.should_yield():
+            raise BackfillYield("a regular fetch is waiting")
+        if time.monotonic() - self._started > self.time_budget:
+            raise BackfillYield("time budget used up")
+        self.limiter.wait()
+
+    def run(self):
+        '''执行一轮回填，定时抓取开始或时间预算用完时保存进度并退出'''
+        if not self.enabled or self.done() or self.should_yield():
+            return
+        fetcher = self.fetcher
+        if not fetcher.login_breaker.allow():
+            logging.info(f"Login of {fetcher.masked_username} is paused by the circuit breaker, skip backfill.")
+            return
+        self._started = time.monotonic()
+        if self.days > 0:
+            logging.warning("Daily backfill uses date range selectors not yet verified against the live page, "
+                            "set backfill_days to 0 if it keeps timing out.")
+        driver = fetcher._get_webdriver()
+        # 时间预算只在两批之间检查，卡住的浏览器由 watchdog 在预算之外再留 10 分钟后结束
+        supervisor = watchdog.supervise(driver, self.time_budget + 600, fetcher.RUN_MAX_RSS_MB, name=f"{fetcher.masked_username}-backfill")
+        try:
+            with metrics.span('backfill_login'):
+                if fetcher.PERSIST_SESSION and fetcher._restore_session(driver):
+                    fetcher.login_breaker.record_success()
+                elif fetcher._login(driver):
+                    fetcher.login_breaker.record_success()
+                else:
+                    fetcher.login_breaker.record_failure()
+                    logging.error(f"Backfill login of {fetcher.masked_username} failed.")
+                    return
+            fetcher.waiter.xhr_idle(driver)
+            user_id_list = fetcher._get_user_ids(driver)
+            for userid_index, user_id in enumerate(user_id_list):
+                if user_id in config.electricity['ignore_user_id'] or self._user_done(user_id):
+                    continue
+                self._backfill_months(driver, userid_index, user_id)
+                self._backfill_daily(driver, userid_index, user_id)
+            logging.info(f"Backfill of {fetcher.masked_username} finished.")
+        except BackfillYield as e:
+            logging.info(f"Backfill of {fetcher.masked_username} paused: {e}.")
+        finally:
+            supervisor.stop()
+            fetcher._quit_driver(driver)
+            watchdog.reap()
+
+    def _open_usage(self, driver, userid_index, tab):
+        self.fetcher._open(driver, ELECTRIC_USAGE_URL)
+        self.fetcher._choose_current_userid(driver, userid_index)
+        self.fetcher._click_button(driver, By.XPATH, ACTIONS[tab])
+
+    def _wait_rows(self, driver, page, pane):
+        '''等待表格稳定后读取整页；表格已加载但没有数据时返回 rows 为空的页面，超时抛出 TimeoutException'''
+        waiter = self.fetcher.waiter
+        rows_xpath = SELECTORS[page]['rows']['xpath']
+        empty_xpath = ACTIONS['table_empty'].format(pane=pane)
+        waiter.xhr_idle(driver)
+        state = {'since': None}
+
+        def _settled(d):
+            if d.find_elements(By.XPATH, rows_xpath):
+                return 'rows'
+            # 空数据占位持续 quiet_time 才认为确实没有数据，避免把请求返回之前的空表格当成没有数据
+            if not d.find_elements(By.XPATH, empty_xpath):
+                state['since'] = None
+                return False
+            state['since'] = state['since'] or time.monotonic()
+            return 'empty' if time.monotonic() - state['since'] >= waiter.quiet_time else False
+
+        with waiter.no_implicit_wait(driver):
+            settled = waiter.until(driver, f"table {page}", _settled, EMPTY_TABLE_TIMEOUT)
+        if settled == 'empty':
+            return {'rows': []}
+        waiter.rows_stable(driver, By.XPATH, rows_xpath, EMPTY_TABLE_TIMEOUT)
+        return extract_page(driver, page)
+
+    def _read_year(self, driver, year):
+        self.fetcher._click_button(driver, By.XPATH, ACTIONS['year_input'])
+        option = self.fetcher.waiter.element_visible(driver, By.XPATH, ACTIONS['year_option'].format(year=year))
+        option.click()
+        return self._wait_rows(driver, 'usage_month', 'pane-first')
+
+    def _backfill_months(self, driver, userid_index, user_id):
+        years = self._pending_years(user_id)
+        if not years:
+            return
+        progress = self.state.user(user_id)
+        current = datetime.now().year
+        self._open_usage(driver, userid_index, 'tab_month')
+        for year in years:
+            self._checkpoint()
+            with metrics.span('backfill_batch', section='month'):
+                try:
+                    page = self.fetcher.retry.call('backfill_month', self._read_year, driver, year)
+                except TimeoutException:
+                    # 页面加载慢不代表该年没有数据，不记录进度，下一轮回填重试
+                    logging.warning(f"Backfill months of {year} for {user_id} timed out, retry in the next round.")
+                    return
+                month, usage, charge = self.fetcher._get_month_usage(page) if page.get('rows') else (None, None, None)
+                if month:
+                    with self.store.transaction():
+                        for i in range(len(month)):
+                            self.store.insert_month_info(user_id, month[i][0:7] + '-01', usage[i], charge[i])
+                        if page.get('yearly_usage') is not None and page.get('yearly_charge') is not None:
+                            self.store.insert_year_info(user_id, f"{year}-01-01", page['yearly_usage'], page['yearly_charge'])
+            logging.info(f"Backfill {len(month or [])} months of {year} for {user_id}.")
+            # 今年还没有账单(如一月)时继续回填往年，今年的账单由定时抓取更新
+            progress['years'].append(year)
+            if not month and year < current:
+                # 往年没有账单说明已经到了最早的记录，更早的年份也不会有数据
+                progress['years'].extend(y for y in years if y < year)
+                self.state.save()
+                return
+            self.state.save()
+
+    def _read_daily_range(self, driver, start, end):
+        start_input = driver.find_element(By.XPATH, ACTIONS['daily_start_date'])
+        end_input = driver.find_element(By.XPATH, ACTIONS['daily_end_date'])
+        start_input.clear()
+        start_input.send_keys(start)
+        end_input.clear()
+        end_input.send_keys(end + Keys.ENTER)
+        return self._wait_rows(driver, 'usage_daily', 'pane-second')
+
+    def _backfill_daily(self, driver, userid_index, user_id):
+        progress = self.state.user(user_id)
+        if self.days <= 0 or progress['daily_done']:
+            return
+        oldest = datetime.now() - timedelta(days=self.days)
+        self._open_usage(driver, userid_index, 'tab_daily')
+        while True:
+            before = datetime.strptime(progress['daily_before'], '%Y-%m-%d') if progress['daily_before'] else datetime.now()
+            end = before - timedelta(days=1)
+            if end < oldest or progress['empty_windows'] >= EMPTY_WINDOWS_LIMIT:
+                progress['daily_done'] = True
+                self.state.save()
+                return
+            start = max(oldest, end - timedelta(days=self.window_days - 1))
+            self._checkpoint()
+            with metrics.span('backfill_batch', section='daily'):
+                try:
+                    page = self.fetcher.retry.call('backfill_daily', self._read_daily_range, driver, start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))
+                except TimeoutException:
+                    # 超时不计入连续无数据的窗口，下一轮回填重试
+                    logging.warning(f"Backfill days from {start:%Y-%m-%d} to {end:%Y-%m-%d} for {user_id} timed out, retry in the next round.")
+                    return
+                dates, usages = self.fetcher._get_daily_usage_data(page)
+                if dates:
+                    with self.store.transaction():
+                        self.store.insert_all_daily_info(user_id, [{'date': dates[i], 'usage': usages[i]} for i in range(len(dates))])
+            logging.info(f"Backfill {len(dates or [])} days from {start:%Y-%m-%d} to {end:%Y-%m-%d} for {user_id}.")
+            progress['daily_before'] = start.strftime('%Y-%m-%d')
+            progress['empty_windows'] = 0 if dates else progress['empty_windows'] + 1
+            self.state.save()
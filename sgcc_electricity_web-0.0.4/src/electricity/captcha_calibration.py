@@ -0,0 +1,182 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from .onnx import INPUT_SIZE
+
+# 拟合所需的最少样本数，不足时使用配置中的初始值
+MIN_SAMPLES = 20
+# 只用最近的记录拟合，网站更换验证码样式后能较快适应
+HISTORY_SIZE = 500
+# 低于该置信度的框直接丢弃，介于它和拟合阈值之间的框按 EXPLORE_RATE 偶尔尝试滑动，以便阈值可以向下修正
+CONFIDENCE_FLOOR = 0.3
+EXPLORE_RATE = 0.1
+# 每次滑动时在补偿系数上加入的随机扰动，成功记录分布在可通过的区间内，取中位数即为区间中心
+FACTOR_JITTER = 0.02
+# 置信度阈值要保证滑动的成功率不低于该值，否则刷新验证码更划算
+MIN_SUCCESS_RATE = 0.5
+# 收集基准测试语料时最多保存的背景图片数
+CORPUS_LIMIT = 1000
+
+
+def image_hash(image_base64):
+    return hashlib.sha1(image_base64.encode('utf-8')).hexdigest()[0:16]
+
+
+class CaptchaCalibration:
+    '''记录每次滑块验证的结果，并据此拟合滑动距离的补偿系数和识别框的置信度阈值'''
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, data_path, factor=1.06, threshold=0.7, enabled=True, collect_corpus=False, distance_mode='gap'):
+        self.path = os.path.join(data_path, 'captcha_attempts.jsonl')
+        # 滑动距离的定义: gap 为缺口的 x1，block 为缺口 x1 减去拼图块的左边距；只用同一定义的记录拟合
+        self.distance_mode = distance_mode
+        self.default_factor = factor
+        self.default_threshold = threshold
+        self.enabled = enabled
+        # 验证通过的背景图片保存为 benchmark/captcha_corpus.py 格式的语料，标注需要人工补充
+        self.corpus_dir = os.path.join(data_path, 'captcha_corpus') if collect_corpus else None
+        self._lock = threading.Lock()
+        self.history = self._load()
+        self.factor, self.threshold = self._fit()
+        logging.info(f"Captcha calibration ({distance_mode} distance): factor {self.factor:.4f}, confidence threshold {self.threshold:.2f}, {len(self.history)} attempts in history.")
+
+    @classmethod
+    def shared(cls, data_path, **kwargs):
+        '''同一数据目录下的所有账号共用一份记录'''
+        with cls._instances_lock:
+            if data_path not in cls._instances:
+                cls._instances[data_path] = cls(data_path, **kwargs)
+            return cls._instances[data_path]
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return []
+        history = []
+        try:
+            with open(self.path, 'r') as file:
+                for line in file:
+                    try:
+                        history.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError as e:
+            logging.warning(f"Load captcha attempts from {self.path} failed: {e}")
+        if len(history) > HISTORY_SIZE * 2:
+            history = history[-HISTORY_SIZE:]
+            self._rewrite(history)
+        return history[-HISTORY_SIZE:]
+
+    def _rewrite(self, history):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            for item in history:
+                file.write(json.dumps(item) + '\n')
+        os.replace(tmp_path, self.path)
+
+    def _fit(self):
+        if not self.enabled:
+            return self.default_factor, self.default_threshold
+        # 没有 distance_mode 的旧记录的距离都是缺口的 x1
+        slid = [item for item in self.history if item['outcome'] in ('success', 'fail') and item.get('distance_mode', 'gap') == self.distance_mode]
+
+        factor = self.default_factor
+        ratios = sorted(item['offset'] / self._distance(item) for item in slid if item['outcome'] == 'success' and self._distance(item) > 0)
+        if len(ratios) >= MIN_SAMPLES:
+            factor = ratios[len(ratios) // 2]
+
+        threshold = self.default_threshold
+        if len(slid) >= MIN_SAMPLES:
+            # 满足成功率要求的最低阈值；样本不足的区间不参与判断
+            for candidate in [CONFIDENCE_FLOOR + 0.05 * i for i in range(int((0.95 - CONFIDENCE_FLOOR) / 0.05) + 1)]:
+                above = [item for item in slid if item['confidence'] >= candidate]
+                if len(above) < MIN_SAMPLES:
+                    break
+                if sum(item['outcome'] == 'success' for item in above) / len(above) >= MIN_SUCCESS_RATE:
+                    threshold = candidate
+                    break
+        return factor, threshold
+
+    @staticmethod
+    def _distance(item):
+        return item['distance'] if item.get('distance') is not None else item['box'][0]
+
+    def should_slide(self, confidence):
+        '''识别框的置信度足够时滑动，否则直接刷新验证码'''
+        if confidence is None or confidence < CONFIDENCE_FLOOR:
+            return False
+        if confidence >= self.threshold:
+            return True
+        return self.enabled and random.random() < EXPLORE_RATE
+
+    def attempt_factor(self):
+        '''本次滑动使用的补偿系数'''
+        if not self.enabled:
+            return self.factor
+        return self.factor * random.uniform(1 - FACTOR_JITTER, 1 + FACTOR_JITTER)
+
+    def record(self, image_base64, box, confidence, factor, offset, outcome, distance=None):
+        '''outcome: success / fail / refresh；distance 为乘以补偿系数之前的滑动距离'''
+        item = {
+            'time': int(time.time()),
+            'image': image_hash(image_base64),
+            'box': [round(float(v), 1) for v in box] if box is not None else None,
+            'confidence': round(float(confidence), 4) if confidence is not None else None,
+            'factor': round(factor, 4) if factor is not None else None,
+            'offset': offset,
+            'distance': distance,
+            'distance_mode': self.distance_mode,
+            'outcome': outcome,
+        }
+        with self._lock:
+            self.history.append(item)
+            self.history = self.history[-HISTORY_SIZE:]
+            try:
+                with open(self.path, 'a') as file:
+                    file.write(json.dumps(item) + '\n')
+            except OSError as e:
+                logging.warning(f"Save captcha attempt to {self.path} failed: {e}")
+            if outcome != 'refresh':
+                self.factor, self.threshold = self._fit()
+            if outcome == 'success' and self.corpus_dir and box is not None:
+                self._save_sample(image_base64, item['image'], box[0], offset, factor)
+
+    def _save_sample(self, image_base64, name, x1, offset, factor):
+        '''保存背景图片，并在 samples.json 中记录模型识别的位置和通过验证的滑动距离
+
+        模型自己的识别结果不能作为标注，否则误差只衡量模型与自己的差距；labels.json 由人工标注(label_captcha_corpus.py)写入
+        '''
+        samples_path = os.path.join(self.corpus_dir, 'samples.json')
+        try:
+            os.makedirs(self.corpus_dir, exist_ok=True)
+            samples = {}
+            if os.path.exists(samples_path):
+                with open(samples_path, 'r') as file:
+                    samples = json.load(file)
+            if len(samples) >= CORPUS_LIMIT:
+                return
+            data = base64.b64decode(image_base64)
+            width = Image.open(BytesIO(data)).width
+            with open(os.path.join(self.corpus_dir, f"{name}.png"), 'wb') as file:
+                file.write(data)
+            samples[f"{name}.png"] = {
+                'time': int(time.time()),
+                'model_x': round(float(x1) * width / INPUT_SIZE, 1),
+                'offset': offset,
+                'factor': round(factor, 4),
+            }
+            with open(samples_path + '.tmp', 'w') as file:
+                json.dump(samples, file, indent=0)
+            os.replace(samples_path + '.tmp', samples_path)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Save captcha sample to {self.corpus_dir} failed: {e}")
@@ -1,6 +1,47 @@
+import os
+
 # 填写普通参数 不要填写密码等敏感信息
-# 国网电力官网
-LOGIN_URL = "https://www.95598.cn/osgweb/login"
-ELECTRIC_USAGE_URL = "https://www.95598.cn/osgweb/electricityCharge"
-BALANCE_URL = "https://www.95598.cn/osgweb/userAcc"
+# 国网电力官网，设置环境变量 SGCC_BASE_URL 可以指向本地的离线回放服务(见 benchmark/replay_server.py)
+BASE_URL = os.environ.get("SGCC_BASE_URL", "https://www.95598.cn").rstrip("/")
+LOGIN_URL = f"{BASE_URL}/osgweb/login"
+ELECTRIC_USAGE_URL = f"{BASE_URL}/osgweb/electricityCharge"
+BALANCE_URL = f"{BASE_URL}/osgweb/userAcc"
+
+
+# 抓包模式下需要读取响应体的接口路径片段
+CAPTURE_API_KEYWORDS = ["/api/osg-web0004/", "/api/osg-open-bc0001/", "/api/osg-open-uc0001/"]
+# 抓包模式下各项数据在接口 JSON 中可能使用的字段名
+CAPTURE_FIELDS = {
+    'balance': ["sumMoney", "prepayBal", "balance"],
+    'yearly_usage': ["totalEleNum"],
+    'yearly_charge': ["totalEleCost"],
+    'month_list': ["mothEleList", "monthEleList"],
+    'month_date': ["month"],
+    'month_usage': ["monthEleNum"],
+    'month_charge': ["monthEleCost"],
+    'daily_list': ["sevenEleList", "dayEleList"],
+    'daily_date': ["day"],
+    'daily_usage': ["dayElePq"],
+    'user_list': ["powerUserList", "consNoList"],
+    'user_id': ["consNo_dst", "consNo"],
+    'user_location': ["elecAddr_dst", "elecAddr"],
+}
+
+# http 模式下直接请求的数据接口，与 capture 模式中页面发出的请求一致；body 中的 {user_id} 等占位符在请求时替换
+HTTP_API = {
+    'user_list': {'path': "/api/osg-open-uc0001/member/c9/f02", 'body': {}},
+    'balance': {'path': "/api/osg-open-bc0001/member/c05/f01", 'body': {'consNo': "{user_id}"}},
+    'month': {'path': "/api/osg-web0004/member/c24/f01", 'body': {'consNo': "{user_id}", 'queryYear': "{year}"}},
+    'daily': {'path': "/api/osg-web0004/member/c24/f01", 'body': {'consNo': "{user_id}", 'startTime': "{start}", 'endTime': "{end}"}},
+}
+# 登录后保存在 localStorage 中的 token，http 模式下通过请求头带上
+HTTP_TOKEN_KEYS = ["token", "accessToken"]
+HTTP_TOKEN_HEADER = "Authorization"
 
+# 精简浏览器模式下的窗口大小和屏蔽的资源(字体、统计脚本、非验证码图片和媒体)
+LEAN_WINDOW_SIZE = "1280,800"
+LEAN_BLOCKED_URL_PATTERNS = [
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.ico", "*.webp", "*.mp4",
+    "*hm.baidu.com*", "*cnzz.com*", "*google-analytics.com*", "*googletagmanager.com*",
+]
@@ -5,14 +5,21 @@ import subprocess
 import time
 import traceback
 
+import queue
 import random
+import threading
 import base64
+import functools
+import shutil
+import tempfile
 import json
 import requests
 import undetected_chromedriver as uc
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from selenium import webdriver
 from selenium.webdriver import ActionChains
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
@@ -24,7 +31,20 @@ import numpy as np
 # import cv2
 from io import BytesIO
 from PIL import Image
-from .onnx import ONNX
+from .onnx import ONNX, INPUT_SIZE, model_path
+from .waiter import Waiter
+from .session_store import SessionStore
+from .network_capture import NetworkCapture
+from .http_backend import HttpBackend, HttpSessionExpired
+from .resident_browser import ResidentBrowser
+from .page_selectors import SELECTORS, ACTIONS
+from .page_extract import extract_page
+from .run_journal import RunJournal, SECTIONS
+from .retry import RetryPolicy, LoginCircuitBreaker
+from .captcha_calibration import CaptchaCalibration
+from .watchdog import watchdog
+from .procutil import driver_rss_mb
+from .metrics import metrics
 import platform
 import config
 
@@ -69,17 +89,16 @@ def _get_tracks(distance):
         tracks.append(round(s))
         #速度已经到达v,该速度作为下次的初速度
         v = v0+a*t
-    print("sum(tracks) is {}, sum(tracks) - distance is {}",sum(tracks),sum(tracks)-round(distance*1.02))
+    logging.debug(f"sum(tracks) is {sum(tracks)}, sum(tracks) - distance is {sum(tracks) - distance}")
     tracks.append(sum(tracks)-distance)
     logging.info(f"image tracks distance is {sum(tracks)}")
     return tracks 
 
 def base64_to_PLI(base64_str: str):
-    base64_data = re.sub('^data:image/.+;base64,', '', base64_str)
-    byte_data = base64.b64decode(base64_data)
-    image_data = BytesIO(byte_data)
-    img = Image.open(image_data)
-    return img
+    '''data URL 或纯 base64 字符串解码为 PIL 图片，图片数据只在 ONNX.preprocess 缩放时才真正解码'''
+    if base64_str.startswith('data:'):
+        base64_str = base64_str.partition(',')[2]
+    return Image.open(BytesIO(base64.b64decode(base64_str)))
 
 # # cv2转base64
 # def cv2_to_base64(img):
@@ -122,59 +141,44 @@ def base64_to_PLI(base64_str: str):
 #     return im.copy()[box[1]:box[3], box[0]:box[2], :]
 
 def get_transparency_location(image):
-    '''获取基于透明元素裁切图片的左上角、右下角坐标
+    '''获取基于透明元素裁切图片的左上角、右下角坐标，即所有不透明(alpha 不为 0)像素的外接矩形
 
-    :param image: cv2加载好的图像
-    :return: (left, upper, right, lower)元组
+    :param image: RGBA 的 PIL 图片或 [高, 宽, 4] 的数组
+    :return: (left, upper, right, lower)元组，包含边界像素；图片完全透明时返回 None
     '''
-    # 1. 扫描获得最左边透明点和最右边透明点坐标
-    height, width, channel = image.shape  # 高、宽、通道数
-    assert channel == 4  # 无透明通道报错
-    first_location = None  # 最先遇到的透明点
-    last_location = None  # 最后遇到的透明点
-    first_transparency = []  # 从左往右最先遇到的透明点，元素个数小于等于图像高度
-    last_transparency = []  # 从左往右最后遇到的透明点，元素个数小于等于图像高度
-    for y, rows in enumerate(image):
-        for x, BGRA in enumerate(rows):
-            alpha = BGRA[3]
-            if alpha != 0:
-                if not first_location or first_location[1] != y:  # 透明点未赋值或为同一列
-                    first_location = (x, y)  # 更新最先遇到的透明点
-                    first_transparency.append(first_location)
-                last_location = (x, y)  # 更新最后遇到的透明点
-        if last_location:
-            last_transparency.append(last_location)
-
-    # 2. 矩形四个边的中点
-    top = first_transparency[0]
-    bottom = first_transparency[-1]
-    left = None
-    right = None
-    for first, last in zip(first_transparency, last_transparency):
-        if not left:
-            left = first
-        if not right:
-            right = last
-        if first[0] < left[0]:
-            left = first
-        if last[0] > right[0]:
-            right = last
-
-    # 3. 左上角、右下角
-    upper_left = (left[0], top[1])  # 左上角
-    bottom_right = (right[0], bottom[1])  # 右下角
-
-    return upper_left[0], upper_left[1], bottom_right[0], bottom_right[1]
+    pixels = np.asarray(image)
+    assert pixels.ndim == 3 and pixels.shape[2] == 4  # 无透明通道报错
+    opaque = pixels[..., 3] != 0
+    rows = np.flatnonzero(opaque.any(axis=1))
+    columns = np.flatnonzero(opaque.any(axis=0))
+    if rows.size == 0:
+        return None
+    return int(columns[0]), int(rows[0]), int(columns[-1]), int(rows[-1])
+
+def bill_year():
+    '''月账单所在的年份，一月时还没有今年的月账单，取上一年'''
+    now = datetime.now()
+    return now.year - 1 if now.month == 1 else now.year
+
+# undetected_chromedriver 启动时会修改 chromedriver 文件，多个浏览器需要依次启动
+_webdriver_lock = threading.Lock()
+# 滑块验证码的背景图
+CAPTCHA_BACKGROUND_JS = 'return document.getElementById("slideVerify").childNodes[0].toDataURL("image/png");'
+# 滑块验证码的拼图块，拼图块在自己的 canvas 中的位置与背景中的缺口同高
+CAPTCHA_BLOCK_JS = 'return document.getElementsByClassName("slide-verify-block")[0].toDataURL("image/png");'
 
 class DataFetcher:
 
-    def __init__(self, username: str, password: str):
+    def __init__(self, username: str, password: str, onnx: ONNX = None, store=None):
         self._username = username
         self._password = password
-        basepath = os.path.abspath(__file__)
-        folder = os.path.dirname(basepath)
-        data_path = os.path.join(folder, 'captcha.onnx')
-        self.onnx = ONNX(data_path)
+        self.masked_username = username[0:3] + ('*' * (len(username) - 3))
+        if onnx is None:
+            onnx = ONNX(model_path(config.electricity['captcha_model']), config.electricity['onnx_optimization'], config.electricity['onnx_intra_op_threads'], config.electricity['onnx_inter_op_threads'],
+                        config.electricity['onnx_execution_mode'], config.data_path if config.electricity['onnx_cache_model'] else None)
+        self.onnx = onnx
+        # models.electricity.Electricity，用于增量抓取时查询已保存的数据
+        self.store = store
         if platform.system() == 'Windows':
             pass
         else:
@@ -184,6 +188,39 @@ class DataFetcher:
         self.RETRY_TIMES_LIMIT = config.electricity['retry_times_limit']
         self.LOGIN_EXPECTED_TIME = config.electricity['login_expected_time']
         self.RETRY_WAIT_TIME_OFFSET_UNIT = config.electricity['retry_wait_time_offset_unit']
+        self.waiter = Waiter(self.DRIVER_IMPLICITY_WAIT_TIME, config.electricity['wait_poll_interval'], config.electricity['wait_quiet_time'])
+        self.PERSIST_SESSION = config.electricity['persist_session']
+        self.session_store = SessionStore.for_url(config.data_path, username, LOGIN_URL)
+        self.FETCH_MODE = config.electricity['fetch_mode']
+        self.capture = NetworkCapture()
+        self.USER_CONCURRENCY = config.electricity['user_concurrency']
+        self.RESIDENT_BROWSER = config.electricity['resident_browser']
+        self.INCREMENTAL_FETCH = config.electricity['incremental_fetch']
+        self.DAILY_MUTABLE_DAYS = config.electricity['daily_mutable_days']
+        self.LEAN_PROFILE = config.electricity['lean_profile']
+        self.page_loads = []
+        self.peak_rss_mb = 0
+        self._run_started = time.monotonic()
+        self.browser = ResidentBrowser(self._get_webdriver, config.electricity['browser_max_runs'], config.electricity['browser_max_rss_mb'])
+        self.journal = RunJournal(config.data_path, username)
+        self.RESUME_MAX_ATTEMPTS = config.electricity['resume_max_attempts']
+        # 有缺失的户号或部分需要补抓时保留已登录的浏览器，补抓时直接复用
+        self._live_driver = None
+        self.retry = RetryPolicy(config.electricity['step_retry_attempts'], config.electricity['step_retry_base_delay'], config.electricity['step_retry_max_delay'])
+        self.login_breaker = LoginCircuitBreaker(config.electricity['login_failure_threshold'], config.electricity['login_cooldown_minutes'] * 60)
+        self.RUN_TIMEOUT_MINUTES = config.electricity['run_timeout_minutes']
+        self.RUN_MAX_RSS_MB = config.electricity['run_max_rss_mb']
+        self._supervisor = None
+        # browser 在浏览器页面中读取数据；http 只用浏览器登录，之后通过 HTTP 连接池直接请求数据接口
+        self.FETCH_BACKEND = config.electricity['fetch_backend']
+        self.http = None
+        if self.FETCH_BACKEND == 'http':
+            http_retry = RetryPolicy(config.electricity['step_retry_attempts'], config.electricity['step_retry_base_delay'], config.electricity['step_retry_max_delay'], retry_on=(requests.RequestException, ValueError))
+            self.http = HttpBackend(config.electricity['http_concurrency'], config.electricity['http_timeout'], http_retry)
+        self.CAPTCHA_SCALES = config.electricity['captcha_scales']
+        self.CAPTCHA_SLIDER_BLOCK = config.electricity['captcha_slider_block']
+        self.calibration = CaptchaCalibration.shared(config.data_path, factor=config.electricity['captcha_factor'], threshold=config.electricity['captcha_confidence'], enabled=config.electricity['captcha_calibrate'],
+                                                      collect_corpus=config.electricity['captcha_collect_corpus'], distance_mode='block' if self.CAPTCHA_SLIDER_BLOCK else 'gap')
 
     def base64_api(self, b64, typeid=33):
         data = {"username": self._tujian_uname, "password": self._tujian_passwd, "typeid": typeid, "image": b64}
@@ -198,384 +235,903 @@ class DataFetcher:
     def _get_webdriver(self):
         chrome_options = Options()
         chrome_options.add_argument('--incognito')
-        chrome_options.add_argument('--window-size=4000,1600')
         chrome_options.add_argument('--headless')
         chrome_options.add_argument('--no-sandbox')
         chrome_options.add_argument('--disable-gpu')
         chrome_options.add_argument('--disable-dev-shm-usage')
-        driver = uc.Chrome(driver_executable_path="/usr/bin/chromedriver", options=chrome_options, version_main=self._chromium_version)
+        user_data_dir = None
+        if self.LEAN_PROFILE:
+            chrome_options.add_argument(f'--window-size={LEAN_WINDOW_SIZE}')
+            # 浏览器配置和缓存放在内存文件系统中，减少低端设备上的磁盘 IO
+            user_data_dir = tempfile.mkdtemp(prefix='sgcc-chrome-', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+            chrome_options.add_argument(f'--disk-cache-dir={os.path.join(user_data_dir, "cache")}')
+        else:
+            chrome_options.add_argument('--window-size=4000,1600')
+        if self.FETCH_MODE == 'capture':
+            NetworkCapture.enable(chrome_options)
+        try:
+            with _webdriver_lock, watchdog.launching(), metrics.span('browser_start'):
+                driver = uc.Chrome(driver_executable_path="/usr/bin/chromedriver", options=chrome_options, version_main=self._chromium_version, user_data_dir=user_data_dir)
+                watchdog.track(driver)
+        except Exception:
+            if user_data_dir:
+                shutil.rmtree(user_data_dir, ignore_errors=True)
+            raise
+        if user_data_dir:
+            # 传入 user_data_dir 时 undetected_chromedriver 默认保留目录，这里让 quit 时一并删除
+            driver.keep_user_data_dir = False
+            self._block_resources(driver)
         driver.implicitly_wait(self.DRIVER_IMPLICITY_WAIT_TIME)
+        Waiter.install_xhr_hook(driver)
         return driver
 
+    @staticmethod
+    def _block_resources(driver):
+        '''通过 CDP 屏蔽登录、滑块和数据接口以外不需要的资源'''
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": LEAN_BLOCKED_URL_PATTERNS})
+        except Exception as e:
+            logging.warning(f"Block resources failed, reason: {e}")
+
+    def _open(self, driver, url):
+        '''打开页面并等待加载完成，记录加载耗时和浏览器内存峰值'''
+        def _load():
+            driver.get(url)
+            self.waiter.document_ready(driver)
+
+        with metrics.span('page_load', page=url.rstrip('/').split('/')[-1]):
+            self.retry.call('navigate', _load)
+        try:
+            load_ms = driver.execute_script(
+                "var n = performance.getEntriesByType('navigation')[0]; return n ? n.domComplete - n.startTime : null;")
+            rss = driver_rss_mb(driver)
+        except Exception as e:
+            logging.debug(f"Read page load stats failed: {e}")
+            return
+        self.page_loads.append((url, load_ms))
+        self.peak_rss_mb = max(self.peak_rss_mb, rss)
+        logging.debug(f"Open {url} took {load_ms}ms, webdriver memory {rss:.0f}MB")
+
+    def _page_load_summary(self):
+        loads = [ms for _, ms in self.page_loads if ms is not None]
+        average = sum(loads) / len(loads) if loads else 0
+        profile = 'lean' if self.LEAN_PROFILE else 'default'
+        return f"Browser profile {profile}: {len(loads)} page loads, average {average:.0f}ms, peak memory {self.peak_rss_mb:.0f}MB"
+
     def _login(self, driver):
 
-        driver.get(LOGIN_URL)
+        self._open(driver, LOGIN_URL)
         logging.info(f"Open LOGIN_URL:{LOGIN_URL}.\r")
-        time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
 
         # swtich to username-password login page
-        driver.find_element(By.CLASS_NAME, "user").click()
+        self.waiter.element_clickable(driver, By.CLASS_NAME, "user").click()
         logging.info("find_element 'user'.\r")
-        time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
+        self.waiter.element_visible(driver, By.CLASS_NAME, "el-input__inner")
         # input username and password
         input_elements = driver.find_elements(By.CLASS_NAME, "el-input__inner")
         input_elements[0].send_keys(self._username)
-        logging.info(f"input_elements username : {self._username[0:3] + ('*' * (len(self._username) - 3))}\r")
+        logging.info(f"input_elements username : {self.masked_username}\r")
         input_elements[1].send_keys(self._password)
         logging.info(f"input_elements password : {'*' * len(self._password)}\r")
         # click agree button
         self._click_button(driver, By.XPATH, '//*[@id="login_box"]/div[2]/div[1]/form/div[1]/div[3]/div/span[2]')
         logging.info("Click the Agree option.\r")
-        time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
         # click login button
         self._click_button(driver, By.CLASS_NAME, "el-button.el-button--primary")
-        time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT*2)
+        self._wait_slide_verify(driver)
         logging.info("Click login button.\r")
         # sometimes ddddOCR may fail, so add retry logic)
-        for retry_times in range(1, self.RETRY_TIMES_LIMIT + 1):
-
-            #get canvas image
-            background_JS = 'return document.getElementById("slideVerify").childNodes[0].toDataURL("image/png");'
-            targe_JS = 'return document.getElementsByClassName("slide-verify-block")[0].toDataURL("image/png");'
-            # get base64 image data
-            im_info = driver.execute_script(background_JS) 
-            background = im_info.split(',')[1]  
-            background_image = base64_to_PLI(background)
-            logging.info(f"Get electricity canvas image successfully.\r")
-            distance = self.onnx.get_distance(background_image)
-            logging.info(f"Image CaptCHA distance is {distance}.\r")
-
-            # slider = driver.find_element(By.CLASS_NAME, "slide-verify-slider-mask-item")
-            # ActionChains(driver).click_and_hold(slider).perform()
-            # ActionChains(driver).move_by_offset(xoffset=round(distance*1.06), yoffset=0).perform()
-            # ActionChains(driver).release().perform()
-
-            self._sliding_track(driver, round(distance*1.06)) #1.06是补偿
-            time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-            if (driver.current_url == LOGIN_URL): # if login not success
-                try:
-                    logging.info(f"Sliding CAPTCHA recognition failed and reloaded.\r")
-                    self._click_button(driver, By.CLASS_NAME, "el-button.el-button--primary")
-                    time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT*2)
+        # 识别不到缺口或置信度太低时直接刷新验证码，不计入滑动次数
+        background_JS = CAPTCHA_BACKGROUND_JS
+        retry_times = refresh_times = 0
+        while retry_times < self.RETRY_TIMES_LIMIT and refresh_times < self.RETRY_TIMES_LIMIT * 2:
+
+            with metrics.span('captcha_attempt') as span:
+                # get base64 image data
+                im_info = driver.execute_script(background_JS) 
+                background = im_info.split(',')[1]  
+                background_image = base64_to_PLI(background)
+                logging.info(f"Get electricity canvas image successfully.\r")
+                # 拼图块的读取和换算尚未在实际页面验证，默认关闭，滑动距离即缺口的 x1
+                block = self._read_slider_block(driver, background_image) if self.CAPTCHA_SLIDER_BLOCK else None
+                # 缺口与拼图块同高，只在拼图块所在的高度范围内找缺口
+                distance, box, confidence = self.onnx.detect(background_image, scales=self.CAPTCHA_SCALES, y_range=block[1:] if block else None)
+                if block and box is not None:
+                    # 拼图块在自己的 canvas 中有左边距，需要滑动的是缺口与拼图块左边缘之间的距离
+                    distance = max(0, round(box[0] - block[0]))
+                logging.info(f"Image CaptCHA distance is {distance}, confidence is {confidence}.\r")
+
+                if not self.calibration.should_slide(confidence):
+                    span.outcome = 'refresh'
+                    refresh_times += 1
+                    self.calibration.record(background, box, confidence, None, None, 'refresh')
+                    logging.info(f"No confident gap detected, refresh the CAPTCHA.\r")
+                    self._refresh_captcha(driver, im_info)
                     continue
-                except:
-                    logging.debug(
-                        f"Login failed, maybe caused by invalid captcha, {self.RETRY_TIMES_LIMIT - retry_times} retry times left.")
-            else:
-                return True
+
+                retry_times += 1
+                factor = self.calibration.attempt_factor()
+                offset = round(distance * factor) # factor 是补偿系数，由历史记录拟合
+                self._sliding_track(driver, offset)
+                try:
+                    # 登录成功后页面会跳转，验证失败时滑块会立即显示失败状态，最多等待一个 RETRY_WAIT_TIME_OFFSET_UNIT
+                    # 轮询时关闭隐式等待，否则失败状态不存在时每次 find_elements 都会阻塞到隐式等待超时
+                    with self.waiter.no_implicit_wait(driver):
+                        self.waiter.until(driver, "captcha result",
+                            lambda d: d.current_url != LOGIN_URL or d.find_elements(By.XPATH, ACTIONS['captcha_failed']),
+                            self.RETRY_WAIT_TIME_OFFSET_UNIT)
+                except TimeoutException:
+                    pass
+                success = driver.current_url != LOGIN_URL
+                self.calibration.record(background, box, confidence, factor, offset, 'success' if success else 'fail', distance)
+                if not success: # if login not success
+                    span.outcome = 'fail'
+                    try:
+                        logging.info(f"Sliding CAPTCHA recognition failed and reloaded.\r")
+                        self._click_button(driver, By.CLASS_NAME, "el-button.el-button--primary")
+                        self._wait_slide_verify(driver)
+                        continue
+                    except:
+                        logging.debug(
+                            f"Login failed, maybe caused by invalid captcha, {self.RETRY_TIMES_LIMIT - retry_times} retry times left.")
+                else:
+                    return True
         
         logging.error(f"Login failed, maybe caused by Sliding CAPTCHA recognition failed")
         return False
-    
-    def fetch(self):
-        """the entry, only retry logic here """
+
+    def _restore_session(self, driver):
+        '''恢复上次保存的登录态，并用一次页面加载验证它是否仍然有效'''
+        snapshot = self.session_store.load()
+        if snapshot is None or not self.session_store.restore(driver, snapshot):
+            return False
+        return self._session_valid(driver)
+
+    def _session_valid(self, driver):
+        '''打开余额页，没有被重定向回登录页说明登录态仍然有效'''
+        try:
+            self._open(driver, BALANCE_URL)
+            self.waiter.xhr_idle(driver)
+        except TimeoutException:
+            pass
+        if driver.current_url.startswith(LOGIN_URL): # 登录态失效时会被重定向回登录页
+            logging.info("The session has expired, login again.")
+            self.session_store.clear()
+            driver.delete_all_cookies()
+            return False
+        return True
+
+    def _refresh_captcha(self, driver, old_image):
+        '''点击验证码的刷新按钮并等待新的背景图，没有刷新按钮时重新点击登录'''
+        # 刷新按钮不存在时立即回退，不等待隐式等待超时
+        buttons = self.waiter.find_now(driver, By.XPATH, ACTIONS['captcha_refresh'])
+        if buttons:
+            driver.execute_script("arguments[0].click();", buttons[0])
+        else:
+            self._click_button(driver, By.CLASS_NAME, "el-button.el-button--primary")
         try:
-            return self._fetch()
+            self.waiter.until(driver, "captcha refreshed",
+                lambda d: d.execute_script(CAPTCHA_BACKGROUND_JS) != old_image,
+                self.RETRY_WAIT_TIME_OFFSET_UNIT)
+        except TimeoutException:
+            pass
+        self._wait_slide_verify(driver)
+
+    def _read_slider_block(self, driver, background_image):
+        '''读取拼图块 canvas，返回拼图块在 416x416 坐标下的 (左边距, 上边缘, 下边缘)，读取失败时返回 None'''
+        try:
+            block_image = base64_to_PLI(driver.execute_script(CAPTCHA_BLOCK_JS)).convert('RGBA')
+            location = get_transparency_location(block_image)
+        except Exception as e:
+            logging.debug(f"Read the slider block failed: {e}")
+            return None
+        if location is None:
+            return None
+        # 拼图块 canvas 与背景 canvas 的像素尺寸一致，按背景缩放到模型输入的比例换算
+        left, upper, _, lower = location
+        scale_x, scale_y = INPUT_SIZE / background_image.width, INPUT_SIZE / background_image.height
+        return left * scale_x, upper * scale_y, lower * scale_y
+
+    def _wait_slide_verify(self, driver):
+        '''等待滑块验证码的背景图请求完成并绘制到 canvas 上'''
+        self.waiter.element_present(driver, By.CSS_SELECTOR, "#slideVerify canvas")
+        self.waiter.xhr_idle(driver)
+
+    def fetch(self, on_user=None):
+        """the entry. 单个步骤的重试由 self.retry 负责，失败的户号和部分由 resume 补抓
+
+        on_user(user_id, user_data) 在每个户号抓取完成时立即调用，用于逐户入库
+        """
+        self.journal.reset()
+        try:
+            with metrics.span('fetch_run'):
+                return self._fetch(on_user)
         except Exception as e:
             traceback.print_exc()
-            logging.error(
-                f"Webdriver quit abnormly, reason: {e}. {self.RETRY_TIMES_LIMIT} retry times left.")
+            logging.error(f"Webdriver quit abnormly, reason: {e}.")
 
-    def _fetch(self):
-        """main logic here"""
-        if config.DEBUG:
+    def needs_resume(self):
+        '''最近一次抓取还有缺失的户号或部分，并且补抓次数还没有用完'''
+        if self.RESUME_MAX_ATTEMPTS <= 0 or self.journal.attempts >= self.RESUME_MAX_ATTEMPTS:
+            return False
+        # 登录熔断期间补抓只会直接返回并消耗补抓次数，冷却结束后的定时抓取会重新抓取全部户号
+        if not self.login_breaker.allow():
+            return False
+        pending = self.journal.pending()
+        return pending is None or len(pending) > 0
+
+    def resume(self, on_user=None):
+        '''按运行日志只补抓最近一次抓取中缺失的户号和部分'''
+        if not self.needs_resume():
+            return {}
+        pending = self.journal.pending()
+        self.journal.begin_resume()
+        missing = 'all users' if pending is None else [(user_id, sections) for _, user_id, sections in pending]
+        logging.info(f"Resume attempt {self.journal.attempts}/{self.RESUME_MAX_ATTEMPTS} of {self.masked_username}, missing: {missing}")
+        try:
+            with metrics.span('fetch_run', mode='resume'):
+                return self._fetch(on_user, pending)
+        except Exception as e:
+            traceback.print_exc()
+            logging.error(f"Resume of {self.masked_username} failed, reason: {e}.")
+
+    def _fetch(self, on_user=None, pending=None):
+        """main logic here, pending 为 None 时抓取全部户号，否则只抓取其中列出的户号和部分"""
+        if not self.login_breaker.allow():
+            retry_at = datetime.fromtimestamp(self.login_breaker.retry_at()).strftime('%Y-%m-%d %H:%M:%S')
+            logging.warning(f"Login of {self.masked_username} failed {self.login_breaker.failures} times in a row, skip fetching until {retry_at}.")
+            metrics.inc('login_skipped')
+            return None
+        reused = False
+        if self._live_driver is not None:
+            driver, self._live_driver = self._live_driver, None
+            reused = True
+            logging.info("Reuse the webdriver kept alive for resuming.")
+        elif config.DEBUG:
             driverfile_path = r'C:\Program Files\chromeTest\chromedriver.exe'
             driver = webdriver.Chrome(executable_path=driverfile_path)
+        elif self.RESIDENT_BROWSER:
+            # 常驻浏览器保留着上次运行的登录态，先检查是否仍然有效
+            driver, reused = self.browser.acquire()
         else:
             driver = self._get_webdriver()
-        
-        driver.maximize_window() 
-        time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-        logging.info("Webdriver initialized.")
-
+        self.waiter.reset()
+        self.page_loads = []
+        self.peak_rss_mb = 0
+        self._run_started = time.monotonic()
+        succeeded = False
         try:
+            # 超过运行时长或内存上限时由 watchdog 强制结束浏览器，正在进行的 webdriver 调用会随之失败
+            self._supervisor = watchdog.supervise(driver, self.RUN_TIMEOUT_MINUTES * 60, self.RUN_MAX_RSS_MB, name=self.masked_username)
+            if not self.LEAN_PROFILE:
+                driver.maximize_window() 
+            logging.info("Webdriver initialized.")
+
             if config.DEBUG:
                 driver.get(LOGIN_URL)
                 time.sleep(10)
             else:
-                if self._login(driver):
-                    logging.info("login successed !")
-                else:
-                    logging.info("login unsuccessed !")
-                    raise Exception("login unsuccessed")
+                with metrics.span('login'):
+                    # 只有 _login 明确失败(验证码或账号密码)才计入熔断，网络和 WebDriver 异常直接抛出，不计入
+                    if reused and self._session_valid(driver):
+                        logging.info("login successed with the live session !")
+                    elif self.PERSIST_SESSION and self._restore_session(driver):
+                        logging.info("login successed with the saved session !")
+                    elif self._login(driver):
+                        logging.info("login successed !")
+                        if self.PERSIST_SESSION:
+                            self.session_store.save(driver)
+                    else:
+                        logging.info("login unsuccessed !")
+                        self.login_breaker.record_failure()
+                        raise Exception("login unsuccessed")
+                    self.login_breaker.record_success()
             logging.info(f"Login successfully on {LOGIN_URL}")
-            time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-            user_id_list = self._get_user_ids(driver)
+            self.waiter.xhr_idle(driver)
+            data = self._fetch_http(driver, pending, on_user) if self.http is not None and not config.DEBUG else None
+            if data is None:
+                if pending is None:
+                    with metrics.span('user_list'):
+                        user_id_list = self._get_user_ids(driver)
+                    logging.info(f"There are {len(user_id_list)} users in total, there user_id is: {user_id_list}")
+                    self.journal.start(user_id_list)
+                    pending = [(userid_index, user_id, SECTIONS) for userid_index, user_id in enumerate(user_id_list)]
+
+                data = self._fetch_users(driver, pending, on_user)
+
+            logging.info(self.waiter.summary())
+            logging.info(self._page_load_summary())
+            if self.PERSIST_SESSION and not config.DEBUG:
+                # 保存本次运行中刷新过的 cookies
+                self.session_store.save(driver)
+            logging.info("Webdriver quit after fetching data successfully.")
+            succeeded = True
+            return data
+        finally:
+            # supervise 本身失败时没有 supervisor，浏览器仍然要释放
+            if self._supervisor is not None:
+                self.peak_rss_mb = max(self.peak_rss_mb, self._supervisor.stop())
+                logging.info(f"Peak webdriver memory of {self.masked_username} in this run: {self.peak_rss_mb:.0f}MB")
+                if self._supervisor.killed:
+                    succeeded = False
+                self._supervisor = None
+            if not self.RESIDENT_BROWSER or config.DEBUG:
+                if succeeded and not config.DEBUG and self.needs_resume():
+                    # 保留已登录的浏览器，几分钟后的补抓不需要重新登录
+                    self._live_driver = driver
+                else:
+                    self._quit_driver(driver)
+            elif succeeded:
+                self.browser.release(driver)
+            else:
+                # 异常中断的浏览器状态不可信，下次重新创建
+                self.browser.discard(driver)
+            watchdog.reap()
+
+    @staticmethod
+    def _quit_driver(driver):
+        '''浏览器可能已被 watchdog 结束或已经崩溃，quit 失败时交给 watchdog.reap 清理'''
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.warning(f"Quit webdriver failed: {e}")
+
+    def close(self):
+        '''程序退出时关闭常驻浏览器和为补抓保留的浏览器'''
+        self.browser.shutdown()
+        if self._live_driver is not None:
+            self._quit_driver(self._live_driver)
+            self._live_driver = None
+        watchdog.reap()
+        if self.http is not None:
+            self.http.close()
+
+    def _fetch_http(self, driver, pending, on_user=None):
+        '''用浏览器的登录态通过 HTTP 接口并发抓取 pending 中的户号
+
+        接口不接受登录态(包括运行中途失效)或所有户号都没有抓到任何数据时返回 None，由浏览器重新抓取
+        '''
+        self.http.authenticate(self.session_store.snapshot(driver), driver.execute_script("return navigator.userAgent;"))
+        try:
+            with metrics.span('user_list', backend='http'):
+                users = self.http.user_list()
+            if not users:
+                raise ValueError("no user in the response")
+        except Exception as e:
+            logging.warning(f"HTTP backend is not available ({e}), fetch with the browser.")
+            return None
+        locations = dict(users)
+        if pending is None:
+            user_id_list = [user_id for user_id, _ in users]
             logging.info(f"There are {len(user_id_list)} users in total, there user_id is: {user_id_list}")
-            time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-            
-            data = {}
-            for userid_index, user_id in enumerate(user_id_list):   
-                try: 
-                    # switch to electricity charge balance page
-                    driver.get(BALANCE_URL) 
-                    time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-                    self._choose_current_userid(driver,userid_index)
-                    time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-                    user_info = self._get_current_user_info(driver)
-
-                    current_userid = user_info['user_id']
-                    current_user_loaction = user_info['user_location']
-                    data[current_userid] = {}
-
-                    if current_userid in config.electricity['ignore_user_id']:
-                        logging.info(f"The user ID {current_userid} will be ignored in user_id_list")
-                        continue
-                    else:
-                        ### get data 
-                        balance, last_daily_date, last_daily_usage, daily_date, daily_usages, yearly_charge, yearly_usage, month, month_charge, month_usage  = self._get_all_data(driver, user_id, userid_index)
-
-                        data[current_userid]['location'] = current_user_loaction
-                        data[current_userid]['balance'] = balance
-                        data[current_userid]['last_daily'] = {'date': last_daily_date, 'usage': last_daily_usage}
-                        data[current_userid]['daily'] = [{'date': daily_date[i], 'usage': daily_usages[i]} for i in range(len(daily_date))] 
-                        data[current_userid]['month'] = [{'date': month[i], 'charge': month_charge[i], 'usage': month_usage[i]} for i in range(len(month))]
-                        data[current_userid]['yearly'] = {'charge': yearly_charge, 'usage': yearly_usage}
-                        
-                        time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-                except Exception as e:
-                    if (userid_index != len(user_id_list)):
-                        logging.info(f"The current user {user_id} data fetching failed {e}, the next user data will be fetched.")
+            self.journal.start(user_id_list)
+            pending = [(userid_index, user_id, SECTIONS) for userid_index, user_id in enumerate(user_id_list)]
+
+        data = {}
+        logging.info(f"Fetch {len(pending)} users over HTTP with {self.http.concurrency} connections.")
+        try:
+            with ThreadPoolExecutor(max_workers=self.http.concurrency, thread_name_prefix='http') as executor:
+                futures = [executor.submit(self._fetch_user_http, user_id, locations.get(user_id), sections, data, on_user) for _, user_id, sections in pending]
+                try:
+                    fetched = [future.result() for future in futures]
+                except HttpSessionExpired:
+                    executor.shutdown(cancel_futures=True)
+                    raise
+        except HttpSessionExpired as e:
+            logging.warning(f"HTTP session expired during the run ({e}), fetch with the browser.")
+            return None
+        if pending and not any(fetched):
+            # 接口的请求格式与实际不符时每个户号都会失败，补抓也只会重复同样的请求
+            logging.warning("No user got any data over HTTP, fetch with the browser.")
+            return None
+        return data
+
+    def _fetch_user_http(self, user_id, location, sections, data, on_user=None):
+        '''与 _fetch_user 相同，只是数据来自 HTTP 接口，结果的结构和运行日志的记录方式也相同
+
+        返回是否抓到了任何部分；登录态失效时抛出 HttpSessionExpired，不记入运行日志
+        '''
+        status = {}
+        try:
+            if user_id in config.electricity['ignore_user_id']:
+                logging.info(f"The user ID {user_id} will be ignored in user_id_list")
+                data[user_id] = {}
+                status = dict.fromkeys(sections, 'ok')
+            else:
+                daily_watermark, month_watermark, daily_up_to_date, month_up_to_date = self._check_watermarks(user_id)
+                skip_month = month_up_to_date or 'month' not in sections
+                skip_daily = daily_up_to_date or 'daily' not in sections
+                with metrics.span('section', section='http') as span:
+                    result = self.http.fetch_user(user_id, bill_year(), not skip_month, not skip_daily, config.electricity['data_retention_days'])
+                    span.outcome = 'ok' if result else 'error'
+
+                balance = result.get('balance')
+                status['balance'] = 'ok' if balance is not None else 'failed'
+
+                yearly_usage, yearly_charge = None, None
+                month, month_usage, month_charge = None, None, None
+                if not skip_month:
+                    if 'yearly' in result:
+                        yearly_usage, yearly_charge = result['yearly']['usage'], result['yearly']['charge']
+                    if 'month' in result:
+                        month = [m['date'] for m in result['month']]
+                        month_usage = [m['usage'] for m in result['month']]
+                        month_charge = [m['charge'] for m in result['month']]
+                    month, month_usage, month_charge = self._trim_month(month, month_usage, month_charge, month_watermark)
+
+                last_daily_date, last_daily_usage = None, None
+                daily_date, daily_usages = None, None
+                if not skip_daily and result.get('daily'):
+                    last_daily_date, last_daily_usage = result['daily'][0]['date'], result['daily'][0]['usage']
+                    if self.DAILY_MUTABLE_DAYS <= 0 and daily_watermark is not None and last_daily_date <= daily_watermark:
+                        logging.info(f"No newer daily data of {user_id} is published after {daily_watermark}, skip daily data.")
+                        skip_daily = True
+                        last_daily_date, last_daily_usage = None, None
                     else:
-                        logging.info(f"The user {user_id} data fetching failed, {e}")
-                        logging.info("Webdriver quit after fetching data successfully.")
-                    continue 
+                        daily_date = [d['date'] for d in result['daily']]
+                        daily_usages = [d['usage'] for d in result['daily']]
+                        daily_date, daily_usages = self._trim_daily(daily_date, daily_usages, daily_watermark)
+
+                logging.info(f"Get data of {user_id} over HTTP: balance {balance}, {len(month or [])} months, {len(daily_date or [])} days.")
+                if 'month' in sections:
+                    status['month'] = 'ok' if skip_month or (month is not None and yearly_usage is not None and yearly_charge is not None) else 'failed'
+                if 'daily' in sections:
+                    status['daily'] = 'ok' if skip_daily or daily_date is not None else 'failed'
+                data[user_id] = self._user_data(location, balance, last_daily_date, last_daily_usage, daily_date, daily_usages, yearly_charge, yearly_usage, month, month_charge, month_usage)
+                if not self._emit_user(on_user, user_id, data[user_id]):
+                    status = {}
+        except HttpSessionExpired:
+            raise
+        except Exception as e:
+            logging.info(f"The current user {user_id} data fetching over HTTP failed {e}, the next user data will be fetched.")
+        self.journal.mark(user_id, {section: status.get(section, 'failed') for section in sections})
+        return 'ok' in status.values()
+
+    def _fetch_user(self, driver, userid_index, user_id, data, on_user=None, sections=SECTIONS):
+        '''在 driver 中切换到第 userid_index 个户号并抓取 sections 中的部分，结果写入 data 并交给 on_user，各部分的结果记入运行日志'''
+        status = {}
+        try: 
+            # switch to electricity charge balance page
+            self._open(driver, BALANCE_URL)
+            self._drain_capture(driver)
+            self._choose_current_userid(driver,userid_index)
+            with metrics.span('section', section='balance'):
+                user_info = self.retry.call('read_balance', self._get_current_user_info, driver)
+
+            current_userid = user_info['user_id']
+            current_user_loaction = user_info['user_location']
+            data[current_userid] = {}
+
+            if current_userid in config.electricity['ignore_user_id']:
+                logging.info(f"The user ID {current_userid} will be ignored in user_id_list")
+                status = dict.fromkeys(sections, 'ok')
+            else:
+                ### get data 
+                balance, last_daily_date, last_daily_usage, daily_date, daily_usages, yearly_charge, yearly_usage, month, month_charge, month_usage  = self._get_all_data(driver, current_userid, userid_index, user_info['balance_page'], sections, status)
 
-            logging.info("Webdriver quit after fetching data successfully.")
+                data[current_userid] = self._user_data(current_user_loaction, balance, last_daily_date, last_daily_usage, daily_date, daily_usages, yearly_charge, yearly_usage, month, month_charge, month_usage)
+                if not self._emit_user(on_user, current_userid, data[current_userid]):
+                    # 没有入库的数据下次补抓时需要重新获取
+                    status = {}
+        except Exception as e:
+            logging.info(f"The current user {user_id} data fetching failed {e}, the next user data will be fetched.")
+        self.journal.mark(user_id, {section: status.get(section, 'failed') for section in sections})
+
+    @staticmethod
+    def _user_data(location, balance, last_daily_date, last_daily_usage, daily_date, daily_usages, yearly_charge, yearly_usage, month, month_charge, month_usage):
+        '''组装一个户号的数据，fetch_electricity_task 按这个结构入库'''
+        # 未抓取(增量跳过、不在本次补抓范围或失败)的部分置为 None，入库时会被跳过
+        return {
+            'location': location
+            ,'balance': balance
+            ,'last_daily': {'date': last_daily_date, 'usage': last_daily_usage} if last_daily_usage is not None else None
+            ,'daily': [{'date': daily_date[i], 'usage': daily_usages[i]} for i in range(len(daily_date))] if daily_date is not None else None
+            ,'month': [{'date': month[i], 'charge': month_charge[i], 'usage': month_usage[i]} for i in range(len(month))] if month is not None else None
+            ,'yearly': {'charge': yearly_charge, 'usage': yearly_usage} if yearly_usage is not None and yearly_charge is not None else None
+        }
+
+    def _emit_user(self, on_user, user_id, user_data):
+        '''一个户号抓取完成后立即交给 on_user，入库失败不影响后续户号'''
+        # 从本次抓取开始到该户号数据可用的时间
+        metrics.observe('user_ready', time.monotonic() - self._run_started)
+        if on_user is None:
+            return True
+        try:
+            with metrics.span('persist'):
+                on_user(user_id, user_data)
+            return True
+        except Exception as e:
+            logging.error(f"Persist user {user_id} failed, reason is {e}")
+            traceback.print_exc()
+            return False
+
+    def _fetch_users(self, driver, targets, on_user=None):
+        '''抓取 targets 中的 (userid_index, user_id, sections)；开启 user_concurrency 时由多个共享登录态的浏览器从同一个队列中领取户号'''
+        data = {}
+        concurrency = min(self.USER_CONCURRENCY, len(targets))
+        if concurrency <= 1 or config.DEBUG:
+            for userid_index, user_id, sections in targets:
+                self._fetch_user(driver, userid_index, user_id, data, on_user, sections)
             return data
-        finally:
-            driver.quit()  
+
+        snapshot = self.session_store.snapshot(driver)
+        pending = queue.Queue()
+        for target in targets:
+            pending.put(target)
+
+        def _drain(worker_driver):
+            while True:
+                try:
+                    userid_index, user_id, sections = pending.get_nowait()
+                except queue.Empty:
+                    return
+                self._fetch_user(worker_driver, userid_index, user_id, data, on_user, sections)
+
+        def _clone_worker():
+            # 克隆的浏览器启动失败时直接退出，剩下的户号由其它浏览器继续领取
+            try:
+                clone = self._get_webdriver()
+            except Exception as e:
+                logging.warning(f"Start a cloned webdriver failed, reason: {e}")
+                return
+            if self._supervisor is not None:
+                self._supervisor.add(clone)
+            try:
+                if self.session_store.restore(clone, snapshot):
+                    _drain(clone)
+            finally:
+                self._quit_driver(clone)
+
+        logging.info(f"Fetch {len(targets)} users with {concurrency} browsers.")
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='user') as executor:
+            futures = [executor.submit(_drain, driver)]
+            futures += [executor.submit(_clone_worker) for _ in range(concurrency - 1)]
+            for future in futures:
+                future.result()
+        return data
         
     def _get_user_ids(self, driver):
-        try:
-            # 刷新网页
-            driver.refresh()
-            time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT*2)
-            element = WebDriverWait(driver, self.DRIVER_IMPLICITY_WAIT_TIME).until(EC.presence_of_element_located((By.CLASS_NAME, 'el-dropdown')))
-            # click roll down button for user id
-            self._click_button(driver, By.XPATH, "//div[@class='el-dropdown']/span")
-            logging.debug(f'''self._click_button(driver, By.XPATH, "//div[@class='el-dropdown']/span")''')
-            time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-            # wait for roll down menu displayed
-            target = driver.find_element(By.CLASS_NAME, "el-dropdown-menu.el-popper").find_element(By.TAG_NAME, "li")
-            logging.debug(f'''target = driver.find_element(By.CLASS_NAME, "el-dropdown-menu.el-popper").find_element(By.TAG_NAME, "li")''')
-            time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-            WebDriverWait(driver, self.DRIVER_IMPLICITY_WAIT_TIME).until(EC.visibility_of(target))
-            time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-            logging.debug(f'''WebDriverWait(driver, self.DRIVER_IMPLICITY_WAIT_TIME).until(EC.visibility_of(target))''')
-            WebDriverWait(driver, self.DRIVER_IMPLICITY_WAIT_TIME).until(
-                EC.text_to_be_present_in_element((By.XPATH, "//ul[@class='el-dropdown-menu el-popper']/li"), ":"))
-            time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-
-            # get user id one by one
-            userid_elements = driver.find_element(By.CLASS_NAME, "el-dropdown-menu.el-popper").find_elements(By.TAG_NAME, "li")
-            userid_list = []
-            for element in userid_elements:
-                userid_list.append(re.findall("[0-9]+", element.text)[-1])
-            return userid_list
-        except Exception as e:
-            logging.error(
-                f"Webdriver quit abnormly, reason: {e}. get user_id list failed.")
-            driver.quit()
+        '''读取户号下拉列表，重试用完后抛出异常，由调用方结束本次抓取'''
+        return self.retry.call('user_list', self._read_user_ids, driver)
+
+    def _read_user_ids(self, driver):
+        # 刷新网页
+        driver.refresh()
+        self.waiter.document_ready(driver)
+        self.waiter.element_present(driver, By.CLASS_NAME, 'el-dropdown')
+        # click roll down button for user id
+        self._click_button(driver, By.XPATH, "//div[@class='el-dropdown']/span")
+        logging.debug(f'''self._click_button(driver, By.XPATH, "//div[@class='el-dropdown']/span")''')
+        # wait for roll down menu displayed
+        self.waiter.element_visible(driver, By.XPATH, "//ul[@class='el-dropdown-menu el-popper']/li")
+        self.waiter.until(driver, "user id text",
+            EC.text_to_be_present_in_element((By.XPATH, "//ul[@class='el-dropdown-menu el-popper']/li"), ":"))
+
+        # get user id one by one
+        userid_elements = driver.find_element(By.CLASS_NAME, "el-dropdown-menu.el-popper").find_elements(By.TAG_NAME, "li")
+        userid_list = []
+        for element in userid_elements:
+            userid_list.append(re.findall("[0-9]+", element.text)[-1])
+        return userid_list
     
     def _get_current_user_info(self, driver):
-        user_id = driver.find_element(By.XPATH, '//*[@id="app"]/div/div/article/div/div/div[2]/div/div/div[1]/div[2]/div/div/div/div[2]/div/div[1]/div/ul/div/li[1]/span[2]').text
-        user_location = driver.find_element(By.XPATH, '//*[@id="app"]/div/div/article/div/div/div[2]/div/div/div[1]/div[2]/div/div/div/div[2]/div/div[1]/div/ul/div/li[2]/span[2]').text
+        '''一次读取余额页上的户号、地址和余额'''
+        self.waiter.element_visible(driver, By.XPATH, SELECTORS['balance']['user_id']['xpath'])
+        balance_page = extract_page(driver, 'balance')
         return {
-            'user_id': user_id
-            ,'user_location': user_location
+            'user_id': balance_page['user_id']
+            ,'user_location': balance_page['user_location']
+            ,'balance_page': balance_page
         }
 
     def _choose_current_userid(self, driver, userid_index):
+        self.retry.call('select_user', self._select_userid, driver, userid_index)
+
+    def _select_userid(self, driver, userid_index):
         self._click_button(driver, By.CLASS_NAME, "el-input__suffix")
-        time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-        self._click_button(driver, By.XPATH, f"/html/body/div[2]/div[1]/div[1]/ul/li[{userid_index+1}]/span")
+        option_xpath = f"/html/body/div[2]/div[1]/div[1]/ul/li[{userid_index+1}]/span"
+        self.waiter.element_visible(driver, By.XPATH, option_xpath)
+        self._click_button(driver, By.XPATH, option_xpath)
+        # 切换户号后页面会重新请求该户的数据
+        self.waiter.xhr_idle(driver)
             
-    def _get_all_data(self, driver, user_id, userid_index):
-        balance = self._get_electric_balance(driver)
+    def _drain_capture(self, driver):
+        '''抓包模式下丢弃切换户号之前的响应，避免读到默认户号的数据'''
+        if self.FETCH_MODE == 'capture':
+            self.capture.drain(driver)
+
+    def _capture_usage(self, driver):
+        '''抓包模式下切到日用电量标签触发每日数据请求，然后一次读取整页的接口响应'''
+        retention_label = {7: 1, 30: 2}.get(config.electricity['data_retention_days'], 1)
+        try:
+            if bill_year() != datetime.now().year:
+                # 页面默认请求今年的月度数据，一月时切换年份触发上一年的请求，后到的响应覆盖先到的
+                self._click_button(driver, By.XPATH, ACTIONS['tab_month'])
+                self._select_bill_year(driver)
+        except Exception as e:
+            logging.info(f"Switch to the bill year {bill_year()} failed: {e}")
+        try:
+            self._click_button(driver, By.XPATH, ACTIONS['tab_daily'])
+            self._click_button(driver, By.XPATH, ACTIONS['daily_range'].format(index=retention_label))
+            self.waiter.xhr_idle(driver)
+        except Exception as e:
+            logging.info(f"Trigger daily usage request failed: {e}")
+        return self.capture.collect(driver)
+
+    def _get_watermarks(self, user_id):
+        '''数据库中该户号已保存的最新日期和最新月份，未开启增量抓取时返回 None'''
+        if not self.INCREMENTAL_FETCH or self.store is None:
+            return None, None
+        try:
+            return self.store.get_latest_daily_date(user_id), self.store.get_latest_month_date(user_id)
+        except Exception as e:
+            logging.warning(f"Query watermarks of {user_id} failed, fetch all data: {e}")
+            return None, None
+
+    def _check_watermarks(self, user_id):
+        '''返回 (daily_watermark, month_watermark, daily_up_to_date, month_up_to_date)'''
+        daily_watermark, month_watermark = self._get_watermarks(user_id)
+        # 国网最新只会发布到昨天的日用电和上个月的月账单
+        yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        last_month = (datetime.now().replace(day=1) - timedelta(days=1)).strftime('%Y-%m-01')
+        month_up_to_date = month_watermark is not None and month_watermark >= last_month
+        # 最近 DAILY_MUTABLE_DAYS 天的日用电仍可能被修正，这段时间每次都要重新读取，只有不修正时才能跳过
+        daily_up_to_date = self.DAILY_MUTABLE_DAYS <= 0 and daily_watermark is not None and daily_watermark >= yesterday
+        return daily_watermark, month_watermark, daily_up_to_date, month_up_to_date
+
+    @staticmethod
+    def _trim_month(month, month_usage, month_charge, month_watermark):
+        '''已保存的最新一个月之前的账单不会再变化'''
+        if month is None or month_watermark is None:
+            return month, month_usage, month_charge
+        keep = [i for i in range(len(month)) if month[i][0:7] >= month_watermark[0:7]]
+        return [month[i] for i in keep], [month_usage[i] for i in keep], [month_charge[i] for i in keep]
+
+    def _trim_daily(self, daily_date, daily_usages, daily_watermark):
+        '''只写入缺失的日期以及最近几天仍可能被修正的数据'''
+        if daily_date is None or daily_watermark is None:
+            return daily_date, daily_usages
+        cutoff = (datetime.strptime(daily_watermark, '%Y-%m-%d') - timedelta(days=self.DAILY_MUTABLE_DAYS)).strftime('%Y-%m-%d')
+        keep = [i for i in range(len(daily_date)) if daily_date[i] > cutoff]
+        return [daily_date[i] for i in keep], [daily_usages[i] for i in keep]
+
+    def _get_all_data(self, driver, user_id, userid_index, balance_page, sections=SECTIONS, status=None):
+        '''只抓取 sections 中的部分，每个部分成功或无需更新时在 status 中记为 ok'''
+        if status is None:
+            status = {}
+        captured = self.capture.collect(driver) if self.FETCH_MODE == 'capture' else {}
+        balance = self._get_electric_balance(balance_page, captured.get('balance'))
         if (balance is None):
             logging.info(f"Get electricity charge balance for {user_id} failed, Pass.")
         else:
             logging.info(
                 f"Get electricity charge balance for {user_id} successfully, balance is {balance} CNY.")
-        time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-        # swithc to electricity usage page
-        driver.get(ELECTRIC_USAGE_URL)
-        time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-        self._choose_current_userid(driver, userid_index)
-        time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
+        status['balance'] = 'ok' if balance is not None else 'failed'
+        daily_watermark, month_watermark, daily_up_to_date, month_up_to_date = self._check_watermarks(user_id)
+        skip_month = month_up_to_date or 'month' not in sections
+        skip_daily = daily_up_to_date or 'daily' not in sections
+
+        captured = {}
+        if not (skip_month and skip_daily):
+            # swithc to electricity usage page
+            self._open(driver, ELECTRIC_USAGE_URL)
+            self._drain_capture(driver)
+            self._choose_current_userid(driver, userid_index)
+            captured = self._capture_usage(driver) if self.FETCH_MODE == 'capture' else {}
+
+        month_page = None
+        if not skip_month and ('yearly' not in captured or 'month' not in captured):
+            with metrics.span('section', section='month') as span:
+                month_page = self._read_month_page(driver)
+                span.outcome = 'ok' if month_page is not None else 'error'
+
         # get data for each user id
-        yearly_usage, yearly_charge = self._get_yearly_data(driver)
+        if month_up_to_date:
+            logging.info(f"Month data of {user_id} is up to date ({month_watermark}), skip yearly and month data.")
+            yearly_usage, yearly_charge = None, None
+        elif skip_month:
+            yearly_usage, yearly_charge = None, None
+        elif 'yearly' in captured:
+            yearly_usage, yearly_charge = captured['yearly']['usage'], captured['yearly']['charge']
+        else:
+            yearly_usage, yearly_charge = self._get_yearly_data(month_page)
 
-        if yearly_usage is None:
+        if skip_month:
+            pass
+        elif yearly_usage is None:
             logging.error(f"Get year power usage for {user_id} failed, pass")
         else:
             logging.info(
                 f"Get year power usage for {user_id} successfully, usage is {yearly_usage} kwh")
-        if yearly_charge is None:
+        if skip_month:
+            pass
+        elif yearly_charge is None:
             logging.error(f"Get year power charge for {user_id} failed, pass")
         else:
             logging.info(
                 f"Get year power charge for {user_id} successfully, yealrly charge is {yearly_charge} CNY")
 
         # 按月获取数据
-        month, month_usage, month_charge = self._get_month_usage(driver)
-        if month is None:
+        if skip_month:
+            month, month_usage, month_charge = None, None, None
+        elif 'month' in captured:
+            month = [m['date'] for m in captured['month']]
+            month_usage = [m['usage'] for m in captured['month']]
+            month_charge = [m['charge'] for m in captured['month']]
+        else:
+            month, month_usage, month_charge = self._get_month_usage(month_page)
+        month, month_usage, month_charge = self._trim_month(month, month_usage, month_charge, month_watermark)
+        if skip_month:
+            pass
+        elif month is None:
             logging.error(f"Get month power usage for {user_id} failed, pass")
         else:
             for m in range(len(month)):
                 logging.info(f"Get month power charge for {user_id} successfully, {month[m]} usage is {month_usage[m]} KWh, charge is {month_charge[m]} CNY.")
+        daily_page = None
+        if not skip_daily and not captured.get('daily'):
+            with metrics.span('section', section='daily') as span:
+                daily_page = self._read_daily_page(driver)
+                span.outcome = 'ok' if daily_page is not None else 'error'
+
         # get yesterday usage
-        last_daily_date, last_daily_usage = self._get_yesterday_usage(driver)
-        if last_daily_usage is None:
+        if daily_up_to_date:
+            logging.info(f"Daily data of {user_id} is up to date ({daily_watermark}), skip daily data.")
+            last_daily_date, last_daily_usage = None, None
+        elif skip_daily:
+            last_daily_date, last_daily_usage = None, None
+        elif captured.get('daily'):
+            last_daily_date, last_daily_usage = captured['daily'][0]['date'], captured['daily'][0]['usage']
+        else:
+            last_daily_date, last_daily_usage = self._get_yesterday_usage(daily_page)
+        if skip_daily:
+            pass
+        elif last_daily_usage is None:
             logging.error(f"Get last daily power consumption for {user_id} failed, pass")
         else:
             logging.info(
                 f"Get daily power consumption for {user_id} successfully, , {last_daily_date} usage is {last_daily_usage} kwh.")
 
-        daily_date, daily_usages = self._get_daily_usage_data(driver)
-        if daily_date is None:
+        if not skip_daily and self.DAILY_MUTABLE_DAYS <= 0 and daily_watermark is not None and last_daily_date is not None and last_daily_date <= daily_watermark:
+            logging.info(f"No newer daily data of {user_id} is published after {daily_watermark}, skip daily data.")
+            skip_daily = True
+        if skip_daily:
+            daily_date, daily_usages = None, None
+        elif captured.get('daily'):
+            daily_date = [d['date'] for d in captured['daily']]
+            daily_usages = [d['usage'] for d in captured['daily']]
+        else:
+            daily_date, daily_usages = self._get_daily_usage_data(daily_page)
+        daily_date, daily_usages = self._trim_daily(daily_date, daily_usages, daily_watermark)
+        if skip_daily:
+            pass
+        elif daily_date is None:
             logging.error(f"Get daily power consumption for {user_id} failed, pass")
         else:
             logging.info(
                 f"Get daily power consumption for {user_id} successfully, {daily_date}:{daily_usages}")
-        
+        if 'month' in sections:
+            status['month'] = 'ok' if skip_month or (month is not None and yearly_usage is not None and yearly_charge is not None) else 'failed'
+        if 'daily' in sections:
+            status['daily'] = 'ok' if skip_daily or daily_date is not None else 'failed'
+
 
         return balance, last_daily_date, last_daily_usage, daily_date, daily_usages, yearly_charge, yearly_usage, month, month_charge, month_usage
     
-    def _get_electric_balance(self, driver):
+    def _get_electric_balance(self, balance_page, captured_balance=None):
+        '''余额页文字含"欠费"时余额记为负数；抓包模式下金额取接口中的值，符号按同样的规则判断'''
         try:
-            balance = driver.find_element(By.CLASS_NAME, "num").text
-            balance_text = driver.find_element(By.CLASS_NAME, "amttxt").text
-            if "欠费" in balance_text :
-                return -float(balance)
-            else:
-                return float(balance)
-        except:
+            balance = float(balance_page['balance'] if captured_balance is None else captured_balance)
+        except (KeyError, TypeError, ValueError):
             return None
+        balance_text = (balance_page or {}).get('balance_text') or ""
+        if "欠费" in balance_text :
+            return -abs(balance)
+        else:
+            return balance
 
-    def _get_yearly_data(self, driver):
-
-        try:
-            if datetime.now().month == 1:
-                self._click_button(driver, By.XPATH, '//*[@id="pane-first"]/div[1]/div/div[1]/div/div/input')
-                time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-                span_element = driver.find_element(By.XPATH, f"//span[contains(text(), '{datetime.now().year - 1}')]")
-                span_element.click()
-                time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-            self._click_button(driver, By.XPATH, "//div[@class='el-tabs__nav is-top']/div[@id='tab-first']")
-            time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-            # wait for data displayed
-            target = driver.find_element(By.CLASS_NAME, "total")
-            WebDriverWait(driver, self.DRIVER_IMPLICITY_WAIT_TIME).until(EC.visibility_of(target))
-        except Exception as e:
-            logging.error(f"The yearly data get failed : {e}")
-            return None, None
+    def _read_month_page(self, driver):
+        """切换到月用电量标签，一次读取年度合计和每月用电量"""
+        def _read():
+            self._click_button(driver, By.XPATH, ACTIONS['tab_month'])
+            self._select_bill_year(driver)
+            # wait for month displayed
+            self.waiter.element_visible(driver, By.CLASS_NAME, "total")
+            self.waiter.rows_stable(driver, By.XPATH, SELECTORS['usage_month']['rows']['xpath'])
+            return extract_page(driver, 'usage_month')
 
-        # get data
         try:
-            yearly_usage = driver.find_element(By.XPATH, "//ul[@class='total']/li[1]/span").text
+            return self.retry.call('read_month', _read)
         except Exception as e:
-            logging.error(f"The yearly_usage data get failed : {e}")
-            yearly_usage = None
+            logging.error(f"The month page get failed : {e}")
+            return None
 
-        try:
-            yearly_charge = driver.find_element(By.XPATH, "//ul[@class='total']/li[2]/span").text
-        except Exception as e:
-            logging.error(f"The yearly_charge data get failed : {e}")
-            yearly_charge = None
+    def _select_bill_year(self, driver):
+        '''月用电量标签中切换到 bill_year()，一月时为上一年'''
+        year = bill_year()
+        if year == datetime.now().year:
+            return
+        self._click_button(driver, By.XPATH, ACTIONS['year_input'])
+        span_element = self.waiter.element_visible(driver, By.XPATH, ACTIONS['year_option'].format(year=year))
+        span_element.click()
+        self.waiter.xhr_idle(driver)
 
+    def _get_yearly_data(self, month_page):
+        if month_page is None:
+            return None, None
+        yearly_usage = month_page.get('yearly_usage')
+        if yearly_usage is None:
+            logging.error(f"The yearly_usage data get failed")
+        yearly_charge = month_page.get('yearly_charge')
+        if yearly_charge is None:
+            logging.error(f"The yearly_charge data get failed")
         return yearly_usage, yearly_charge
 
-    def _get_yesterday_usage(self, driver):
-        """获取最近一次用电量"""
-        try:
-            # 点击日用电量
-            self._click_button(driver, By.XPATH, "//div[@class='el-tabs__nav is-top']/div[@id='tab-second']")
-            time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-            # wait for data displayed
-            usage_element = driver.find_element(By.XPATH,
-                                                "//div[@class='el-tab-pane dayd']//div[@class='el-table__body-wrapper is-scrolling-none']/table/tbody/tr[1]/td[2]/div")
-            WebDriverWait(driver, self.DRIVER_IMPLICITY_WAIT_TIME).until(EC.visibility_of(usage_element)) # 等待用电量出现
-
-            # 增加是哪一天
-            date_element = driver.find_element(By.XPATH,
-                                                "//div[@class='el-tab-pane dayd']//div[@class='el-table__body-wrapper is-scrolling-none']/table/tbody/tr[1]/td[1]/div")
-            last_daily_date = date_element.text # 获取最近一次用电量的日期
-            return last_daily_date, float(usage_element.text)
-        except Exception as e:
-            logging.error(f"The yesterday data get failed : {e}")
+    def _get_month_usage(self, month_page):
+        """获取每月用电量"""
+        if month_page is None or not month_page.get('rows'):
+            logging.error(f"The month data get failed")
+            return None,None,None
+        # 将每月的用电量保存为List
+        month = []
+        usage = []
+        charge = []
+        for row in month_page['rows']:
+            if len(row) < 3:
+                continue
+            month.append(row[0])
+            usage.append(row[1])
+            charge.append(row[2])
+        return month, usage, charge
+
+    def _read_daily_page(self, driver):
+        """切换到日用电量标签并选择保留天数，一次读取整张表"""
+        retention_days = config.electricity['data_retention_days']
+        if retention_days not in (7, 30):
+            logging.error(f"Unsupported retention days value: {retention_days}")
             return None
+        def _read():
+            self._click_button(driver, By.XPATH, ACTIONS['tab_daily'])
+            self._click_button(driver, By.XPATH, ACTIONS['daily_range'].format(index=1 if retention_days == 7 else 2))
 
-    def _get_month_usage(self, driver):
-        """获取每月用电量"""
+            # 等待用电量的数据出现, 行数稳定后再读取
+            self.waiter.xhr_idle(driver)
+            self.waiter.element_visible(driver, By.XPATH, ACTIONS['daily_first_usage'])
+            self.waiter.rows_stable(driver, By.XPATH, SELECTORS['usage_daily']['rows']['xpath'])
+            return extract_page(driver, 'usage_daily')
 
         try:
-            self._click_button(driver, By.XPATH, "//div[@class='el-tabs__nav is-top']/div[@id='tab-first']")
-            time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-            if datetime.now().month == 1:
-                self._click_button(driver, By.XPATH, '//*[@id="pane-first"]/div[1]/div/div[1]/div/div/input')
-                time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-                span_element = driver.find_element(By.XPATH, f"//span[contains(text(), '{datetime.now().year - 1}')]")
-                span_element.click()
-                time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-            # wait for month displayed
-            target = driver.find_element(By.CLASS_NAME, "total")
-            WebDriverWait(driver, self.DRIVER_IMPLICITY_WAIT_TIME).until(EC.visibility_of(target))
-            month_element = driver.find_element(By.XPATH, "//*[@id='pane-first']/div[1]/div[2]/div[2]/div/div[3]/table/tbody").text
-            month_element = month_element.split("\n")
-            month_element.remove("MAX")
-            month_element = np.array(month_element).reshape(-1, 3)
-            # 将每月的用电量保存为List
-            month = []
-            usage = []
-            charge = []
-            for i in range(len(month_element)):
-                month.append(month_element[i][0])
-                usage.append(month_element[i][1])
-                charge.append(month_element[i][2])
-            return month, usage, charge
+            return self.retry.call('read_daily', _read)
         except Exception as e:
-            logging.error(f"The month data get failed : {e}")
-            return None,None,None
+            logging.error(f"The daily page get failed : {e}")
+            return None
+
+    def _get_yesterday_usage(self, daily_page):
+        """获取最近一次用电量"""
+        date, usages = self._get_daily_usage_data(daily_page)
+        if not date:
+            logging.error(f"The yesterday data get failed")
+            return None, None
+        return date[0], float(usages[0])
 
     # 增加获取每日用电量的函数
-    def _get_daily_usage_data(self, driver):
+    def _get_daily_usage_data(self, daily_page):
         """储存指定天数的用电量"""
-        retention_days = config.electricity['data_retention_days']
-        self._click_button(driver, By.XPATH, "//div[@class='el-tabs__nav is-top']/div[@id='tab-second']")
-        time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-
-        # 7 天在第一个 label, 30 天 开通了智能缴费之后才会出现在第二个, (sb sgcc)
-        if retention_days == 7:
-            self._click_button(driver, By.XPATH, "//*[@id='pane-second']/div[1]/div/label[1]/span[1]")
-        elif retention_days == 30:
-            self._click_button(driver, By.XPATH, "//*[@id='pane-second']/div[1]/div/label[2]/span[1]")
-        else:
-            logging.error(f"Unsupported retention days value: {retention_days}")
-            return
-
-        time.sleep(self.RETRY_WAIT_TIME_OFFSET_UNIT)
-
-        # 等待用电量的数据出现
-        usage_element = driver.find_element(By.XPATH,
-                                            "//div[@class='el-tab-pane dayd']//div[@class='el-table__body-wrapper is-scrolling-none']/table/tbody/tr[1]/td[2]/div")
-        WebDriverWait(driver, self.DRIVER_IMPLICITY_WAIT_TIME).until(EC.visibility_of(usage_element))
-
-        # 获取用电量的数据
-        days_element = driver.find_elements(By.XPATH,
-                                            "//*[@id='pane-second']/div[2]/div[2]/div[1]/div[3]/table/tbody/tr")  # 用电量值列表
+        if daily_page is None or not daily_page.get('rows'):
+            return None, None
         date = []
         usages = []
         # 将用电量保存为字典
-        for i in days_element:
-            day = i.find_element(By.XPATH, "td[1]/div").text
-            usage = i.find_element(By.XPATH, "td[2]/div").text
+        for row in daily_page['rows']:
+            if len(row) < 2:
+                continue
+            day, usage = row[0], row[1]
             if usage != "":
                 usages.append(usage)
                 date.append(day)
             else:
-                logging.info(f"The electricity consumption of {usage} get nothing")
+                logging.info(f"The electricity consumption of {day} get nothing")
         return date, usages
 
     @staticmethod
@@ -596,6 +1152,7 @@ class DataFetcher:
         return True
 
     @staticmethod
+    @functools.lru_cache(maxsize=None)
     def _get_chromium_version():
         result = str(subprocess.check_output(["chromium", "--product-version"]))
         version = re.findall(r"(\d*)\.", result)[0]
@@ -0,0 +1,78 @@
+import logging
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def _available_memory_mb():
+    '''读取 /proc/meminfo 中的 MemAvailable，非 Linux 环境返回 None'''
+    try:
+        with open('/proc/meminfo', 'r') as file:
+            for line in file:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+
+def auto_worker_count(browser_memory_mb, account_count):
+    '''按可用内存和 CPU 核数估算可以同时运行的浏览器数量'''
+    workers = os.cpu_count() or 1
+    available_mb = _available_memory_mb()
+    if available_mb is not None:
+        workers = min(workers, available_mb // browser_memory_mb)
+    return max(1, min(workers, account_count))
+
+
+class FetcherPool:
+    '''用有限数量的浏览器并发抓取多个账号，单个账号失败不影响其它账号'''
+
+    def __init__(self, fetchers, max_workers=0, browser_memory_mb=400):
+        self.fetchers = fetchers
+        if max_workers > 0:
+            self.max_workers = min(max_workers, len(fetchers))
+        else:
+            self.max_workers = auto_worker_count(browser_memory_mb, len(fetchers))
+        resident = [fetcher for fetcher in fetchers if fetcher.RESIDENT_BROWSER]
+        if resident and len(fetchers) > self.max_workers:
+            # 每个账号各自常驻一个浏览器，账号多于浏览器上限时会超出 max_browsers 和内存的限制
+            logging.warning(f"resident_browser keeps one browser per account, {len(fetchers)} accounts are more than {self.max_workers} browsers, disable it.")
+            for fetcher in resident:
+                fetcher.RESIDENT_BROWSER = False
+        logging.info(f"{len(fetchers)} accounts will be fetched by {self.max_workers} browsers.")
+
+    def _fetch_one(self, fetcher, on_user=None, resume=False):
+        try:
+            if resume:
+                return fetcher.resume(on_user) or {}
+            return fetcher.fetch(on_user) or {}
+        except Exception as e:
+            logging.error(f"Fetch account {fetcher.masked_username} failed, reason is {e}")
+            traceback.print_exc()
+            return {}
+
+    def fetch_all(self, on_user=None):
+        '''返回所有账号下户号数据合并后的字典，on_user 会在每个户号抓取完成时被调用(可能来自不同线程)'''
+        return self._run(self.fetchers, on_user, False)
+
+    def resume_all(self, on_user=None):
+        '''只对运行日志中还有缺失部分的账号补抓'''
+        return self._run([fetcher for fetcher in self.fetchers if fetcher.needs_resume()], on_user, True)
+
+    def needs_resume(self):
+        return any(fetcher.needs_resume() for fetcher in self.fetchers)
+
+    def _run(self, fetchers, on_user, resume):
+        if not fetchers:
+            return {}
+        if self.max_workers == 1:
+            results = [self._fetch_one(fetcher, on_user, resume) for fetcher in fetchers]
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='fetcher') as executor:
+                futures = [executor.submit(self._fetch_one, fetcher, on_user, resume) for fetcher in fetchers]
+                results = [future.result() for future in as_completed(futures)]
+        data = {}
+        for result in results:
+            data.update(result)
+        return data
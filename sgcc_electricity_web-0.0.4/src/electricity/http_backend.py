@@ -0,0 +1,93 @@
+import logging
+from datetime import datetime, timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .const import BASE_URL, CAPTURE_FIELDS, ELECTRIC_USAGE_URL, HTTP_API, HTTP_TOKEN_HEADER, HTTP_TOKEN_KEYS, LOGIN_URL
+from .metrics import metrics
+from .network_capture import _find_key, _first, parse_payloads
+from .retry import RetryPolicy
+
+
+class HttpSessionExpired(Exception):
+    '''接口不接受当前的登录态，需要重新用浏览器登录'''
+
+
+def _fill(template, values):
+    '''替换 body 模板中字符串里的 {user_id} 等占位符'''
+    return {key: value.format(**values) if isinstance(value, str) else value for key, value in template.items()}
+
+
+class HttpBackend:
+    '''用浏览器登录后的 cookies 和 token 直接请求数据接口，多个户号共用同一个 keep-alive 连接池并发抓取'''
+
+    def __init__(self, concurrency=4, timeout=15, retry=None):
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        # 登录态失效时重试没有意义，直接交给浏览器重新登录
+        self.retry = retry or RetryPolicy(retry_on=(requests.RequestException, ValueError))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def authenticate(self, snapshot, user_agent=None):
+        '''载入浏览器的登录态(SessionStore.snapshot 的结果)，连接池在多次运行之间复用'''
+        self.session.cookies.clear()
+        for cookie in snapshot.get('cookies', []):
+            self.session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+        self.session.headers.update({
+            'Content-Type': 'application/json;charset=UTF-8',
+            'Origin': BASE_URL,
+            'Referer': ELECTRIC_USAGE_URL,
+        })
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+        token = _first(snapshot.get('local_storage', {}), HTTP_TOKEN_KEYS)
+        if token is not None:
+            self.session.headers[HTTP_TOKEN_HEADER] = token
+        else:
+            self.session.headers.pop(HTTP_TOKEN_HEADER, None)
+
+    def _request(self, name, body):
+        with metrics.span('http_request', endpoint=name):
+            response = self.session.post(BASE_URL + HTTP_API[name]['path'], json=body, timeout=self.timeout)
+            if response.status_code in (401, 403) or response.url.startswith(LOGIN_URL):
+                raise HttpSessionExpired(f"{name} returned {response.status_code}")
+            response.raise_for_status()
+            return response.json()
+
+    def post(self, name, **values):
+        '''请求一个接口并返回 JSON，网络错误按 self.retry 重试'''
+        return self.retry.call(f"http_{name}", self._request, name, _fill(HTTP_API[name]['body'], values))
+
+    def user_list(self):
+        '''账号下的 [(户号, 地址)]，顺序与页面上的户号下拉列表一致'''
+        users = []
+        for item in _find_key(self.post('user_list'), CAPTURE_FIELDS['user_list']) or []:
+            user_id = _first(item, CAPTURE_FIELDS['user_id'])
+            if user_id is not None:
+                users.append((str(user_id), _first(item, CAPTURE_FIELDS['user_location'])))
+        return users
+
+    def fetch_user(self, user_id, year, month=True, daily=True, daily_days=7):
+        '''请求一个户号的余额、year 年的年度和月度、每日数据，返回 parse_payloads 的结果；失败的部分不在结果中'''
+        now = datetime.now()
+        calls = [('balance', {})]
+        if month:
+            calls.append(('month', {'year': str(year)}))
+        if daily:
+            calls.append(('daily', {'start': (now - timedelta(days=daily_days)).strftime('%Y-%m-%d'), 'end': (now - timedelta(days=1)).strftime('%Y-%m-%d')}))
+        payloads = []
+        for name, values in calls:
+            try:
+                payloads.append(self.post(name, user_id=user_id, **values))
+            except HttpSessionExpired:
+                raise
+            except Exception as e:
+                logging.info(f"Request {name} of {user_id} failed: {e}")
+        return parse_payloads(payloads)
+
+    def close(self):
+        self.session.close()
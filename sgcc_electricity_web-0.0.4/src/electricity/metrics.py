@@ -0,0 +1,129 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# 秒，覆盖从单次 ONNX 推理到一次完整抓取的耗时范围
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+class Span:
+    '''一次计时，outcome 默认为 ok，出现异常时为 error，也可以在 with 块内手动修改'''
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.outcome = 'ok'
+
+
+class Metrics:
+    '''记录抓取各阶段的耗时和结果，并以 Prometheus 文本格式输出'''
+
+    def __init__(self, prefix='sgcc_fetch'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._series = {}
+        self._counters = {}
+        self._gauges = {}
+
+    @contextmanager
+    def span(self, name, **labels):
+        span = Span(name, labels)
+        start = time.monotonic()
+        try:
+            yield span
+        except BaseException:
+            span.outcome = 'error'
+            raise
+        finally:
+            self.observe(name, time.monotonic() - start, span.outcome, **labels)
+
+    def observe(self, name, seconds, outcome='ok', **labels):
+        key = (name, outcome, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'buckets': [0] * len(BUCKETS), 'count': 0, 'sum': 0.0, 'last': 0.0}
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    series['buckets'][i] += 1
+            series['count'] += 1
+            series['sum'] += seconds
+            series['last'] = seconds
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+            self._counters = {}
+            self._gauges = {}
+
+    def summary(self):
+        '''各阶段的次数、总耗时、平均耗时，供基准测试输出'''
+        with self._lock:
+            items = sorted(self._series.items())
+        result = []
+        for (name, outcome, labels), value in items:
+            result.append(dict(labels, span=name, outcome=outcome, count=value['count'],
+                               sum=round(value['sum'], 6), avg=round(value['sum'] / value['count'], 6)))
+        return result
+
+    @staticmethod
+    def _format_labels(labels):
+        escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in labels]
+        return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+    def render(self):
+        with self._lock:
+            series = {k: dict(v, buckets=list(v['buckets'])) for k, v in self._series.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+
+        histogram = f"{self.prefix}_span_seconds"
+        last = f"{self.prefix}_span_last_seconds"
+        lines = [
+            f"# HELP {histogram} Duration of fetch phases.",
+            f"# TYPE {histogram} histogram",
+        ]
+        for (name, outcome, labels), value in sorted(series.items()):
+            base = [('span', name), ('outcome', outcome)] + list(labels)
+            for bound, count in zip(BUCKETS, value['buckets']):
+                lines.append(f"{histogram}_bucket{self._format_labels(base + [('le', bound)])} {count}")
+            lines.append(f"{histogram}_bucket{self._format_labels(base + [('le', '+Inf')])} {value['count']}")
+            lines.append(f"{histogram}_sum{self._format_labels(base)} {value['sum']:.6f}")
+            lines.append(f"{histogram}_count{self._format_labels(base)} {value['count']}")
+
+        lines += [
+            f"# HELP {last} Duration of the most recent run of each fetch phase.",
+            f"# TYPE {last} gauge",
+        ]
+        for (name, outcome, labels), value in sorted(series.items()):
+            base = [('span', name), ('outcome', outcome)] + list(labels)
+            lines.append(f"{last}{self._format_labels(base)} {value['last']:.6f}")
+
+        names = sorted({name for name, _ in counters})
+        for counter in names:
+            metric = f"{self.prefix}_{counter}_total"
+            lines += [f"# TYPE {metric} counter"]
+            for (name, labels), value in sorted(counters.items()):
+                if name == counter:
+                    lines.append(f"{metric}{self._format_labels(list(labels)) if labels else ''} {value}")
+
+        for gauge in sorted({name for name, _ in gauges}):
+            metric = f"{self.prefix}_{gauge}"
+            lines += [f"# TYPE {metric} gauge"]
+            for (name, labels), value in sorted(gauges.items()):
+                if name == gauge:
+                    lines.append(f"{metric}{self._format_labels(list(labels)) if labels else ''} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
@@ -0,0 +1,139 @@
+import json
+import logging
+import re
+
+from selenium.common.exceptions import WebDriverException
+
+from .const import CAPTURE_API_KEYWORDS, CAPTURE_FIELDS
+
+
+def _find_key(node, keys):
+    '''深度优先查找第一个出现的字段，返回其值'''
+    if isinstance(node, dict):
+        for key in keys:
+            if key in node and node[key] not in (None, ""):
+                return node[key]
+        children = node.values()
+    elif isinstance(node, list):
+        children = node
+    else:
+        return None
+    for child in children:
+        value = _find_key(child, keys)
+        if value is not None:
+            return value
+    return None
+
+
+def _first(item, keys):
+    for key in keys:
+        if key in item and item[key] not in (None, ""):
+            return item[key]
+    return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _normalize_date(value, length):
+    '''把 202412 / 2024-12 / 20241229 / 2024-12-29 统一成 2024-12 或 2024-12-29'''
+    digits = re.sub(r"[^0-9]", "", str(value))
+    if len(digits) < length:
+        return None
+    if length == 6:
+        return f"{digits[0:4]}-{digits[4:6]}"
+    return f"{digits[0:4]}-{digits[4:6]}-{digits[6:8]}"
+
+
+def parse_payloads(payloads):
+    '''从接口 JSON 中解析余额、年度、月度和每日数据，后出现的响应覆盖先出现的'''
+    result = {}
+    for payload in payloads:
+        balance = _to_float(_find_key(payload, CAPTURE_FIELDS['balance']))
+        if balance is not None:
+            result['balance'] = balance
+
+        yearly_usage = _to_float(_find_key(payload, CAPTURE_FIELDS['yearly_usage']))
+        yearly_charge = _to_float(_find_key(payload, CAPTURE_FIELDS['yearly_charge']))
+        if yearly_usage is not None or yearly_charge is not None:
+            result['yearly'] = {'usage': yearly_usage, 'charge': yearly_charge}
+
+        month_list = _find_key(payload, CAPTURE_FIELDS['month_list'])
+        if isinstance(month_list, list) and month_list:
+            month = []
+            for item in month_list:
+                date = _normalize_date(_first(item, CAPTURE_FIELDS['month_date']), 6)
+                if date is None:
+                    continue
+                month.append({
+                    'date': date,
+                    'usage': _to_float(_first(item, CAPTURE_FIELDS['month_usage'])),
+                    'charge': _to_float(_first(item, CAPTURE_FIELDS['month_charge'])),
+                })
+            result['month'] = sorted(month, key=lambda m: m['date'])
+
+        daily_list = _find_key(payload, CAPTURE_FIELDS['daily_list'])
+        if isinstance(daily_list, list) and daily_list:
+            daily = []
+            for item in daily_list:
+                date = _normalize_date(_first(item, CAPTURE_FIELDS['daily_date']), 8)
+                usage = _to_float(_first(item, CAPTURE_FIELDS['daily_usage']))
+                if date is None or usage is None:
+                    continue
+                daily.append({'date': date, 'usage': usage})
+            # 与页面表格一致，最近的一天排在最前
+            result['daily'] = sorted(daily, key=lambda d: d['date'], reverse=True)
+    return result
+
+
+class NetworkCapture:
+    '''从 Chrome DevTools 的 performance 日志中读取数据接口的 JSON 响应'''
+
+    @staticmethod
+    def enable(chrome_options):
+        chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+    def drain(self, driver):
+        '''丢弃之前累积的日志，只保留之后页面产生的响应'''
+        try:
+            driver.get_log('performance')
+        except WebDriverException as e:
+            logging.debug(f"Drain performance log failed: {e}")
+
+    def collect(self, driver):
+        '''读取一次 performance 日志，取出匹配接口的响应体并解析'''
+        try:
+            entries = driver.get_log('performance')
+        except WebDriverException as e:
+            logging.warning(f"Read performance log failed: {e}")
+            return {}
+
+        request_ids = []
+        for entry in entries:
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+            if message.get('method') != 'Network.responseReceived':
+                continue
+            response = message['params']['response']
+            if 'json' not in response.get('mimeType', '') or \
+                    not any(keyword in response.get('url', '') for keyword in CAPTURE_API_KEYWORDS):
+                continue
+            request_ids.append(message['params']['requestId'])
+
+        payloads = []
+        for request_id in request_ids:
+            try:
+                body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+                payloads.append(json.loads(body['body']))
+            except (WebDriverException, KeyError, ValueError) as e:
+                # 响应体已被回收或不是明文 JSON(例如加密接口)
+                logging.debug(f"Read response body of {request_id} failed: {e}")
+        result = parse_payloads(payloads)
+        logging.info(f"Captured {len(payloads)} responses, sections: {sorted(result.keys())}")
+        return result
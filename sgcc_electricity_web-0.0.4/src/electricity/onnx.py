@@ -1,15 +1,104 @@
 # import cv2
+import hashlib
+import logging
+import os
+import platform
+import threading
+
 from PIL import ImageDraw,Image,ImageOps
 import numpy as np
 import onnxruntime
 
+from .metrics import metrics
+
 anchors = [[(116,90),(156,198),(373,326)],[(30,61),(62,45),(59,119)],[(10,13),(16,30),(33,23)]]
 anchors_yolo_tiny = [[(81, 82), (135, 169), (344, 319)], [(10, 14), (23, 27), (37, 58)]]
 CLASSES=["target"]
+# 模型输入的边长
+INPUT_SIZE = 416
+# 可选的验证码模型，int8 由 benchmark/quantize_captcha_model.py 从 float 模型量化得到
+MODEL_VARIANTS = {
+    'float': 'captcha.onnx',
+    'int8': 'captcha.int8.onnx',
+}
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    'disable': onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+EXECUTION_MODES = {
+    'sequential': onnxruntime.ExecutionMode.ORT_SEQUENTIAL,
+    'parallel': onnxruntime.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def model_path(variant='float'):
+    '''模型文件的路径，所选的模型不存在时退回 float 模型'''
+    folder = os.path.dirname(os.path.abspath(__file__))
+    path = os.path.join(folder, MODEL_VARIANTS.get(variant, MODEL_VARIANTS['float']))
+    if not os.path.exists(path):
+        logging.warning(f"Captcha model {variant} is not found at {path}, use the float model.")
+        path = os.path.join(folder, MODEL_VARIANTS['float'])
+    return path
+
 
 class ONNX:
-    def __init__(self,onnx_file_name="captcha.onnx"):
-        self.onnx_session = onnxruntime.InferenceSession(onnx_file_name) 
+    def __init__(self,onnx_file_name="captcha.onnx", optimization='all', intra_op_threads=0, inter_op_threads=0, execution_mode='sequential', cache_dir=None):
+        '''线程数为 0 时由 onnxruntime 决定；cache_dir 不为空时把优化后的模型保存在该目录，之后启动时直接加载'''
+        self.optimization = optimization
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.execution_mode = execution_mode
+        self.onnx_session = self._create_session(onnx_file_name, cache_dir)
+        # 输入输出名只在创建会话时读取一次
+        self.input_name = self.onnx_session.get_inputs()[0].name
+        self.output_names = [self.onnx_session.get_outputs()[0].name]
+        # batch 维度为符号(动态)时多张图片可以在一次 run 中推理
+        self.dynamic_batch = not isinstance(self.onnx_session.get_inputs()[0].shape[0], int)
+        # 多个账号可能同时登录，每个线程复用自己的输入缓冲区
+        self._local = threading.local()
+
+    def _session_options(self, optimization):
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[optimization]
+        options.execution_mode = EXECUTION_MODES[self.execution_mode]
+        if self.intra_op_threads > 0:
+            options.intra_op_num_threads = self.intra_op_threads
+        if self.inter_op_threads > 0:
+            options.inter_op_num_threads = self.inter_op_threads
+        return options
+
+    def _cache_path(self, onnx_file_name, cache_dir):
+        '''优化结果与模型内容、优化级别、onnxruntime 版本和 CPU 架构有关，任意一个变化都使用新的缓存文件'''
+        with open(onnx_file_name, 'rb') as file:
+            model_hash = hashlib.sha1(file.read()).hexdigest()[0:12]
+        name = os.path.splitext(os.path.basename(onnx_file_name))[0]
+        return os.path.join(cache_dir, f"{name}.{model_hash}.{self.optimization}.ort{onnxruntime.__version__}.{platform.machine()}.onnx")
+
+    def _create_session(self, onnx_file_name, cache_dir):
+        if not cache_dir or self.optimization == 'disable':
+            with metrics.span('captcha_model_load', cache='off'):
+                return onnxruntime.InferenceSession(onnx_file_name, self._session_options(self.optimization))
+
+        cache_path = self._cache_path(onnx_file_name, cache_dir)
+        if os.path.exists(cache_path):
+            try:
+                # 缓存的模型已经优化过，加载时不再重复优化
+                with metrics.span('captcha_model_load', cache='hit'):
+                    return onnxruntime.InferenceSession(cache_path, self._session_options('disable'))
+            except Exception as e:
+                logging.warning(f"Load optimized captcha model {cache_path} failed, optimize again: {e}")
+                os.remove(cache_path)
+
+        options = self._session_options(self.optimization)
+        os.makedirs(cache_dir, exist_ok=True)
+        options.optimized_model_filepath = cache_path
+        with metrics.span('captcha_model_load', cache='miss'):
+            session = onnxruntime.InferenceSession(onnx_file_name, options)
+        logging.info(f"Optimized captcha model saved to {cache_path}")
+        return session
 
     # sigmoid函数
     def sigmoid(self,x):
@@ -40,48 +129,24 @@ class ONNX:
     # dets:  array [x,6] 6个值分别为x1,y1,x2,y2,score,class
     # thresh: 阈值
     def nms(self,dets, thresh):
-        # dets:x1 y1 x2 y2 score class
-        # x[:,n]就是取所有集合的第n个数据
+        '''返回保留的框在 dets 中的下标，按置信度从大到小排列；每轮只对剩余的框做一次向量化的 IOU 计算'''
         x1 = dets[:, 0]
         y1 = dets[:, 1]
         x2 = dets[:, 2]
         y2 = dets[:, 3]
-        # -------------------------------------------------------
-        #   计算框的面积
-        #	置信度从大到小排序
-        # -------------------------------------------------------
         areas = (y2 - y1 + 1) * (x2 - x1 + 1)
-        scores = dets[:, 4]
-        # print(scores)
+        index = np.argsort(-dets[:, 4], kind='stable')  # 置信度从大到小
         keep = []
-        index = scores.argsort()[::-1]  # np.argsort()对某维度从小到大排序
-        # [::-1] 从最后一个元素到第一个元素复制一遍。倒序从而从大到小排序
-
         while index.size > 0:
             i = index[0]
             keep.append(i)
-            # -------------------------------------------------------
-            #   计算相交面积
-            #	1.相交
-            #	2.不相交
-            # -------------------------------------------------------
-            x11 = np.maximum(x1[i], x1[index[1:]])
-            y11 = np.maximum(y1[i], y1[index[1:]])
-            x22 = np.minimum(x2[i], x2[index[1:]])
-            y22 = np.minimum(y2[i], y2[index[1:]])
-
-            w = np.maximum(0, x22 - x11 + 1)
-            h = np.maximum(0, y22 - y11 + 1)
-
+            rest = index[1:]
+            w = np.maximum(0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]) + 1)
+            h = np.maximum(0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]) + 1)
             overlaps = w * h
-            # -------------------------------------------------------
-            #   计算该框与其它框的IOU，去除掉重复的框，即IOU值大的框
-            #	IOU小于thresh的框保留下来
-            # -------------------------------------------------------
-            ious = overlaps / (areas[i] + areas[index[1:]] - overlaps)
-            idx = np.where(ious <= thresh)[0]
-            index = index[idx + 1]
-        return keep
+            # IOU 小于 thresh 的框保留到下一轮
+            index = rest[overlaps <= thresh * (areas[i] + areas[rest] - overlaps)]
+        return np.array(keep, dtype=np.intp)
 
 
     def draw(self,image, box_data):
@@ -110,53 +175,28 @@ class ONNX:
         return image
 
     # 获取预测框
-    def get_boxes(self, prediction, confidence_threshold=0.7, nms_threshold=0.6):
-        # 过滤掉无用的框
-        # -------------------------------------------------------
-        #   删除为1的维度
-        #	删除置信度小于conf_thres的BOX
-        # -------------------------------------------------------
-        # for i in range(len(prediction)):
-        feature_map = np.squeeze(prediction)# 删除数组形状中单维度条目(shape中为1的维度)
-        # […,4]：代表了取最里边一层的所有第4号元素，…代表了对:,:,:,等所有的的省略。此处生成：25200个第四号元素组成的数组
-        conf = feature_map[..., 4] > confidence_threshold  # 0 1 2 3 4 4是置信度，只要置信度 > conf_thres 的
-        box = feature_map[conf == True]  # 根据objectness score生成(n, 5+class_nm)，只留下符合要求的框
-
-        # -------------------------------------------------------
-        #   通过argmax获取置信度最大的类别
-        # -------------------------------------------------------
-        cls_cinf = box[..., 5:]  # 左闭右开（5 6 7 8），就只剩下了每个grid cell中各类别的概率
-        cls = []
-        for i in range(len(cls_cinf)):
-            cls.append(int(np.argmax(cls_cinf[i])))  # 剩下的objecctness score比较大的grid cell，分别对应的预测类别列表
-        all_cls = list(set(cls))  # 去重，找出图中都有哪些类别
-        # set() 函数创建一个无序不重复元素集，可进行关系测试，删除重复数据，还可以计算交集、差集、并集等。
-        # -------------------------------------------------------
-        #   分别对每个类别进行过滤
-        #   1.将第6列元素替换为类别下标
-        #	2.xywh2xyxy 坐标转换
-        #	3.经过非极大抑制后输出的BOX下标
-        #	4.利用下标取出非极大抑制后的BOX
-        # -------------------------------------------------------
-        output = []
-        for i in range(len(all_cls)):
-            curr_cls = all_cls[i]
-            curr_cls_box = []
-            curr_out_box = []
-
-            for j in range(len(cls)):
-                if cls[j] == curr_cls:
-                    box[j][5] = curr_cls
-                    curr_cls_box.append(box[j][:6])  # 左闭右开，0 1 2 3 4 5
-
-            curr_cls_box = np.array(curr_cls_box)  # 0 1 2 3 4 5 分别是 x y w h score class
-            curr_cls_box = self.xywh2xyxy(curr_cls_box)  # 0 1 2 3 4 5 分别是 x1 y1 x2 y2 score class
-            curr_out_box = self.nms(curr_cls_box, nms_threshold)  # 获得nms后，剩下的类别在curr_cls_box中的下标
-
-            for k in curr_out_box:
-                output.append(curr_cls_box[k])
-        output = np.array(output)
-        return output
+    def get_boxes(self, prediction, confidence_threshold=0.7, nms_threshold=0.6, top1=False):
+        '''返回 [n, 6] 的 x1,y1,x2,y2,score,class，按置信度从大到小排列；top1 时只返回置信度最高的一个框'''
+        feature_map = prediction.reshape(-1, prediction.shape[-1])  # [n, 5 + 类别数]，每行 x y w h objectness 各类别概率
+        box = feature_map[feature_map[:, 4] > confidence_threshold]  # 只留下 objectness 大于阈值的框
+        if len(box) == 0:
+            return np.empty((0, 6), dtype=np.float32)
+        if top1:
+            # 置信度最高的框一定会被 NMS 保留，只需要这一个框时不必做 NMS
+            box = box[np.argmax(box[:, 4])][None]
+
+        output = np.empty((len(box), 6), dtype=np.float32)
+        output[:, :4] = self.xywh2xyxy(box[:, :4])
+        output[:, 4] = box[:, 4]
+        output[:, 5] = box[:, 5:].argmax(axis=1) if len(CLASSES) > 1 else 0
+        if top1:
+            return output
+        if len(CLASSES) == 1:
+            return output[self.nms(output, nms_threshold)]
+        # 多个类别时把各类别的框平移到互不重叠的区域，一次 NMS 即等同于按类别分别 NMS
+        shifted = output.copy()
+        shifted[:, :4] += output[:, 5:6] * (output[:, :4].max() + 1)
+        return output[self.nms(shifted, nms_threshold)]
 
     def letterbox(self, img, new_shape=(640, 640), color=(114, 114, 114), auto=False, scaleFill=False, scaleup=True,
                     stride=32):
@@ -197,23 +237,85 @@ class ONNX:
         img = ImageOps.expand(img, border=(left, top, right, bottom), fill=0)##left,top,right,bottom
         return img, ratio, (dw, dh)
 
+    def _input_buffer(self, batch=1):
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        if batch not in buffers:
+            buffers[batch] = np.empty((batch, 3, INPUT_SIZE, INPUT_SIZE), dtype=np.float32)
+        return buffers[batch]
+
+    def preprocess(self, image, out=None, scale=1.0):
+        '''缩放到 416x416 后直接写入 out([3, 416, 416] 的 float32 视图)，HWC 转 CHW、类型转换和归一化在同一次 divide 中完成
+
+        scale 小于 1 时缩小到 416*scale 放在左上角，其余部分填 0；返回缩放后的图片(画框时使用)；
+        out 为空时写入当前线程复用的 [1, 3, 416, 416] 缓冲区
+        '''
+        if out is None:
+            out = self._input_buffer()[0]
+        size = INPUT_SIZE if scale >= 1 else max(1, round(INPUT_SIZE * scale))
+        org_img = image if image.size == (size, size) else image.resize((size, size))
+        if org_img.mode != 'RGB':
+            org_img = org_img.convert('RGB')
+        if size != INPUT_SIZE:
+            out.fill(0)
+            out = out[:, :size, :size]
+        pixels = np.asarray(org_img)  # [416, 416, 3] uint8，唯一的中间数组
+        np.divide(pixels.transpose(2, 0, 1), np.float32(255.0), out=out, dtype=np.float32)
+        return org_img
+
     def _inference(self,image):
-        # org_img = cv2.resize(image, [416, 416]) # resize后的原图 (640, 640, 3)
-        org_img = image.resize((416,416))
-        # img = cv2.cvtColor(org_img, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)
-        img = org_img.convert("RGB")
-        img = np.array(img).transpose(2, 0, 1)
-        img = img.astype(dtype=np.float32)  # onnx模型的类型是type: float32[ , , , ]
-        img /= 255.0
-        img = np.expand_dims(img, axis=0) # [3, 640, 640]扩展为[1, 3, 640, 640]
-
-        inputs = {self.onnx_session.get_inputs()[0].name: img} 
-        prediction = self.onnx_session.run(None, inputs)[0] 
+        org_img = self.preprocess(image)
+        # 连续的 float32 缓冲区由 onnxruntime 直接使用，不再复制
+        prediction = self.onnx_session.run(self.output_names, {self.input_name: self._input_buffer()})[0]
         return prediction, org_img
 
+    def detect_batch(self, images, confidence_threshold=0.3, scales=None, y_range=None):
+        '''在一次 run 中推理多张图片(同一背景的多个缩放比例，或多张不同的背景)，返回置信度最高的 (下标, x1, [x1, y1, x2, y2], 置信度)
+
+        scales[i] 为第 i 张图片的缩小比例，框的坐标换算回 416x416 下的坐标；没有检测到时返回 (None, 0, None, None)
+        y_range 为 416x416 下的 (上边缘, 下边缘)，优先选择中心在该范围内的框，范围内没有超过阈值的框时不做限制
+        '''
+        scales = scales or [1.0] * len(images)
+        buffer = self._input_buffer(len(images))
+        for i, image in enumerate(images):
+            self.preprocess(image, buffer[i], scales[i])
+        with metrics.span('captcha_inference'):
+            if self.dynamic_batch or len(images) == 1:
+                predictions = self.onnx_session.run(self.output_names, {self.input_name: buffer})[0]
+            else:
+                # 模型的 batch 维度固定为 1 时只能逐张推理，仍然只比较一次结果
+                predictions = np.concatenate([self.onnx_session.run(self.output_names, {self.input_name: buffer[i:i + 1]})[0] for i in range(len(images))])
+        predictions = predictions.reshape(len(images), -1, predictions.shape[-1])
+        if y_range is not None:
+            objectness = predictions[..., 4]
+            centers = predictions[..., 1] / np.minimum(1.0, np.asarray(scales, dtype=np.float32))[:, None]
+            inside = (centers >= y_range[0]) & (centers <= y_range[1])
+            if (objectness[inside] > confidence_threshold).any():
+                predictions = predictions.copy()
+                predictions[..., 4] = np.where(inside, objectness, -1)
+        # 每张图片各自 get_boxes(top1=True)，再取其中置信度最高的一个
+        index, x1, best, confidence = None, 0, None, None
+        for i in range(len(images)):
+            boxes = self.get_boxes(predictions[i], confidence_threshold, top1=True)
+            if len(boxes) and (confidence is None or boxes[0, 4] > confidence):
+                box = boxes[0, :4] / min(1.0, scales[i])
+                index, x1, best, confidence = i, int(box[0]), box.tolist(), float(boxes[0, 4])
+        return index, x1, best, confidence
+
+    def detect(self, image, confidence_threshold=0.3, scales=(1.0,), y_range=None):
+        '''返回置信度最高的缺口 (x1, [x1, y1, x2, y2], 置信度)，没有检测到时返回 (0, None, None)
+
+        scales 有多个比例时把背景按这些比例缩小后批量推理，取其中置信度最高的缺口；y_range 见 detect_batch
+        '''
+        _, x1, box, confidence = self.detect_batch([image] * len(scales), confidence_threshold, list(scales), y_range)
+        return x1, box, confidence
+
     def get_distance(self,image,draw=False):
-        prediction, org_img = self._inference(image)
-        boxes = self.get_boxes(prediction=prediction)
+        with metrics.span('captcha_inference'):
+            prediction, org_img = self._inference(image)
+        # 只用第一个框的 x1，画框时才需要全部的框
+        boxes = self.get_boxes(prediction=prediction, top1=not draw)
         if len(boxes) == 0:
             print('No gaps were detected.')
             return 0
@@ -227,7 +329,8 @@ class ONNX:
             return int(boxes[..., :4].astype(np.int32)[0][0])
 
 if __name__ == "__main__":
-    onnx = ONNX()
+    # 在 src 目录下运行: python -m electricity.onnx
+    onnx = ONNX("electricity/captcha.onnx")
     img_path="../assets/background.png"
     # img = cv2.imread(img_path)
     img = Image.open(img_path)
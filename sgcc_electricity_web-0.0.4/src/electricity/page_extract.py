@@ -0,0 +1,38 @@
+import logging
+
+from .page_selectors import SELECTORS, SELECTORS_VERSION
+
+# 按定位表一次性读取整页需要的数据，缺失的字段返回 null
+EXTRACT_JS = """
+var spec = arguments[0], result = {};
+function nodes(xpath) {
+    var it = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null), list = [];
+    for (var i = 0; i < it.snapshotLength; i++) { list.push(it.snapshotItem(i)); }
+    return list;
+}
+function cellText(node, ignore) {
+    var lines = node.innerText.split('\\n').map(function (s) { return s.trim(); });
+    lines = lines.filter(function (s) { return s && ignore.indexOf(s) < 0; });
+    return lines.length ? lines[0] : '';
+}
+for (var name in spec) {
+    var field = spec[name], found = nodes(field.xpath), ignore = field.ignore || [];
+    if (field.rows) {
+        result[name] = found.map(function (tr) {
+            return Array.prototype.map.call(tr.querySelectorAll('td'), function (td) { return cellText(td, ignore); });
+        });
+    } else {
+        result[name] = found.length ? found[0].innerText.trim() : null;
+    }
+}
+return result;
+"""
+
+
+def extract_page(driver, page):
+    '''一次 execute_script 读取 page 对应定位表中的所有字段'''
+    result = driver.execute_script(EXTRACT_JS, SELECTORS[page]) or {}
+    missing = [name for name, value in result.items() if value in (None, [])]
+    if missing:
+        logging.debug(f"Selectors v{SELECTORS_VERSION} of page {page} found nothing for {missing}")
+    return result
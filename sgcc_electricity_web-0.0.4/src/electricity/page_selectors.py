@@ -0,0 +1,43 @@
+# 国网页面的元素定位表，页面改版时只需要修改这里并增加版本号
+# 每个字段: xpath 定位节点; rows=True 时返回表格每一行各单元格的文本; ignore 为单元格内需要忽略的行
+SELECTORS_VERSION = 1
+
+SELECTORS = {
+    # 账户余额页 BALANCE_URL
+    'balance': {
+        'user_id': {'xpath': '//*[@id="app"]/div/div/article/div/div/div[2]/div/div/div[1]/div[2]/div/div/div/div[2]/div/div[1]/div/ul/div/li[1]/span[2]'},
+        'user_location': {'xpath': '//*[@id="app"]/div/div/article/div/div/div[2]/div/div/div[1]/div[2]/div/div/div/div[2]/div/div[1]/div/ul/div/li[2]/span[2]'},
+        'balance': {'xpath': "//*[contains(concat(' ', normalize-space(@class), ' '), ' num ')]"},
+        'balance_text': {'xpath': "//*[contains(concat(' ', normalize-space(@class), ' '), ' amttxt ')]"},
+    },
+    # 用电量页 ELECTRIC_USAGE_URL 的月用电量标签
+    'usage_month': {
+        'yearly_usage': {'xpath': "//ul[@class='total']/li[1]/span"},
+        'yearly_charge': {'xpath': "//ul[@class='total']/li[2]/span"},
+        'rows': {'xpath': "//*[@id='pane-first']/div[1]/div[2]/div[2]/div/div[3]/table/tbody/tr", 'rows': True, 'ignore': ["MAX"]},
+    },
+    # 用电量页 ELECTRIC_USAGE_URL 的日用电量标签
+    'usage_daily': {
+        'rows': {'xpath': "//*[@id='pane-second']/div[2]/div[2]/div[1]/div[3]/table/tbody/tr", 'rows': True},
+    },
+}
+
+# 页面上需要点击或等待的元素
+ACTIONS = {
+    'tab_month': "//div[@class='el-tabs__nav is-top']/div[@id='tab-first']",
+    'tab_daily': "//div[@class='el-tabs__nav is-top']/div[@id='tab-second']",
+    'year_input': '//*[@id="pane-first"]/div[1]/div/div[1]/div/div/input',
+    'year_option': "//span[contains(text(), '{year}')]",
+    # 7 天在第一个 label, 30 天 开通了智能缴费之后才会出现在第二个
+    'daily_range': "//*[@id='pane-second']/div[1]/div/label[{index}]/span[1]",
+    # 日用电量标签中的自定义日期范围(element-ui 日期范围选择器)，历史回填时使用；尚未用录制的页面核对，日用电量回填默认关闭
+    'daily_start_date': "//*[@id='pane-second']//input[@placeholder='开始日期']",
+    'daily_end_date': "//*[@id='pane-second']//input[@placeholder='结束日期']",
+    # 滑块验证码的刷新按钮和验证失败状态，按 vue-monoplasty-slide-verify 组件的类名定位，尚未用录制的登录页核对；
+    # 找不到时登录流程回退为重新点击登录、等待页面跳转，不会阻塞在隐式等待上
+    'captcha_refresh': "//*[@id='slideVerify']//*[contains(@class, 'slide-verify-refresh-icon')]",
+    'captcha_failed': "//*[contains(@class, 'slide-verify-slider') and contains(@class, 'container-fail')]",
+    # element-ui 表格没有数据时显示的占位块，{pane} 为 pane-first / pane-second
+    'table_empty': "//*[@id='{pane}']//*[contains(@class, 'el-table__empty-block')]",
+    'daily_first_usage': "//div[@class='el-tab-pane dayd']//div[@class='el-table__body-wrapper is-scrolling-none']/table/tbody/tr[1]/td[2]/div",
+}
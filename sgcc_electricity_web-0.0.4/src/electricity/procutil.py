@@ -0,0 +1,88 @@
+import os
+
+
+def _read_proc(pid, name):
+    try:
+        with open(f"/proc/{pid}/{name}", 'r') as file:
+            return file.read()
+    except OSError:
+        return None
+
+
+def list_processes():
+    '''遍历 /proc 返回 [(pid, comm, state, ppid)]，非 Linux 环境返回空列表'''
+    result = []
+    if not os.path.isdir('/proc'):
+        return result
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        stat = _read_proc(entry, 'stat')
+        if stat is None:
+            continue
+        # comm 字段可能包含空格，从最后一个右括号之后开始解析
+        comm = stat[stat.find('(') + 1:stat.rfind(')')]
+        fields = stat[stat.rfind(')') + 2:].split()
+        result.append((int(entry), comm, fields[0], int(fields[1])))
+    return result
+
+
+def process_start_time(pid):
+    '''进程的启动时间(开机后的时钟节拍数)，与 pid 一起标识一个进程，pid 被复用后会不同；进程不存在时返回 None'''
+    stat = _read_proc(pid, 'stat')
+    if stat is None:
+        return None
+    return int(stat[stat.rfind(')') + 2:].split()[19])
+
+
+def _children_map():
+    '''ppid -> [pid] 的映射'''
+    children = {}
+    for pid, _, _, ppid in list_processes():
+        children.setdefault(ppid, []).append(pid)
+    return children
+
+
+def process_tree(*root_pids):
+    '''返回 root_pids 及其所有子孙进程的 pid 列表'''
+    children = _children_map()
+    result = []
+    stack = [pid for pid in root_pids if pid]
+    while stack:
+        pid = stack.pop()
+        if pid in result:
+            continue
+        result.append(pid)
+        stack.extend(children.get(pid, []))
+    return result
+
+
+def rss_mb(pids):
+    '''统计一组进程的常驻内存之和，单位 MB'''
+    total_kb = 0
+    for pid in pids:
+        status = _read_proc(pid, 'status')
+        if status is None:
+            continue
+        for line in status.splitlines():
+            if line.startswith('VmRSS:'):
+                total_kb += int(line.split()[1])
+                break
+    return total_kb / 1024
+
+
+def driver_pids(driver):
+    '''webdriver 对应的 chromedriver 进程和 undetected_chromedriver 单独拉起的浏览器进程'''
+    pids = []
+    service = getattr(driver, 'service', None)
+    process = getattr(service, 'process', None)
+    if process is not None:
+        pids.append(process.pid)
+    browser_pid = getattr(driver, 'browser_pid', None)
+    if browser_pid:
+        pids.append(browser_pid)
+    return pids
+
+
+def driver_rss_mb(driver):
+    return rss_mb(process_tree(*driver_pids(driver)))
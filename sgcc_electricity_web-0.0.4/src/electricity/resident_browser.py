@@ -0,0 +1,82 @@
+import logging
+import threading
+
+from .procutil import driver_rss_mb
+
+
+class ResidentBrowser:
+    '''在多次定时任务之间复用同一个浏览器，按运行次数或内存上限回收重建'''
+
+    def __init__(self, factory, max_runs=20, max_rss_mb=800):
+        self._factory = factory
+        self.max_runs = max_runs
+        self.max_rss_mb = max_rss_mb
+        self._driver = None
+        self._runs = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _is_healthy(driver):
+        try:
+            return driver.execute_script("return 1;") == 1
+        except Exception as e:
+            logging.info(f"Resident webdriver health check failed: {e}")
+            return False
+
+    def _quit(self):
+        if self._driver is not None:
+            try:
+                self._driver.quit()
+            except Exception as e:
+                logging.warning(f"Quit resident webdriver failed: {e}")
+        self._driver = None
+        self._runs = 0
+
+    def acquire(self):
+        '''取得一个可用的浏览器，需要时先回收旧实例；返回 (浏览器, 是否为上次保留下来的实例)'''
+        self._lock.acquire()
+        try:
+            if self._driver is not None and not self._is_healthy(self._driver):
+                self._quit()
+            if self._driver is None:
+                self._driver = self._factory()
+                logging.info("Resident webdriver started.")
+                return self._driver, False
+            logging.info(f"Reuse resident webdriver, {self._runs} runs so far.")
+            return self._driver, True
+        except Exception:
+            self._lock.release()
+            raise
+
+    def release(self, driver):
+        '''一次抓取结束后调用，超过运行次数或内存上限时关闭浏览器'''
+        try:
+            if driver is not self._driver:
+                driver.quit()
+                return
+            self._runs += 1
+            rss = driver_rss_mb(driver)
+            if self._runs >= self.max_runs:
+                logging.info(f"Resident webdriver reached {self._runs} runs, recycle it.")
+                self._quit()
+            elif self.max_rss_mb > 0 and rss > self.max_rss_mb:
+                logging.info(f"Resident webdriver uses {rss:.0f}MB memory, more than {self.max_rss_mb}MB, recycle it.")
+                self._quit()
+        finally:
+            self._lock.release()
+
+    def discard(self, driver):
+        '''抓取过程中浏览器出现异常时调用，下次 acquire 会重新创建'''
+        try:
+            if driver is self._driver:
+                self._quit()
+            else:
+                driver.quit()
+        finally:
+            self._lock.release()
+
+    def shutdown(self):
+        with self._lock:
+            if self._driver is not None:
+                logging.info("Shutdown resident webdriver.")
+            self._quit()
@@ -0,0 +1,85 @@
+import logging
+import random
+import threading
+import time
+
+from selenium.common.exceptions import WebDriverException
+
+from .metrics import metrics
+
+
+class RetryPolicy:
+    '''单个步骤(打开页面、切换户号、读取页面)失败时按指数退避加随机抖动重试，成功的步骤不会有额外等待'''
+
+    def __init__(self, attempts=3, base_delay=1.0, max_delay=30.0, jitter=0.5, retry_on=(WebDriverException,)):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.retry_on = retry_on
+
+    def delay(self, retry):
+        '''第 retry 次重试之前的等待时间: base * 2^(retry-1)，上限 max_delay，再乘以 [1-jitter, 1+jitter] 的随机系数'''
+        delay = min(self.max_delay, self.base_delay * (2 ** (retry - 1)))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def call(self, step, func, *args):
+        '''执行 func(*args)，记录该步骤的总耗时和重试次数，重试用完后抛出最后一次的异常'''
+        start = time.monotonic()
+        outcome = 'error'
+        try:
+            for attempt in range(1, self.attempts + 1):
+                try:
+                    result = func(*args)
+                    outcome = 'ok' if attempt == 1 else 'retried'
+                    return result
+                except self.retry_on as e:
+                    if attempt == self.attempts:
+                        raise
+                    delay = self.delay(attempt)
+                    metrics.inc('step_retries', step=step)
+                    logging.info(f"Step {step} failed ({type(e).__name__}), retry {attempt}/{self.attempts - 1} in {delay:.1f}s.")
+                    time.sleep(delay)
+        finally:
+            metrics.observe('step', time.monotonic() - start, outcome, step=step)
+
+
+class LoginCircuitBreaker:
+    '''连续登录失败达到阈值后熔断，冷却期间不再启动浏览器登录；冷却结束后放行一次试探，成功后恢复'''
+
+    def __init__(self, failure_threshold=3, cooldown_seconds=3600):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            # 冷却结束后进入半开状态，这次登录的结果决定恢复还是继续熔断
+            return time.monotonic() - self.opened_at >= self.cooldown_seconds
+
+    def retry_at(self):
+        '''熔断结束的时间(time.time())，未熔断时返回 None'''
+        with self._lock:
+            if self.opened_at is None:
+                return None
+            return time.time() + max(0, self.cooldown_seconds - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        metrics.inc('login_failures')
+        with self._lock:
+            self.failures += 1
+            if self.failure_threshold > 0 and self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    metrics.inc('login_circuit_opened')
+                self.opened_at = time.monotonic()
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+# 每个户号分别记录的部分: 余额页(余额和地址)、月用电量页(年度合计和每月账单)、日用电量页
+SECTIONS = ('balance', 'month', 'daily')
+
+
+class RunJournal:
+    '''记录最近一次抓取中每个户号各部分是否成功，保存在数据目录，补抓时只处理缺失的户号和部分'''
+
+    def __init__(self, data_path, username):
+        user_hash = hashlib.sha1(username.encode('utf-8')).hexdigest()[0:12]
+        self.path = os.path.join(data_path, f"journal_{user_hash}.json")
+        self._lock = threading.Lock()
+        self._state = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {'started_at': 0, 'attempts': 0, 'users': {}}
+        try:
+            with open(self.path, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Load run journal from {self.path} failed: {e}")
+            # 日志损坏时按整次失败处理，补抓会重新获取户号列表
+            return {'started_at': 0, 'attempts': 0, 'users': None}
+
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(self._state, file)
+        os.replace(tmp_path, self.path)
+
+    @property
+    def attempts(self):
+        '''本轮已经执行过的补抓次数'''
+        return self._state['attempts']
+
+    def reset(self):
+        '''定时的完整抓取开始时调用，在拿到户号列表之前整次抓取都视为缺失'''
+        with self._lock:
+            self._state = {'started_at': int(time.time()), 'attempts': 0, 'users': None}
+            self._save()
+
+    def start(self, user_id_list):
+        '''拿到户号列表后记录本次需要抓取的户号，补抓次数保持不变'''
+        with self._lock:
+            self._state['users'] = {user_id: {'index': index, 'sections': {}} for index, user_id in enumerate(user_id_list)}
+            self._save()
+
+    def begin_resume(self):
+        with self._lock:
+            self._state['attempts'] += 1
+            self._save()
+
+    def mark(self, user_id, status):
+        '''status: {section: 'ok' | 'failed'}'''
+        with self._lock:
+            users = self._state['users']
+            if users is None:
+                users = self._state['users'] = {}
+            user = users.setdefault(user_id, {'index': len(users), 'sections': {}})
+            user['sections'].update(status)
+            self._save()
+
+    def pending(self):
+        '''返回 [(userid_index, user_id, [缺失的部分])]，按户号在下拉列表中的顺序；还没有拿到户号列表时返回 None'''
+        with self._lock:
+            if self._state['users'] is None:
+                return None
+            users = sorted(self._state['users'].items(), key=lambda item: item[1]['index'])
+        result = []
+        for user_id, user in users:
+            missing = [section for section in SECTIONS if user['sections'].get(section) != 'ok']
+            if missing:
+                result.append((user['index'], user_id, missing))
+        return result
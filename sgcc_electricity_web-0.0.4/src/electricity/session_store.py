@@ -0,0 +1,90 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from urllib.parse import urlparse
+
+from selenium.common.exceptions import WebDriverException
+
+# 在目标站点的第一个文档里写回 localStorage，只执行一次
+RESTORE_STORAGE_JS = """
+(function (origin, items) {
+    if (location.origin !== origin || sessionStorage.getItem('__sgccRestored')) { return; }
+    for (var k in items) { localStorage.setItem(k, items[k]); }
+    sessionStorage.setItem('__sgccRestored', '1');
+})(%s, %s);
+"""
+
+
+class SessionStore:
+    '''把登录后的 cookies 和 localStorage 保存在数据目录，供下一次运行复用'''
+
+    def __init__(self, data_path, username, origin):
+        user_hash = hashlib.sha1(username.encode('utf-8')).hexdigest()[0:12]
+        self.path = os.path.join(data_path, f"session_{user_hash}.json")
+        self.origin = origin
+
+    @classmethod
+    def for_url(cls, data_path, username, url):
+        parsed = urlparse(url)
+        return cls(data_path, username, f"{parsed.scheme}://{parsed.netloc}")
+
+    @staticmethod
+    def snapshot(driver):
+        '''读取当前浏览器的登录态，可直接传给 restore 克隆到其它浏览器'''
+        return {
+            'saved_at': int(time.time()),
+            'cookies': driver.get_cookies(),
+            'local_storage': driver.execute_script("return Object.assign({}, window.localStorage);") or {},
+        }
+
+    def save(self, driver):
+        try:
+            snapshot = self.snapshot(driver)
+        except WebDriverException as e:
+            logging.warning(f"Read session from webdriver failed: {e}")
+            return False
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(snapshot, file)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, self.path)
+        logging.info(f"Session saved to {self.path}, {len(snapshot['cookies'])} cookies.")
+        return True
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Load session from {self.path} failed: {e}")
+            return None
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def restore(self, driver, snapshot):
+        '''在打开任何页面之前通过 CDP 写入 cookies，并预置 localStorage 的写回脚本'''
+        cookies = []
+        for cookie in snapshot.get('cookies', []):
+            item = {k: cookie[k] for k in ('name', 'value', 'domain', 'path', 'secure', 'httpOnly') if k in cookie}
+            if 'expiry' in cookie:
+                item['expires'] = cookie['expiry']
+            cookies.append(item)
+        try:
+            driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+            script = RESTORE_STORAGE_JS % (json.dumps(self.origin), json.dumps(snapshot.get('local_storage', {})))
+            # 常驻浏览器会被多次恢复，先移除上一次注入的脚本
+            previous = getattr(driver, '_sgcc_restore_script', None)
+            if previous:
+                driver.execute_cdp_cmd("Page.removeScriptToEvaluateOnNewDocument", {"identifier": previous})
+            result = driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": script})
+            driver._sgcc_restore_script = (result or {}).get('identifier')
+        except WebDriverException as e:
+            logging.warning(f"Restore session into webdriver failed: {e}")
+            return False
+        return True
@@ -0,0 +1,148 @@
+import contextlib
+import logging
+import time
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.wait import WebDriverWait
+
+# 在每个新文档里统计未完成的 XHR/fetch 请求数以及最后一次网络活动的时间
+XHR_HOOK_JS = """
+(function () {
+    if (window.__sgccXhr) { return; }
+    var state = window.__sgccXhr = {pending: 0, last: Date.now()};
+    function done() { state.pending = Math.max(0, state.pending - 1); state.last = Date.now(); }
+    var send = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        state.pending += 1; state.last = Date.now();
+        this.addEventListener('loadend', done);
+        return send.apply(this, arguments);
+    };
+    if (window.fetch) {
+        var _fetch = window.fetch;
+        window.fetch = function () {
+            state.pending += 1; state.last = Date.now();
+            return _fetch.apply(this, arguments).then(
+                function (r) { done(); return r; },
+                function (e) { done(); throw e; });
+        };
+    }
+})();
+"""
+
+# 返回 [未完成请求数, 距最后一次网络活动的毫秒数]，没有注入钩子时退化为 resource timing
+XHR_STATE_JS = """
+var s = window.__sgccXhr;
+if (s) { return [s.pending, Date.now() - s.last]; }
+var e = performance.getEntriesByType('resource');
+var last = e.length ? e[e.length - 1].responseEnd : 0;
+return [0, performance.now() - last];
+"""
+
+
+class Waiter:
+    '''按页面真实的就绪信号轮询等待，代替固定时长的 time.sleep'''
+
+    def __init__(self, timeout, poll_interval=0.2, quiet_time=0.5):
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.quiet_time = quiet_time
+        self.timings = []
+
+    @staticmethod
+    def install_xhr_hook(driver):
+        '''通过 CDP 把 XHR 计数钩子注入到之后打开的每个页面'''
+        try:
+            driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": XHR_HOOK_JS})
+        except (AttributeError, WebDriverException) as e:
+            logging.debug(f"Install xhr hook failed, fall back to resource timing: {e}")
+
+    @contextlib.contextmanager
+    def no_implicit_wait(self, driver):
+        '''临时关闭 driver 的隐式等待，轮询中探测元素时 find_elements 立即返回，不会阻塞到隐式等待超时'''
+        try:
+            previous = driver.timeouts.implicit_wait
+        except (AttributeError, WebDriverException):
+            previous = self.timeout
+        driver.implicitly_wait(0)
+        try:
+            yield
+        finally:
+            driver.implicitly_wait(previous)
+
+    def find_now(self, driver, by, key):
+        '''不经过隐式等待查找元素，不存在时返回空列表'''
+        with self.no_implicit_wait(driver):
+            return driver.find_elements(by, key)
+
+    def until(self, driver, name, condition, timeout=None):
+        '''轮询 condition 直到返回真值，记录并返回实际耗时内得到的结果'''
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        try:
+            result = WebDriverWait(driver, timeout, poll_frequency=self.poll_interval).until(condition)
+        except TimeoutException:
+            elapsed = time.monotonic() - start
+            self.timings.append((name, elapsed, False))
+            logging.warning(f"Wait for {name} timed out after {elapsed:.2f}s")
+            raise
+        elapsed = time.monotonic() - start
+        self.timings.append((name, elapsed, True))
+        logging.debug(f"Wait for {name} took {elapsed:.2f}s")
+        return result
+
+    def element_present(self, driver, by, key, timeout=None):
+        return self.until(driver, f"present {key}", EC.presence_of_element_located((by, key)), timeout)
+
+    def element_visible(self, driver, by, key, timeout=None):
+        return self.until(driver, f"visible {key}", EC.visibility_of_element_located((by, key)), timeout)
+
+    def element_clickable(self, driver, by, key, timeout=None):
+        return self.until(driver, f"clickable {key}", EC.element_to_be_clickable((by, key)), timeout)
+
+    def document_ready(self, driver, timeout=None):
+        return self.until(driver, "document ready",
+                          lambda d: d.execute_script("return document.readyState") == "complete", timeout)
+
+    def url_changed(self, driver, old_url, timeout=None):
+        return self.until(driver, f"url leave {old_url}", lambda d: d.current_url != old_url, timeout)
+
+    def xhr_idle(self, driver, timeout=None, quiet_time=None):
+        '''等待没有进行中的请求，且网络已安静 quiet_time 秒'''
+        quiet_ms = (self.quiet_time if quiet_time is None else quiet_time) * 1000
+
+        def _idle(d):
+            pending, idle_ms = d.execute_script(XHR_STATE_JS)
+            return pending == 0 and idle_ms >= quiet_ms
+
+        return self.until(driver, "xhr idle", _idle, timeout)
+
+    def rows_stable(self, driver, by, key, timeout=None, quiet_time=None):
+        '''等待表格行数大于 0 且在 quiet_time 秒内不再变化，返回这些行'''
+        quiet_time = self.quiet_time if quiet_time is None else quiet_time
+        state = {'count': -1, 'since': time.monotonic()}
+
+        def _stable(d):
+            rows = d.find_elements(by, key)
+            now = time.monotonic()
+            if len(rows) != state['count']:
+                state['count'] = len(rows)
+                state['since'] = now
+                return False
+            if rows and now - state['since'] >= quiet_time:
+                return rows
+            return False
+
+        # 表格为空时 find_elements 会等待隐式等待超时，轮询期间关闭隐式等待
+        with self.no_implicit_wait(driver):
+            return self.until(driver, f"rows stable {key}", _stable, timeout)
+
+    def reset(self):
+        self.timings = []
+
+    def summary(self):
+        '''本轮等待的总耗时及最慢的几步，用于日志输出'''
+        total = sum(t[1] for t in self.timings)
+        slowest = sorted(self.timings, key=lambda t: t[1], reverse=True)[:3]
+        steps = ", ".join(f"{name} {elapsed:.2f}s" for name, elapsed, _ in slowest)
+        return f"{len(self.timings)} waits took {total:.2f}s in total, slowest: {steps}"
@@ -0,0 +1,200 @@
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+from .metrics import metrics
+from .procutil import driver_pids, list_processes, process_start_time, process_tree, rss_mb
+
+
+def _kill(pids, sig=signal.SIGKILL):
+    for pid in pids:
+        try:
+            os.kill(pid, sig)
+        except OSError:
+            pass
+
+
+class RunSupervisor:
+    '''一次抓取期间定时采样浏览器进程树的内存，超过运行时长或内存上限时强制结束这些浏览器'''
+
+    def __init__(self, drivers, max_seconds, max_rss_mb, interval, name, on_sample=None):
+        self.drivers = list(drivers)
+        self.on_sample = on_sample
+        self.max_seconds = max_seconds
+        self.max_rss_mb = max_rss_mb
+        self.interval = interval
+        self.name = name
+        self.peak_rss_mb = 0
+        self.killed = None
+        self._started = time.monotonic()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._watch, name='fetch-watchdog', daemon=True)
+        self._thread.start()
+
+    def add(self, driver):
+        '''本次运行中新启动的浏览器(例如多户号并发时克隆的浏览器)也计入内存'''
+        with self._lock:
+            self.drivers.append(driver)
+
+    def _pids(self):
+        with self._lock:
+            drivers = list(self.drivers)
+        pids = []
+        for driver in drivers:
+            pids += driver_pids(driver)
+        return process_tree(*pids)
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval):
+            pids = self._pids()
+            if self.on_sample:
+                self.on_sample(pids)
+            rss = rss_mb(pids)
+            self.peak_rss_mb = max(self.peak_rss_mb, rss)
+            elapsed = time.monotonic() - self._started
+            if self.max_seconds > 0 and elapsed > self.max_seconds:
+                self.killed = f"running for {elapsed:.0f}s, longer than {self.max_seconds}s"
+            elif self.max_rss_mb > 0 and rss > self.max_rss_mb:
+                self.killed = f"using {rss:.0f}MB memory, more than {self.max_rss_mb}MB"
+            if self.killed:
+                logging.error(f"Fetch of {self.name} is {self.killed}, kill its webdriver processes {pids}.")
+                metrics.inc('watchdog_kills', account=self.name)
+                _kill(pids)
+                return
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        metrics.set('run_peak_rss_mb', round(self.peak_rss_mb, 1), account=self.name)
+        return self.peak_rss_mb
+
+
+class Watchdog:
+    '''登记本进程启动的浏览器，监督每次抓取，并清理残留的浏览器进程和僵尸进程
+
+    只清理登记过的进程: 浏览器进程树中出现过的 pid 连同启动时间保存在 registry_path，重启后仍能识别上次残留的进程，
+    不会误杀同一主机上用户自己的 Chrome 或其他程序的浏览器
+    '''
+
+    def __init__(self, registry_path=None):
+        self._drivers = []
+        self._lock = threading.Lock()
+        # 浏览器启动到登记完成之间不能清理，否则会把刚启动的浏览器当作残留进程
+        self._launch_lock = threading.Lock()
+        self.registry_path = registry_path
+        self._known = self._load()
+
+    def _load(self):
+        '''{pid: 启动时间}'''
+        if not self.registry_path or not os.path.exists(self.registry_path):
+            return {}
+        try:
+            with open(self.registry_path, 'r') as file:
+                return {int(pid): start for pid, start in json.load(file).get('pids', {}).items()}
+        except (OSError, ValueError, AttributeError) as e:
+            logging.warning(f"Load browser process registry from {self.registry_path} failed: {e}")
+            return {}
+
+    def _save(self):
+        if not self.registry_path:
+            return
+        tmp_path = self.registry_path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as file:
+                json.dump({'pids': {str(pid): start for pid, start in self._known.items()}}, file)
+            os.replace(tmp_path, self.registry_path)
+        except OSError as e:
+            logging.warning(f"Save browser process registry to {self.registry_path} failed: {e}")
+
+    def remember(self, pids):
+        '''登记本进程启动的浏览器进程及其子孙进程'''
+        with self._lock:
+            added = False
+            for pid in pids:
+                if pid in self._known:
+                    continue
+                start = process_start_time(pid)
+                if start is not None:
+                    self._known[pid] = start
+                    added = True
+            if added:
+                self._save()
+
+    @contextmanager
+    def launching(self):
+        with self._launch_lock:
+            yield
+
+    def track(self, driver):
+        with self._lock:
+            self._drivers.append(driver)
+        self.remember(process_tree(*driver_pids(driver)))
+
+    def supervise(self, driver, max_seconds, max_rss_mb, interval=5, name=''):
+        # 运行中新出现的 renderer 等子进程在每次采样时登记
+        return RunSupervisor([driver], max_seconds, max_rss_mb, interval, name, self.remember)
+
+    def _live_pids(self):
+        '''仍在使用的浏览器的进程，已经退出的浏览器不再登记'''
+        with self._lock:
+            drivers = list(self._drivers)
+        alive = []
+        pids = set()
+        for driver in drivers:
+            tree = process_tree(*driver_pids(driver))
+            if any(os.path.exists(f"/proc/{pid}") for pid in tree):
+                alive.append(driver)
+                pids.update(tree)
+        with self._lock:
+            self._drivers = [driver for driver in self._drivers if driver in alive or driver not in drivers]
+        return pids
+
+    def reap(self):
+        '''结束登记过但已不属于任何在用浏览器的残留进程，并回收本进程的僵尸子进程'''
+        if not os.path.isdir('/proc'):
+            return
+        with self._launch_lock:
+            self._reap()
+
+    def _reap(self):
+        live = self._live_pids()
+        self.remember(live)
+        me = os.getpid()
+        zombies = [pid for pid, _, state, ppid in list_processes() if state == 'Z' and ppid == me]
+        with self._lock:
+            known = dict(self._known)
+        # 启动时间不一致说明 pid 已被其他进程复用，不能清理
+        leftovers = [pid for pid, start in known.items() if pid not in live and process_start_time(pid) == start]
+        orphans = [pid for pid in process_tree(*leftovers) if pid not in live] if leftovers else []
+        if orphans:
+            # 连同它们的子进程(renderer、gpu 等)一起结束
+            logging.warning(f"Kill {len(orphans)} leftover browser processes: {orphans}")
+            metrics.inc('orphans_reaped', len(orphans))
+            _kill(orphans)
+            zombies += [pid for pid in orphans if pid not in zombies]
+        with self._lock:
+            # 已结束的和已退出的进程不再登记
+            kept = {pid: start for pid, start in self._known.items()
+                    if pid in live or (pid not in orphans and process_start_time(pid) == start)}
+            if len(kept) != len(self._known):
+                self._known = kept
+                self._save()
+        reaped = 0
+        for pid in zombies:
+            try:
+                if os.waitpid(pid, os.WNOHANG)[0] == pid:
+                    reaped += 1
+            except ChildProcessError:
+                pass
+        if reaped:
+            logging.info(f"Reaped {reaped} zombie processes.")
+            metrics.inc('zombies_reaped', reaped)
+
+
+watchdog = Watchdog(os.path.join(config.data_path, 'browser_pids.json'))
@@ -10,9 +10,16 @@ from datetime import datetime, timedelta
 import traceback
 import config
 import argparse
+import atexit
+import signal
+import sys
+import threading
 
 import v1
+from electricity.backfill import Backfill
 from electricity.data_fetcher import DataFetcher
+from electricity.fetcher_pool import FetcherPool
+from electricity.watchdog import watchdog
 from models import electricity
 
 dictConfig({
@@ -34,48 +41,98 @@ dictConfig({
         'handlers': ['console']
     }
 })
-fetcher = DataFetcher(config.electricity['phone_number'], config.electricity['password'])
+fetchers = []
+for account in config.electricity['accounts']:
+    # 所有账号共用同一个验证码识别模型
+    fetchers.append(DataFetcher(account['phone_number'], account['password'], fetchers[0].onnx if fetchers else None, store=electricity))
+fetcher_pool = FetcherPool(fetchers, config.electricity['max_browsers'], config.electricity['browser_memory_mb'])
+# 定时抓取或补抓进行中，后台的历史回填会在下一批之前让出
+fetch_running = threading.Event()
+backfills = [Backfill(fetcher, electricity, fetch_running.is_set) for fetcher in fetchers]
 app = Flask(__name__, static_folder='static')
 scheduler = APScheduler()
 
 
+def shutdown():
+    for fetcher in fetchers:
+        fetcher.close()
+
+atexit.register(shutdown)
+# docker stop 发送 SIGTERM，转换成正常退出以便执行 atexit 关闭常驻浏览器
+signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+
+def save_user_data(user_id, user_data):
+    '''一个户号的数据在一个事务中写入，抓取完成一户就入库一户'''
+    with electricity.transaction():
+        if user_data['balance'] is not None:
+            electricity.insert_balance_info(user_id, user_data['balance'])
+
+        if user_data['location'] is not None:
+            electricity.insert_location_info(user_id, user_data['location'])
+        
+        if user_data['last_daily'] is not None:
+            electricity.insert_daily_info(user_id, user_data['last_daily']['date'], user_data['last_daily']['usage'])
+        
+        if user_data['daily'] is not None:
+            electricity.insert_all_daily_info(user_id, user_data['daily'])
+
+        if user_data['yearly'] is not None:
+            electricity.insert_year_info(user_id, str(datetime.now().year) + '-01-01', user_data['yearly']['usage'], user_data['yearly']['charge'])
+
+        if user_data['month'] is not None:
+            for item in user_data['month']:
+                electricity.insert_month_info(user_id, item['date'][0:7] + '-01', item['usage'], item['charge'])
+
+    logging.info(f"update {user_id} status successfully!")
+
+
+def schedule_resume():
+    '''还有失败的户号或部分时，几分钟后只补抓这些部分，而不是等到下一个 cron_hour'''
+    if not fetcher_pool.needs_resume():
+        return
+    run_time = datetime.now() + timedelta(minutes=config.electricity['resume_delay_minutes'])
+    scheduler.add_job(func=resume_electricity_task, trigger='date', next_run_time=run_time, id='resume_electricity_task', replace_existing=True, misfire_grace_time=900)
+    logging.info(f"Some users or sections are missing, resume them at {run_time.strftime('%H:%M:%S')}.")
+
+
 @scheduler.task('cron', id='fetch_electricity_task', hour=config.electricity['cron_hour'], misfire_grace_time=900)
 def fetch_electricity_task():
+    fetch_running.set()
     try:
-        data = fetcher.fetch()
-        
-        for user_id in data.keys():
-            user_data = data[user_id]
-
-            try:
-                if user_data['balance'] is not None:
-                    electricity.insert_balance_info(user_id, user_data['balance'])
-
-                if user_data['location'] is not None:
-                    electricity.insert_location_info(user_id, user_data['location'])
-                
-                if user_data['last_daily'] is not None:
-                    electricity.insert_daily_info(user_id, user_data['last_daily']['date'], user_data['last_daily']['usage'])
-                
-                if user_data['daily'] is not None:
-                    electricity.insert_all_daily_info(user_id, user_data['daily'])
-
-                if user_data['yearly'] is not None:
-                    electricity.insert_year_info(user_id, str(datetime.now().year) + '-01-01', user_data['yearly']['usage'], user_data['yearly']['charge'])
-
-                if user_data['month'] is not None:
-                    for item in user_data['month']:
-                        electricity.insert_month_info(user_id, item['date'][0:7] + '-01', item['usage'], item['charge'])
-
-                logging.info(f"update {user_id} status successfully!")
-            except Exception as e:
-                logging.error(f"update {user_id} status failed, reason is {e}")
-                traceback.print_exc()
-
-        logging.info("state-refresh task run successfully!")
+        data = fetcher_pool.fetch_all(on_user=save_user_data)
+        logging.info(f"state-refresh task run successfully, {len(data)} users fetched!")
+        schedule_resume()
     except Exception as e:
         logging.error(f"state-refresh task failed, reason is {e}")
         traceback.print_exc()
+    finally:
+        fetch_running.clear()
+
+
+def resume_electricity_task():
+    fetch_running.set()
+    try:
+        data = fetcher_pool.resume_all(on_user=save_user_data)
+        logging.info(f"state-resume task run successfully, {len(data)} users fetched!")
+        schedule_resume()
+    except Exception as e:
+        logging.error(f"state-resume task failed, reason is {e}")
+        traceback.print_exc()
+    finally:
+        fetch_running.clear()
+
+
+def backfill_electricity_task():
+    '''后台回填历史数据，各账号依次进行，同一时间只占用一个浏览器'''
+    for backfill in backfills:
+        if fetch_running.is_set():
+            return
+        try:
+            backfill.run()
+        except Exception as e:
+            logging.error(f"backfill task of {backfill.fetcher.masked_username} failed, reason is {e}")
+            traceback.print_exc()
 
 @app.route('/')
 def index():
@@ -92,6 +149,8 @@ if __name__ == '__main__':
     app.json.ensure_ascii = False
 
     scheduler.init_app(app)
+    # 清理上次异常退出时残留的浏览器进程
+    watchdog.reap()
 
     if electricity.is_db_new_create or args.run:
         if electricity.is_db_new_create:
@@ -100,7 +159,12 @@ if __name__ == '__main__':
             logging.info("you add args -r, will get electricity data!!!")
         scheduler.add_job(func=fetch_electricity_task, trigger='date', next_run_time=(datetime.now() + timedelta(seconds=10)), id='init_electricity_task', misfire_grace_time=900)
     
+    if any(backfill.enabled for backfill in backfills):
+        scheduler.add_job(func=backfill_electricity_task, trigger='interval', minutes=config.electricity['backfill_interval_minutes'], next_run_time=(datetime.now() + timedelta(minutes=1)), id='backfill_electricity_task', max_instances=1, coalesce=True)
+
     scheduler.start()
+    # 上次退出前没有补抓完的部分
+    schedule_resume()
 
     from waitress import serve
     if config.DEBUG:
@@ -1,14 +1,30 @@
+import functools
 import logging
 import os
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 import config
 
+
+def _transactional(func):
+    '''写入方法在自己的事务中执行，处于 transaction() 之中时由最外层统一提交'''
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self.transaction():
+            return func(self, *args, **kwargs)
+    return wrapper
+
+
 class Electricity:
     def __init__(self, db_name):
         
         self.db_name = db_name
         self.is_db_new_create = False
+        # 多个抓取线程共用同一个连接，写事务之间用锁串行
+        self._lock = threading.RLock()
+        self._depth = 0
 
         db_path = config.data_path + os.path.sep + self.db_name
         if config.DEBUG:
@@ -112,7 +128,24 @@ class Electricity:
     
     def close(self):
         self.connect.close()
+
+    @contextmanager
+    def transaction(self):
+        '''在一个事务中执行多次写入，全部成功才提交，任意一次失败整体回滚'''
+        with self._lock:
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.connect.rollback()
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self.connect.commit()
          
+    @_transactional
     def insert_all_daily_info(self, user_code: str, data_list: list):
         cursor = self.connect.cursor()
         for data in data_list:
@@ -125,9 +158,9 @@ class Electricity:
                 ,update_time = excluded.update_time
             """
             cursor.execute(sql)
-        self.connect.commit()
         cursor.close()
 
+    @_transactional
     def insert_daily_info(self, user_code: str, date: str , usage: float):
         cursor = self.connect.cursor()
         sql = f"""
@@ -139,9 +172,9 @@ class Electricity:
             ,update_time = excluded.update_time
         """
         cursor.execute(sql)
-        self.connect.commit()
         cursor.close()
 
+    @_transactional
     def insert_balance_info(self, user_code: str, balance: float):
         cursor = self.connect.cursor()
         sql = f"""
@@ -155,9 +188,9 @@ class Electricity:
             ,update_time = excluded.update_time
         """
         cursor.execute(sql)
-        self.connect.commit()
         cursor.close()
 
+    @_transactional
     def insert_location_info(self, user_code: str, location: str):
         
         cursor = self.connect.cursor()
@@ -169,9 +202,9 @@ class Electricity:
             location = excluded.location
         """
         cursor.execute(sql)
-        self.connect.commit()
         cursor.close()
 
+    @_transactional
     def insert_month_info(self, user_code: str, date: str, usage: float, charge: float):
         cursor = self.connect.cursor()
         sql = f"""
@@ -184,9 +217,9 @@ class Electricity:
             ,update_time = excluded.update_time
         """
         cursor.execute(sql)
-        self.connect.commit()
         cursor.close()
     
+    @_transactional
     def insert_year_info(self, user_code: str, date: str, usage: float, charge: float):
         cursor = self.connect.cursor()
         sql = f"""
@@ -199,14 +232,35 @@ class Electricity:
             ,update_time = excluded.update_time
         """
         cursor.execute(sql)
-        self.connect.commit()
         cursor.close()
 
-    def __exe_select(self, sql: str):
+    def __exe_select(self, sql: str, params: tuple = ()):
         cursor = self.connect.cursor()
-        result = cursor.execute(sql)
+        result = cursor.execute(sql, params)
         return result
     
+    def get_latest_daily_date(self, user_code: str):
+        sql = """
+            select
+                max(date)
+            from daily
+            where user_code = ?
+        """
+        for item in self.__exe_select(sql, (user_code,)):
+            return item[0]
+        return None
+
+    def get_latest_month_date(self, user_code: str):
+        sql = """
+            select
+                max(date)
+            from month
+            where user_code = ?
+        """
+        for item in self.__exe_select(sql, (user_code,)):
+            return item[0]
+        return None
+
     def get_user_list(self):
         sql = """
             select
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function
+
+from flask import current_app
+
+from . import Resource
+from electricity.metrics import metrics
+
+
+class Metrics(Resource):
+
+    def get(self):
+        # Prometheus 文本格式，直接返回 Response 以跳过 JSON 响应过滤
+        return current_app.response_class(metrics.render(), status=200, mimetype='text/plain; version=0.0.4')
@@ -14,6 +14,7 @@ from .api.electricity_balance_userId import ElectricityBalanceUserid
 from .api.electricity_dailys_userId import ElectricityDailysUserid
 from .api.electricity_latest_month_userId import ElectricityLatestMonthUserid
 from .api.electricity_this_year_userId import ElectricityThisYearUserid
+from .api.metrics import Metrics
 
 
 routes = [
@@ -23,4 +24,5 @@ routes = [
     dict(resource=ElectricityDailysUserid, urls=['/electricity/dailys/<userId>'], endpoint='electricity_dailys_userId'),
     dict(resource=ElectricityLatestMonthUserid, urls=['/electricity/latest_month/<userId>'], endpoint='electricity_latest_month_userId'),
     dict(resource=ElectricityThisYearUserid, urls=['/electricity/this_year/<userId>'], endpoint='electricity_this_year_userId'),
+    dict(resource=Metrics, urls=['/metrics'], endpoint='metrics'),
 ]
\ No newline at end of file
@@ -62,6 +62,7 @@ filters = {
     ('electricity_dailys_userId', 'GET'): {200: {'headers': None, 'schema': {'$ref': '#/definitions/Dailys'}}, 400: {'headers': None, 'schema': None}},
     ('electricity_latest_month_userId', 'GET'): {200: {'headers': None, 'schema': {'$ref': '#/definitions/LatestMonth'}}, 400: {'headers': None, 'schema': None}},
     ('electricity_this_year_userId', 'GET'): {200: {'headers': None, 'schema': {'$ref': '#/definitions/ThisYear'}}, 400: {'headers': None, 'schema': None}},
+    ('metrics', 'GET'): {200: {'headers': None, 'schema': {'type': 'string'}}},
 }
 
 scopes = {
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 与 benchmark/harness.py 相同，把 src 加入 sys.path，模块按 electricity.xxx 导入
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+pytest.importorskip('onnxruntime')
+
+from electricity.captcha_calibration import MIN_SAMPLES, CaptchaCalibration  # noqa: E402
+
+
+def attempt(x1, offset, confidence, outcome, **extra):
+    return dict({'time': 0, 'image': 'x', 'box': [x1, 100, x1 + 40, 140], 'confidence': confidence, 'factor': 1.0, 'offset': offset, 'outcome': outcome}, **extra)
+
+
+def calibration(tmp_path, history, **kwargs):
+    with open(tmp_path / 'captcha_attempts.jsonl', 'w') as file:
+        for item in history:
+            file.write(json.dumps(item) + '\n')
+    return CaptchaCalibration(str(tmp_path), factor=1.06, threshold=0.7, **kwargs)
+
+
+def test_defaults_until_enough_samples(tmp_path):
+    fitted = calibration(tmp_path, [attempt(100, 120, 0.9, 'success')] * (MIN_SAMPLES - 1))
+    assert (fitted.factor, fitted.threshold) == (1.06, 0.7)
+
+
+def test_factor_is_the_median_ratio_of_successful_slides(tmp_path):
+    history = [attempt(100, 100 + i, 0.9, 'success') for i in range(MIN_SAMPLES + 1)]
+    # 失败和刷新的记录不参与补偿系数的拟合
+    history += [attempt(100, 300, 0.9, 'fail')] * 5 + [attempt(100, None, 0.2, 'refresh')] * 50
+    assert calibration(tmp_path, history).factor == pytest.approx(1.10)
+
+
+def test_threshold_is_the_lowest_confidence_with_enough_success(tmp_path):
+    history = [attempt(100, 106, 0.42, 'fail')] * 40 + [attempt(100, 106, 0.8, 'success')] * 30
+    assert calibration(tmp_path, history).threshold == pytest.approx(0.45)
+
+
+def test_threshold_keeps_the_default_without_enough_samples_above(tmp_path):
+    history = [attempt(100, 106, 0.5, 'fail')] * 40 + [attempt(100, 106, 0.9, 'success')] * (MIN_SAMPLES - 1)
+    assert calibration(tmp_path, history).threshold == 0.7
+
+
+def test_disabled_calibration_uses_the_configured_values(tmp_path):
+    history = [attempt(100, 120, 0.9, 'success')] * (MIN_SAMPLES * 2)
+    fitted = calibration(tmp_path, history, enabled=False)
+    assert (fitted.factor, fitted.threshold) == (1.06, 0.7)
+
+
+def test_block_mode_fits_on_block_distances_only(tmp_path):
+    # 拼图块模式的距离是缺口 x1 减去拼图块的左边距，缺口模式(包括没有 distance_mode 的旧记录)不参与拟合
+    history = [attempt(100, 130, 0.9, 'success')] * MIN_SAMPLES
+    history += [attempt(100, 72, 0.9, 'success', distance=60, distance_mode='block')] * MIN_SAMPLES
+    assert calibration(tmp_path, history, distance_mode='block').factor == pytest.approx(1.2)
+    assert calibration(tmp_path, history, distance_mode='gap').factor == pytest.approx(1.3)
@@ -0,0 +1,90 @@
+import pytest
+
+pytest.importorskip('selenium')
+pytest.importorskip('requests')
+
+from electricity.http_backend import HttpBackend, HttpSessionExpired  # noqa: E402
+from electricity.network_capture import _find_key, parse_payloads  # noqa: E402
+
+BALANCE = {'code': 1, 'data': {'list': [{'consNo': '1001', 'sumMoney': '52.30'}]}}
+MONTH = {'data': {'dataInfo': {'totalEleNum': '1234', 'totalEleCost': '612.5'}, 'mothEleList': [
+    {'month': '202412', 'monthEleNum': '210', 'monthEleCost': '104.1'},
+    {'month': '2024-11', 'monthEleNum': '180', 'monthEleCost': '89.2'},
+    {'month': None, 'monthEleNum': '1', 'monthEleCost': '1'},
+]}}
+DAILY = {'data': {'sevenEleList': [
+    {'day': '20241228', 'dayElePq': '6.1'},
+    {'day': '2024-12-29', 'dayElePq': '7.4'},
+    {'day': '20241230', 'dayElePq': '-'},
+]}}
+
+
+def test_find_key_searches_depth_first_and_skips_empty_values():
+    assert _find_key({'a': {'sumMoney': ''}, 'b': [{'balance': 3}]}, ['sumMoney', 'balance']) == 3
+    assert _find_key({'a': [1, 'x']}, ['balance']) is None
+
+
+def test_parse_payloads_reads_every_section():
+    result = parse_payloads([BALANCE, MONTH, DAILY])
+    assert result['balance'] == 52.3
+    assert result['yearly'] == {'usage': 1234.0, 'charge': 612.5}
+    # 月份统一成 YYYY-MM 并按时间排序，缺少月份的行被丢弃
+    assert result['month'] == [
+        {'date': '2024-11', 'usage': 180.0, 'charge': 89.2},
+        {'date': '2024-12', 'usage': 210.0, 'charge': 104.1},
+    ]
+    # 与页面表格一致，最近的一天在最前，没有用电量的日期被丢弃
+    assert result['daily'] == [
+        {'date': '2024-12-29', 'usage': 7.4},
+        {'date': '2024-12-28', 'usage': 6.1},
+    ]
+
+
+def test_parse_payloads_later_responses_win():
+    assert parse_payloads([{'sumMoney': 1}, {'prepayBal': '2.5'}])['balance'] == 2.5
+
+
+def test_parse_payloads_ignores_unrelated_payloads():
+    assert parse_payloads([{'code': 0, 'message': 'ok'}, {'data': []}]) == {}
+
+
+@pytest.fixture
+def backend():
+    backend = HttpBackend(concurrency=1)
+    yield backend
+    backend.close()
+
+
+def test_user_list_keeps_the_dropdown_order(backend, monkeypatch):
+    payload = {'data': {'powerUserList': [
+        {'consNo_dst': 2002, 'elecAddr_dst': 'B'},
+        {'consNo': '1001', 'elecAddr_dst': 'A'},
+        {'elecAddr_dst': 'no id'},
+    ]}}
+    monkeypatch.setattr(backend, 'post', lambda name, **values: payload)
+    assert backend.user_list() == [('2002', 'B'), ('1001', 'A')]
+
+
+def test_user_list_is_empty_without_users(backend, monkeypatch):
+    monkeypatch.setattr(backend, 'post', lambda name, **values: {'code': 1})
+    assert backend.user_list() == []
+
+
+def test_fetch_user_drops_failed_sections(backend, monkeypatch):
+    def post(name, **values):
+        if name == 'month':
+            raise ValueError('not json')
+        return {'balance': BALANCE, 'daily': DAILY}[name]
+    monkeypatch.setattr(backend, 'post', post)
+    result = backend.fetch_user('1001', 2024)
+    assert result['balance'] == 52.3
+    assert 'month' not in result
+    assert result['daily'][0]['date'] == '2024-12-29'
+
+
+def test_fetch_user_raises_when_the_session_expires(backend, monkeypatch):
+    def post(name, **values):
+        raise HttpSessionExpired(f"{name} returned 401")
+    monkeypatch.setattr(backend, 'post', post)
+    with pytest.raises(HttpSessionExpired):
+        backend.fetch_user('1001', 2024)
@@ -0,0 +1,124 @@
+import pytest
+
+pytest.importorskip('selenium')
+
+from selenium.common.exceptions import TimeoutException, WebDriverException  # noqa: E402
+
+from electricity import retry  # noqa: E402
+from electricity.retry import LoginCircuitBreaker, RetryPolicy  # noqa: E402
+
+
+class Clock:
+    '''代替 time.monotonic 和 time.sleep，sleep 只推进时间'''
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(retry.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(retry.time, 'sleep', clock.sleep)
+    return clock
+
+
+def flaky(failures, exception=TimeoutException):
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise exception('boom')
+        return 'done'
+    return func, calls
+
+
+def test_retry_succeeds_without_waiting(clock):
+    func, calls = flaky(0)
+    assert RetryPolicy(attempts=3).call('open', func) == 'done'
+    assert len(calls) == 1
+    assert clock.sleeps == []
+
+
+def test_retry_backs_off_exponentially(clock):
+    func, calls = flaky(2)
+    policy = RetryPolicy(attempts=3, base_delay=1.0, max_delay=30.0, jitter=0)
+    assert policy.call('open', func) == 'done'
+    assert len(calls) == 3
+    assert clock.sleeps == [1.0, 2.0]
+
+
+def test_retry_delay_is_capped_and_jittered():
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0, jitter=0.5)
+    for _ in range(100):
+        assert 2.5 <= policy.delay(10) <= 7.5
+
+
+def test_retry_raises_the_last_error_when_attempts_run_out(clock):
+    func, calls = flaky(5, WebDriverException)
+    with pytest.raises(WebDriverException):
+        RetryPolicy(attempts=3, jitter=0).call('open', func)
+    assert len(calls) == 3
+    assert len(clock.sleeps) == 2
+
+
+def test_retry_does_not_retry_other_exceptions(clock):
+    func, calls = flaky(1, ValueError)
+    with pytest.raises(ValueError):
+        RetryPolicy(attempts=3).call('parse', func)
+    assert len(calls) == 1
+    assert clock.sleeps == []
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = LoginCircuitBreaker(failure_threshold=3, cooldown_seconds=600)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow()
+    assert breaker.retry_at() is None
+    breaker.record_failure()
+    assert not breaker.allow()
+    assert breaker.retry_at() is not None
+
+
+def test_breaker_half_opens_after_cooldown(clock):
+    breaker = LoginCircuitBreaker(failure_threshold=2, cooldown_seconds=600)
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now += 599
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+    # 半开时试探失败，重新开始冷却
+    breaker.record_failure()
+    assert not breaker.allow()
+    clock.now += 600
+    assert breaker.allow()
+
+
+def test_breaker_closes_on_success(clock):
+    breaker = LoginCircuitBreaker(failure_threshold=2, cooldown_seconds=600)
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now += 600
+    breaker.record_success()
+    assert breaker.failures == 0
+    assert breaker.retry_at() is None
+    breaker.record_failure()
+    assert breaker.allow()
+
+
+def test_breaker_disabled_with_zero_threshold(clock):
+    breaker = LoginCircuitBreaker(failure_threshold=0, cooldown_seconds=600)
+    for _ in range(10):
+        breaker.record_failure()
+    assert breaker.allow()
@@ -0,0 +1,59 @@
+from electricity.run_journal import RunJournal
+
+
+def test_pending_is_none_until_the_user_list_is_known(tmp_path):
+    journal = RunJournal(str(tmp_path), '13800000000')
+    journal.reset()
+    assert journal.pending() is None
+
+
+def test_pending_lists_missing_sections_in_dropdown_order(tmp_path):
+    journal = RunJournal(str(tmp_path), '13800000000')
+    journal.reset()
+    journal.start(['u1', 'u2', 'u3'])
+    journal.mark('u2', {'balance': 'ok', 'month': 'ok', 'daily': 'ok'})
+    journal.mark('u1', {'balance': 'ok', 'month': 'failed'})
+    assert journal.pending() == [(0, 'u1', ['month', 'daily']), (2, 'u3', ['balance', 'month', 'daily'])]
+
+
+def test_resume_marks_overwrite_failed_sections(tmp_path):
+    journal = RunJournal(str(tmp_path), '13800000000')
+    journal.reset()
+    journal.start(['u1'])
+    journal.mark('u1', {'balance': 'ok', 'month': 'failed', 'daily': 'failed'})
+    journal.begin_resume()
+    journal.mark('u1', {'month': 'ok', 'daily': 'ok'})
+    assert journal.pending() == []
+    assert journal.attempts == 1
+
+
+def test_state_survives_a_restart(tmp_path):
+    journal = RunJournal(str(tmp_path), '13800000000')
+    journal.reset()
+    journal.start(['u1', 'u2'])
+    journal.mark('u1', {'balance': 'ok', 'month': 'ok', 'daily': 'ok'})
+    journal.begin_resume()
+
+    reloaded = RunJournal(str(tmp_path), '13800000000')
+    assert reloaded.attempts == 1
+    assert reloaded.pending() == [(1, 'u2', ['balance', 'month', 'daily'])]
+
+
+def test_reset_clears_attempts_and_users(tmp_path):
+    journal = RunJournal(str(tmp_path), '13800000000')
+    journal.start(['u1'])
+    journal.begin_resume()
+    journal.reset()
+    assert journal.attempts == 0
+    assert journal.pending() is None
+
+
+def test_corrupt_journal_is_treated_as_a_failed_run(tmp_path):
+    journal = RunJournal(str(tmp_path), '13800000000')
+    with open(journal.path, 'w') as file:
+        file.write('{')
+    assert RunJournal(str(tmp_path), '13800000000').pending() is None
+
+
+def test_accounts_use_separate_files(tmp_path):
+    assert RunJournal(str(tmp_path), '13800000000').path != RunJournal(str(tmp_path), '13900000000').path